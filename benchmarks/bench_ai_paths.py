@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Mäter genomströmning och latens (p50/p95) för AI-flödena mot den lokala
+Gemini-ersättaren i `benchmarks/mock_gemini.py`.
+
+Två flöden körs genom applikationens egna API-ändpunkter (Flask test client)
+mot en tom, temporär SQLite-databas:
+- batch: POST /api/batch_book_with_ai med `--batch-size` transaktioner per anrop,
+- bilagor: POST /api/company/<id>/multi_upload_bilagor med en fil per anrop,
+  växelvis en stor mobilbild (förbehandlas och skickas inline) och en PDF som
+  är större än INLINE_MAX_BYTES (strömmas via File API).
+
+Exempel:
+    python -m benchmarks.bench_ai_paths --transactions 200 --batch-size 10 --latency-ms 300 --rate-limit-rate 0.05
+    python -m benchmarks.bench_ai_paths --bilagor 40 --json > resultat.json
+
+Med `--repeat-references` delar transaktionerna referenser, så att
+regelcachen (Association.rule) används i stället för nya AI-anrop.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from werkzeug.serving import make_server
+
+from benchmarks.mock_gemini import create_mock_app
+
+
+def _percentiles(samples):
+    """Returnerar (p50, p95) i millisekunder."""
+    if not samples:
+        return None, None
+    if len(samples) == 1:
+        return round(samples[0] * 1000, 1), round(samples[0] * 1000, 1)
+    cuts = statistics.quantiles(samples, n=20, method='inclusive')
+    return round(cuts[9] * 1000, 1), round(cuts[18] * 1000, 1)
+
+
+def _summary(name, latencies, items, elapsed, errors):
+    p50, p95 = _percentiles(latencies)
+    return {
+        'flow': name,
+        'requests': len(latencies),
+        'items': items,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(items / elapsed, 2) if elapsed else None,
+        'p50_ms': p50,
+        'p95_ms': p95,
+    }
+
+
+def _make_bilaga_files(directory, seed):
+    """Skapar en stor mobilbild (JPEG) och en PDF över inline-gränsen med brus som inte går att komprimera."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    photo_path = os.path.join(directory, 'kvitto_foto.jpg')
+    Image.frombytes('RGB', (3000, 2000), rng.randbytes(3000 * 2000 * 3)).save(photo_path, quality=90)
+
+    pdf_path = os.path.join(directory, 'faktura_skannad.pdf')
+    pages = [Image.frombytes('L', (1400, 1400), rng.randbytes(1400 * 1400)) for _ in range(2)]
+    pages[0].save(pdf_path, format='PDF', save_all=True, append_images=pages[1:], quality=95)
+    return [photo_path, pdf_path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark av AI-flödena mot en lokal Gemini-mock.")
+    parser.add_argument('--transactions', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--repeat-references', action='store_true')
+    parser.add_argument('--bilagor', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--latency-jitter-ms', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help="Skriv resultatet som JSON.")
+    args = parser.parse_args()
+
+    mock = create_mock_app(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    server = make_server('127.0.0.1', 0, mock, threaded=True)
+    threading.Thread(target=server.serve_forever, name='mock-gemini', daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    # Miljön måste vara satt innan applikationen importeras (konfigurationen läses vid import)
+    work_dir = tempfile.mkdtemp(prefix='bench_ai_')
+    os.environ['GEMINI_BASE_URL'] = base_url
+    os.environ['GEMINI_API_KEY'] = 'benchmark'
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ['SOCKS5_PROXY'] = ''
+    logging.disable(logging.WARNING)
+
+    import requests
+    from bokforing_app import create_app, db
+    from bokforing_app.models import BankTransaction, Company
+
+    results = []
+    try:
+        # Tjänsterna skriver prompts och svar till stdout; det ska inte blanda sig med resultatet
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = create_app()
+            app.config['UPLOAD_FOLDER'] = os.path.join(work_dir, 'uploads')
+            client = app.test_client()
+
+            with app.app_context():
+                company_id = Company.query.first().id
+                rng = random.Random(args.seed)
+                transactions = [
+                    BankTransaction(
+                        company_id=company_id,
+                        bokforingsdag=date(2024, 1, 1) + timedelta(days=i % 365),
+                        referens=f"Leverantör {i % 10}" if args.repeat_references else f"Betalning {i}",
+                        belopp=round(rng.uniform(-5000, 5000), 2) or 1.0,
+                        status='unprocessed',
+                    )
+                    for i in range(args.transactions)
+                ]
+                db.session.add_all(transactions)
+                db.session.commit()
+                transaction_ids = [t.id for t in transactions]
+
+            # 1. Batchbokföring
+            latencies, booked, errors = [], 0, 0
+            started = time.perf_counter()
+            for i in range(0, len(transaction_ids), args.batch_size):
+                t0 = time.perf_counter()
+                response = client.post('/api/batch_book_with_ai',
+                                       json={'transaction_ids': transaction_ids[i:i + args.batch_size]})
+                latencies.append(time.perf_counter() - t0)
+                body = response.get_json() or {}
+                booked += len(body.get('success_ids', []))
+                errors += len(body.get('errors', []))
+            results.append(_summary('batch_book_with_ai', latencies, booked, time.perf_counter() - started, errors))
+
+            # 2. Uppladdning av bilagor
+            files = _make_bilaga_files(work_dir, args.seed)
+            latencies, uploaded, errors = [], 0, 0
+            started = time.perf_counter()
+            for i in range(args.bilagor):
+                path = files[i % len(files)]
+                with open(path, 'rb') as f:
+                    t0 = time.perf_counter()
+                    response = client.post(f'/api/company/{company_id}/multi_upload_bilagor',
+                                           data={'files': (f, f"{i}_{os.path.basename(path)}")},
+                                           content_type='multipart/form-data')
+                    latencies.append(time.perf_counter() - t0)
+                if response.status_code == 200:
+                    uploaded += 1
+                else:
+                    errors += 1
+            results.append(_summary('multi_upload_bilagor', latencies, uploaded, time.perf_counter() - started, errors))
+
+        mock_stats = requests.get(f"{base_url}/_mock/stats").json()
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        json.dump({'config': vars(args), 'results': results, 'mock': mock_stats}, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"Latens {args.latency_ms}±{args.latency_jitter_ms} ms, serverfel {args.error_rate}, "
+          f"rate limit {args.rate_limit_rate}")
+    print(f"{'flöde':<22} {'anrop':>6} {'poster':>7} {'fel':>5} {'sek':>8} {'poster/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(f"{r['flow']:<22} {r['requests']:>6} {r['items']:>7} {r['errors']:>5} {r['seconds']:>8} "
+              f"{r['items_per_second']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8}")
+    print(f"Mock: {mock_stats}")
+
+
+if __name__ == "__main__":
+    main()
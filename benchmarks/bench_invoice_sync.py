@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Mäter genomströmningen för fakturasynkroniseringen mot den lokala
+Fakturan.nu-ersättaren i `benchmarks/mock_fakturanu.py`.
+
+Skriptet startar mock-servern i en tråd, pekar `fakturanu_service` mot den
+via FAKTURANU_BASE_URL och kör `invoice_sync_service.sync_company_invoices`
+mot en tom, temporär SQLite-databas i tre steg:
+- initial: första fullständiga synkroniseringen,
+- unchanged: samma data igen (allt ska hoppas över),
+- changed: efter en ny revision där en andel av fakturorna ändrats.
+
+Exempel:
+    python -m benchmarks.bench_invoice_sync --invoices 20000 --latency-ms 30 --error-rate 0.01 --workers 8
+    python -m benchmarks.bench_invoice_sync --json > resultat.json
+
+Parallellitet och poolstorlek styrs av samma miljövariabler som i
+applikationen (--workers och --rps sätter FAKTURANU_MAX_WORKERS och
+FAKTURANU_MAX_RPS), så olika inställningar kan jämföras körning för körning.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from benchmarks.mock_fakturanu import create_mock_app
+
+
+def _start_mock(args):
+    app = create_mock_app(invoices=args.invoices, clients=args.clients, page_size=args.page_size,
+                          latency_ms=args.latency_ms, error_rate=args.error_rate,
+                          change_percent=args.change_percent, seed=args.seed)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='mock-fakturanu', daemon=True)
+    thread.start()
+    return server, app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark av fakturasynkronisering mot en lokal Fakturan.nu-mock.")
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--change-percent', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, help="Sätter FAKTURANU_MAX_WORKERS.")
+    parser.add_argument('--rps', type=float, default=1000.0, help="Sätter FAKTURANU_MAX_RPS.")
+    parser.add_argument('--json', action='store_true', help="Skriv resultatet som JSON.")
+    args = parser.parse_args()
+
+    server, _ = _start_mock(args)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    # Miljön måste vara satt innan applikationen importeras (konfigurationen läses vid import)
+    fd, db_path = tempfile.mkstemp(suffix='.db', prefix='bench_sync_')
+    os.close(fd)
+    os.environ['FAKTURANU_BASE_URL'] = f"{base_url}/api/v2"
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['SOCKS5_PROXY'] = ''
+    os.environ['FAKTURANU_MAX_RPS'] = str(args.rps)
+    if args.workers:
+        os.environ['FAKTURANU_MAX_WORKERS'] = str(args.workers)
+    logging.disable(logging.WARNING)
+
+    import requests
+    from bokforing_app import create_app
+    from bokforing_app.models import Company
+    from bokforing_app.services import invoice_sync_service
+
+    results = []
+    try:
+        app = create_app()
+        with app.app_context():
+            company = Company.query.first()
+            for step in ('initial', 'unchanged', 'changed'):
+                if step == 'changed':
+                    requests.post(f"{base_url}/_mock/revision")
+                before = requests.get(f"{base_url}/_mock/stats").json()
+                started = time.perf_counter()
+                stats = invoice_sync_service.sync_company_invoices(company, params={})
+                elapsed = time.perf_counter() - started
+                after = requests.get(f"{base_url}/_mock/stats").json()
+                results.append({
+                    'step': step,
+                    'seconds': round(elapsed, 3),
+                    'invoices_per_second': round(stats.get('fetched', 0) / elapsed, 1) if elapsed else None,
+                    'http_requests': after['requests'] - before['requests'],
+                    'injected_errors': (after['errors_429'] + after['errors_5xx'])
+                                       - (before['errors_429'] + before['errors_5xx']),
+                    **stats,
+                })
+    finally:
+        server.shutdown()
+        os.remove(db_path)
+
+    if args.json:
+        json.dump({'config': vars(args), 'results': results}, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.invoices} fakturor, sidstorlek {args.page_size}, latens {args.latency_ms} ms, "
+          f"felandel {args.error_rate}, workers {os.environ.get('FAKTURANU_MAX_WORKERS', 'standard')}")
+    print(f"{'steg':<10} {'sek':>8} {'fakt/s':>9} {'anrop':>6} {'fel':>5} {'nya':>7} {'ändrade':>8} {'oförändr.':>10}")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['step']:<10} FEL: {r['error']}")
+            continue
+        print(f"{r['step']:<10} {r['seconds']:>8} {r['invoices_per_second']:>9} {r['http_requests']:>6} "
+              f"{r['injected_errors']:>5} {r['new']:>7} {r['updated']:>8} {r['unchanged']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Lokal ersättare för Fakturan.nu API v2, för last- och prestandatester.
+
+Servern efterliknar de delar av API:et som synkroniseringen använder:
+- GET /api/v2/invoices?page=N[&start_date=ÅÅÅÅ-MM-DD] med 'paging' som i det riktiga API:et,
+- GET /api/v2/invoices/<id> och GET /api/v2/clients/<id>.
+
+Datan genereras deterministiskt från fakturans id i stället för att hållas i
+minnet, så även 100 000 fakturor startar direkt. Fakturadatum ökar med id:t,
+vilket gör att 'start_date' kan filtreras utan att gå igenom alla fakturor.
+
+Utöver det finns styrändpunkter för benchmarkskriptet:
+- GET  /_mock/stats     antal anrop och injicerade fel,
+- POST /_mock/revision  ny "revision": en andel av fakturorna ändras (se --change-percent).
+
+Kör fristående:
+    python -m benchmarks.mock_fakturanu --invoices 100000 --page-size 100 --latency-ms 50 --error-rate 0.01
+och peka applikationen mot den med FAKTURANU_BASE_URL=http://127.0.0.1:5055/api/v2
+"""
+import argparse
+import random
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from flask import Flask, jsonify, request, url_for
+
+FIRST_DATE = date(2020, 1, 1)
+INVOICES_PER_DAY = 50
+
+
+def _invoice_date(invoice_id: int) -> date:
+    return FIRST_DATE + timedelta(days=(invoice_id - 1) // INVOICES_PER_DAY)
+
+
+def _first_id_from(start: date) -> int:
+    """Första faktura-id med datum >= start (fakturadatum ökar med id:t)."""
+    days = max((start - FIRST_DATE).days, 0)
+    return days * INVOICES_PER_DAY + 1
+
+
+def create_mock_app(invoices: int = 10000, clients: int = 500, page_size: int = 100, latency_ms: float = 0.0,
+                    error_rate: float = 0.0, change_percent: float = 5.0, seed: int = 42) -> Flask:
+    """
+    Skapar mock-servern.
+
+    Args:
+        invoices: Antal fakturor (id 1..invoices).
+        clients: Antal kunder som fakturorna fördelas på.
+        page_size: Fakturor per sida.
+        latency_ms: Fördröjning per anrop i millisekunder.
+        error_rate: Andel anrop (0..1) som besvaras med 429 eller 503.
+        change_percent: Andel fakturor (i procent) som ändras vid varje ny revision.
+        seed: Frö för felinjektionen, så att körningar kan jämföras.
+    """
+    app = Flask(__name__)
+    state = {'revision': 0, 'requests': 0, 'errors_429': 0, 'errors_5xx': 0}
+    lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def client_data(client_id: int) -> Dict[str, Any]:
+        return {
+            'id': client_id,
+            'number': client_id,
+            'name': f"Kund {client_id} AB",
+            'email': f"kund{client_id}@example.com",
+            'phone': '',
+            'client_type': 'company',
+            'org_number': f"55{client_id:04d}-{client_id % 10000:04d}",
+            'address': {
+                'street_address': f"Testgatan {client_id}",
+                'care_of': '',
+                'zip_code': '111 22',
+                'city': 'Stockholm',
+                'country': 'SE',
+            },
+        }
+
+    def invoice_data(invoice_id: int) -> Dict[str, Any]:
+        # Ändrade fakturor får ett nytt belopp för varje revision
+        changed = (invoice_id * 7919) % 10000 < change_percent * 100
+        bump = state['revision'] if changed else 0
+        quantity = 1 + invoice_id % 5
+        price = 100.0 + (invoice_id % 20) * 10 + bump
+        net = quantity * price
+        tax = net * 0.25
+        invoice_date = _invoice_date(invoice_id)
+        paid = invoice_id % 3 == 0
+        return {
+            'id': invoice_id,
+            'number': invoice_id,
+            'date': invoice_date.isoformat(),
+            'client_id': 1 + invoice_id % clients,
+            'days': 30,
+            'our_reference': '',
+            'your_reference': '',
+            'sent': True,
+            'paid_at': (invoice_date + timedelta(days=20)).isoformat() if paid else None,
+            'locale': 'sv',
+            'currency': 'SEK',
+            'sum': f"{net + tax:.1f}",
+            'net': f"{net:.1f}",
+            'tax': f"{tax:.1f}",
+            'reverse_charge': False,
+            'rows': [
+                {
+                    'id': invoice_id * 10 + n,
+                    'product_id': n,
+                    'discount': 0,
+                    'amount': f"{quantity:.1f}",
+                    'product_code': None,
+                    'product_name': f"Tjänst {n}",
+                    'product_unit': 'st',
+                    'product_price': f"{price / 2:.1f}",
+                    'product_tax': 25,
+                }
+                for n in range(2)
+            ],
+        }
+
+    @app.before_request
+    def simulate_network():
+        if request.path.startswith('/_mock/'):
+            return None
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+        with lock:
+            state['requests'] += 1
+            roll = rng.random()
+            if roll < error_rate / 2:
+                state['errors_429'] += 1
+                return jsonify({'error': 'Too many requests'}), 429, {'Retry-After': '0'}
+            if roll < error_rate:
+                state['errors_5xx'] += 1
+                return jsonify({'error': 'Service unavailable'}), 503, {'Retry-After': '0'}
+        return None
+
+    @app.route('/api/v2/invoices')
+    def list_invoices():
+        page = max(request.args.get('page', 1, type=int), 1)
+        first_id = 1
+        start_date: Optional[str] = request.args.get('start_date')
+        if start_date:
+            first_id = _first_id_from(date.fromisoformat(start_date))
+        count = max(invoices - first_id + 1, 0)
+        total_pages = max((count + page_size - 1) // page_size, 1)
+
+        start = first_id + (page - 1) * page_size
+        stop = min(start + page_size, invoices + 1)
+        data = [invoice_data(i) for i in range(start, stop)]
+
+        def link(target: int) -> Optional[str]:
+            if target < 1 or target > total_pages:
+                return None
+            args = {k: v for k, v in request.args.items() if k != 'page'}
+            return url_for('list_invoices', page=target, **args)
+
+        return jsonify({
+            'data': data,
+            'paging': {
+                'total_pages': total_pages,
+                'current_page': page,
+                'next': link(page + 1),
+                'previous': link(page - 1),
+            },
+        })
+
+    @app.route('/api/v2/invoices/<int:invoice_id>')
+    def get_invoice(invoice_id):
+        if not 1 <= invoice_id <= invoices:
+            return jsonify({'error': 'Not found'}), 404
+        return jsonify({'data': invoice_data(invoice_id)})
+
+    @app.route('/api/v2/clients/<int:client_id>')
+    def get_client(client_id):
+        if not 1 <= client_id <= clients:
+            return jsonify({'error': 'Not found'}), 404
+        return jsonify({'data': client_data(client_id)})
+
+    @app.route('/_mock/stats')
+    def stats():
+        with lock:
+            return jsonify(dict(state))
+
+    @app.route('/_mock/revision', methods=['POST'])
+    def bump_revision():
+        with lock:
+            state['revision'] += 1
+            return jsonify({'revision': state['revision']})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokal ersättare för Fakturan.nu API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--invoices', type=int, default=10000)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--change-percent', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_mock_app(invoices=args.invoices, clients=args.clients, page_size=args.page_size,
+                          latency_ms=args.latency_ms, error_rate=args.error_rate,
+                          change_percent=args.change_percent, seed=args.seed)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
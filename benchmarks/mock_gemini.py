@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Lokal ersättare för Gemini REST API, för deterministiska tester av AI-flödena.
+
+Servern efterliknar de anrop som `gemini_service` och `pdf_reader` gör:
+- POST /v1beta/models/<modell>:generateContent
+    * med en fil (inline_data/file_data): fakturadata enligt `InvoiceDataStrict`,
+    * med en transaktionsprompt: 'suggestion' och 'rule' som balanserar,
+    * med en fakturaprompt: 'suggestion' för kundfakturan.
+- POST /upload/v1beta/files (återupptagbar uppladdning: start, sedan "upload, finalize"),
+- DELETE /v1beta/files/<id>.
+
+Svaren byggs från beloppen i prompten, så samma indata ger alltid samma svar.
+Latens, andel serverfel (500) och andel rate limit-svar (429) är konfigurerbara.
+
+Styrändpunkt för benchmarkskripten:
+- GET /_mock/stats  antal anrop, uppladdade byte och injicerade fel.
+
+Kör fristående:
+    python -m benchmarks.mock_gemini --latency-ms 800 --error-rate 0.02 --rate-limit-rate 0.05
+och peka applikationen mot den med GEMINI_BASE_URL=http://127.0.0.1:5056
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from flask import Flask, jsonify, request
+
+_AMOUNT = r"(-?\d+(?:\.\d+)?)"
+
+
+def _find_amount(pattern: str, text: str) -> Optional[float]:
+    match = re.search(pattern + r"\s*" + _AMOUNT, text)
+    return float(match.group(1)) if match else None
+
+
+def _transaction_response(prompt: str) -> Dict[str, Any]:
+    """Förslag och regel för en banktransaktion: 25 % moms på inbetalningar, 4010 för utbetalningar."""
+    amount = _find_amount(r"Ursprungligt Belopp:", prompt) or 100.0
+    gross = round(abs(amount), 2)
+    if amount >= 0:
+        net = round(gross / 1.25, 2)
+        entries = [
+            {"account": "1930", "debit": gross, "credit": 0},
+            {"account": "3001", "debit": 0, "credit": net},
+            {"account": "2611", "debit": 0, "credit": round(gross - net, 2)},
+        ]
+        rule_entries = [
+            {"account": "1930", "debit": "ABS_AMOUNT", "credit": "0"},
+            {"account": "3001", "debit": "0", "credit": "ABS_AMOUNT / 1.25"},
+            {"account": "2611", "debit": "0", "credit": "ABS_AMOUNT - ABS_AMOUNT / 1.25"},
+        ]
+    else:
+        entries = [
+            {"account": "4010", "debit": gross, "credit": 0},
+            {"account": "1930", "debit": 0, "credit": gross},
+        ]
+        rule_entries = [
+            {"account": "4010", "debit": "ABS_AMOUNT", "credit": "0"},
+            {"account": "1930", "debit": "0", "credit": "ABS_AMOUNT"},
+        ]
+    return {
+        "suggestion": {"description": "Testförslag", "entries": entries},
+        "rule": {"description": "Testregel", "entries": rule_entries},
+    }
+
+
+def _invoice_response(prompt: str) -> Dict[str, Any]:
+    """Förslag för en kundfaktura med fakturametoden."""
+    total = _find_amount(r"Summa \(inkl\. moms\):", prompt) or 0.0
+    tax = _find_amount(r"Momsbelopp:", prompt) or 0.0
+    return {
+        "suggestion": {
+            "description": "Testfaktura",
+            "entries": [
+                {"account": "1510", "debit": total, "credit": 0},
+                {"account": "2611", "debit": 0, "credit": tax},
+                {"account": "3001", "debit": 0, "credit": round(total - tax, 2)},
+            ],
+        }
+    }
+
+
+def _extraction_response(seed: str) -> Dict[str, Any]:
+    """Fakturadata för en uppladdad bilaga, deterministisk per fil."""
+    n = int(uuid.uuid5(uuid.NAMESPACE_OID, seed).int % 100000)
+    net = 100 + n % 9000
+    tax = round(net * 0.25, 2)
+    return {
+        "fakturanr": str(10000 + n),
+        "fakturadatum": "2024-03-%02d" % (1 + n % 28),
+        "forfallodag": "2024-04-%02d" % (1 + n % 28),
+        "ocr": str(1000000 + n),
+        "total_netto": f"{net:.2f}",
+        "total_moms": f"{tax:.2f}",
+        "total_brutto": f"{net + tax:.2f}",
+        "att_betala": f"{net + tax:.2f}",
+        "kund": {"namn": "Testkund AB"},
+        "saljare": {"namn": f"Leverantör {n % 50} AB", "orgnr": "556000-0000", "bankgiro": "123-4567"},
+        "information": None,
+    }
+
+
+def create_mock_app(latency_ms: float = 0.0, latency_jitter_ms: float = 0.0, error_rate: float = 0.0,
+                    rate_limit_rate: float = 0.0, seed: int = 42) -> Flask:
+    """
+    Skapar mock-servern.
+
+    Args:
+        latency_ms: Medellatens för generateContent i millisekunder.
+        latency_jitter_ms: Maximal slumpmässig avvikelse (±) från medellatensen.
+        error_rate: Andel anrop (0..1) som besvaras med 500.
+        rate_limit_rate: Andel anrop (0..1) som besvaras med 429.
+        seed: Frö för latens och felinjektion, så att körningar kan jämföras.
+    """
+    app = Flask(__name__)
+    state = {'generate_requests': 0, 'uploads': 0, 'uploaded_bytes': 0, 'deletes': 0,
+             'errors_500': 0, 'errors_429': 0}
+    lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def inject_failure():
+        with lock:
+            roll = rng.random()
+            delay = max(latency_ms + rng.uniform(-latency_jitter_ms, latency_jitter_ms), 0.0)
+            if roll < rate_limit_rate:
+                state['errors_429'] += 1
+                return {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED'}}, 429, delay
+            if roll < rate_limit_rate + error_rate:
+                state['errors_500'] += 1
+                return {'error': {'code': 500, 'status': 'INTERNAL'}}, 500, delay
+        return None, 200, delay
+
+    @app.route('/v1beta/models/<path:model_action>', methods=['POST'])
+    def generate_content(model_action):
+        if not model_action.endswith(':generateContent'):
+            return jsonify({'error': {'code': 404}}), 404
+        with lock:
+            state['generate_requests'] += 1
+        failure, status, delay = inject_failure()
+        time.sleep(delay / 1000.0)
+        if failure:
+            return jsonify(failure), status, {'Retry-After': '0'}
+
+        parts = (request.get_json(silent=True) or {}).get('contents', [{}])[0].get('parts', [])
+        prompt = next((p['text'] for p in parts if 'text' in p), '')
+        file_part = next((p for p in parts if 'inline_data' in p or 'file_data' in p), None)
+
+        if file_part:
+            data = file_part.get('inline_data', {}).get('data') or file_part.get('file_data', {}).get('file_uri', '')
+            body = _extraction_response(data[:256])
+        elif '"rule"' in prompt:
+            body = _transaction_response(prompt)
+        else:
+            body = _invoice_response(prompt)
+
+        text = "```json\n" + json.dumps(body, ensure_ascii=False) + "\n```"
+        return jsonify({'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}}]})
+
+    @app.route('/upload/v1beta/files', methods=['POST'])
+    def start_upload():
+        file_id = uuid.uuid4().hex[:12]
+        upload_url = f"{request.host_url.rstrip('/')}/_upload/{file_id}"
+        return jsonify({}), 200, {'x-goog-upload-url': upload_url, 'x-goog-upload-status': 'active'}
+
+    @app.route('/_upload/<file_id>', methods=['POST'])
+    def finish_upload(file_id):
+        received = 0
+        while True:
+            chunk = request.stream.read(64 * 1024)
+            if not chunk:
+                break
+            received += len(chunk)
+        with lock:
+            state['uploads'] += 1
+            state['uploaded_bytes'] += received
+        return jsonify({'file': {
+            'name': f"files/{file_id}",
+            'uri': f"{request.host_url.rstrip('/')}/v1beta/files/{file_id}",
+            'sizeBytes': str(received),
+            'state': 'ACTIVE',
+        }})
+
+    @app.route('/v1beta/files/<file_id>', methods=['DELETE'])
+    def delete_file(file_id):
+        with lock:
+            state['deletes'] += 1
+        return jsonify({})
+
+    @app.route('/_mock/stats')
+    def stats():
+        with lock:
+            return jsonify(dict(state))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokal ersättare för Gemini API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--latency-jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_mock_app(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                          error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
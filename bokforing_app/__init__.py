@@ -2,7 +2,7 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from config import Config, INSTANCE_FOLDER, UPLOAD_FOLDER
+from config import Config, INSTANCE_FOLDER, MIGRATIONS_FOLDER, UPLOAD_FOLDER
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -12,6 +12,34 @@ def format_currency(value):
         return ""
     return f"{value:,.2f}".replace(",", " ").replace(".", ",")
 
+def _prepare_database(app):
+    """
+    Schemat hanteras med Flask-Migrate (katalogen migrations/). En tom databas
+    skapas direkt från modellerna och markeras som uppgraderad till senaste
+    revisionen; en befintlig databas uppgraderas med `flask db upgrade`.
+    """
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from sqlalchemy import inspect
+
+    script = ScriptDirectory(MIGRATIONS_FOLDER)
+    tables = inspect(db.engine).get_table_names()
+    if not tables:
+        db.create_all()
+        with db.engine.begin() as connection:
+            MigrationContext.configure(connection).stamp(script, 'head')
+        return
+
+    with db.engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    if current is None:
+        app.logger.warning("Databasen saknar schemaversion. Markera den som ursprungsschemat med "
+                           "`flask db stamp 0001` och kör sedan `flask db upgrade`.")
+    elif current != script.get_current_head():
+        app.logger.warning(f"Databasschemat är på revision {current}, senaste är "
+                           f"{script.get_current_head()}. Kör `flask db upgrade`.")
+
+
 def create_app(config_class=Config):
     """Application Factory-funktion"""
 
@@ -22,7 +50,7 @@ def create_app(config_class=Config):
     os.makedirs(INSTANCE_FOLDER, exist_ok=True)
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, directory=MIGRATIONS_FOLDER, render_as_batch=True)
 
     app.jinja_env.filters['currency'] = format_currency
 
@@ -33,7 +61,7 @@ def create_app(config_class=Config):
     app.register_blueprint(api_bp, url_prefix='/api')
 
     with app.app_context():
-        db.create_all() # Create database tables if they don't exist
+        _prepare_database(app)
 
         # Importera Company-modellen här för att undvika cirkulära importer
         from .models import Company
@@ -12,12 +12,24 @@ import json
 from flask import jsonify, request, url_for, current_app, make_response, flash, redirect
 from bokforing_app.api import bp
 from bokforing_app import db
-from bokforing_app.models import Company, BankTransaction, BookkeepingEntry, Bilaga, Association, Setting, Konto, Invoice, InvoiceRow, Client, Matchning
+from bokforing_app.models import Company, BankTransaction, BookkeepingEntry, Bilaga, Association, Setting, Konto, Invoice, InvoiceRow, Client, Matchning, BankgiroPayment
 import bokforing_app.services.booking_service as booking_service
 import bokforing_app.services.sie_service as sie_service
 import bokforing_app.services.gemini_service as gemini_service
 import bokforing_app.services.fakturanu_service as fakturanu_service
+import bokforing_app.services.proxy_service as proxy_service
+import bokforing_app.services.matching_service as matching_service
+import bokforing_app.services.auto_match_service as auto_match_service
+import bokforing_app.services.inbox_service as inbox_service
+import bokforing_app.services.bank_import_service as bank_import_service
+import bokforing_app.services.bgmax_service as bgmax_service
+import bokforing_app.services.reconciliation_service as reconciliation_service
+import bokforing_app.services.balance_service as balance_service
+import bokforing_app.services.report_service as report_service
+from bokforing_app.services import pagination
 from bokforing_app.services.rule_engine import apply_rule
+from bokforing_app.services.accounting_config import get_account_names
+from bokforing_app.services.money import sum_ore
 import os
 from sqlalchemy import extract, or_
 from collections import defaultdict
@@ -46,47 +58,87 @@ def _standardize_gemini_entries(entries):
 
 @bp.route('/company/<int:company_id>/upload_csv', methods=['POST'])
 def upload_csv(company_id):
-    """Hanterar uppladdning och bearbetning av en CSV-fil med banktransaktioner."""
+    """Hanterar uppladdning och bearbetning av ett kontoutdrag (CSV eller camt XML) eller en BGMAX-fil."""
     if 'csv_file' not in request.files or not request.files['csv_file'].filename:
         flash("Ingen fil vald.", "danger")
         return redirect(url_for('main.bokforing_page', company_id=company_id))
     file = request.files['csv_file']
-    if not file.filename.lower().endswith('.csv'):
-        flash("Ogiltig filtyp. Endast .csv-filer är tillåtna.", "danger")
+    if not file.filename.lower().endswith(('.csv', '.xml', '.txt')):
+        flash("Ogiltig filtyp. Endast .csv-, .xml- och .txt-filer (BGMAX) är tillåtna.", "danger")
         return redirect(url_for('main.bokforing_page', company_id=company_id))
+    head = file.read(16)
+    file.seek(0)
     try:
-        stats = booking_service.process_csv_upload(file, company_id)
+        if bgmax_service.is_bgmax(head):
+            stats = booking_service.process_bgmax_upload(file, company_id)
+            message = (f"{stats['payments']} bankgiroinbetalningar i {stats['deposits']} insättningar har importerats. "
+                       f"{stats['invoices']} kopplades till fakturor och {stats['matched']} matchades mot insättningen på kontot.")
+            if stats['skipped']:
+                message += f" {stats['skipped']} insättningar var redan importerade."
+            flash(message, "success")
+            return redirect(url_for('main.bokforing_page', company_id=company_id))
+
+        stats = booking_service.process_bank_file_upload(file, company_id)
         messages = []
         if stats['new'] > 0:
-            messages.append(f"{stats['new']} nya transaktioner har lagts till i 'Obearbetade'.")
+            messages.append(f"{stats['new']} nya transaktioner från {stats['format']} har lagts till i 'Obearbetade'.")
         if stats['duplicates'] > 0:
             messages.append(f"{stats['duplicates']} potentiella dubbletter hittades och väntar på din granskning.")
+        if stats['auto_rejected'] > 0:
+            messages.append(f"{stats['auto_rejected']} dubbletter avvisades automatiskt enligt dubblettpolicyn.")
+        if stats['reconciled']:
+            messages.append(f"Saldot stämmer: {stats['closing_balance']:.2f} kr per {stats['closing_date']}.")
         if not messages:
             flash("Inga nya transaktioner att importera hittades i filen.", "info")
         else:
             flash(" ".join(messages), "success")
+        if stats['reconciled'] is False:
+            issue = stats['balance_issues'][0]
+            where = f"rad {issue['line']}" if 'line' in issue else f"utdrag {issue['statement']}"
+            flash(f"Saldot i filen stämmer inte på {len(stats['balance_issues'])} ställen, första vid {where} "
+                  f"({issue['date']}): saldot är {issue['saldo']:.2f} kr men raderna ger {issue['expected']:.2f} kr. "
+                  f"Rader saknas eller är dubblerade i filen.", "warning")
     except Exception as e:
         db.session.rollback()
-        flash(f"Ett fel inträffade vid bearbetning av CSV: {e}", "danger")
+        flash(f"Ett fel inträffade vid bearbetning av filen: {e}", "danger")
     return redirect(url_for('main.bokforing_page', company_id=company_id))
 
 @bp.route('/company/<int:company_id>/unprocessed_transactions', methods=['GET'])
 def get_unprocessed_transactions(company_id):
-    """Hämtar alla obearbetade transaktioner för ett företag i JSON-format för bootstrap-table."""
-    transactions = BankTransaction.query.filter(
-        BankTransaction.company_id == company_id,
-        or_(BankTransaction.status == 'unprocessed', BankTransaction.status == 'pending_duplicate')
-    ).order_by(BankTransaction.bokforingsdag.desc()).all()
-    
-    data = [{
-        'id': t.id,
-        'bokforingsdag': t.bokforingsdag.strftime('%Y-%m-%d'),
-        'referens': t.referens,
-        'belopp': t.belopp,
-        'status': t.status
-    } for t in transactions]
-    
-    return jsonify(data)
+    """
+    Hämtar en sida obearbetade transaktioner och väntande dubbletter för inkorgen.
+
+    Query-parametrar: `limit`, `cursor` (från föregående svar), `sort`
+    ('bokforingsdag', 'belopp' eller 'referens'), `order` ('asc'/'desc'),
+    `search` (början av referensen) och `status` (en status, annars båda).
+    """
+    status = request.args.get('status')
+    try:
+        page = inbox_service.get_inbox_transactions(
+            company_id,
+            statuses=(status,) if status else inbox_service.INBOX_STATUSES,
+            limit=pagination.page_size(request.args.get('limit')),
+            cursor=request.args.get('cursor'),
+            sort=request.args.get('sort', 'bokforingsdag'),
+            order=request.args.get('order', 'desc'),
+            search=request.args.get('search', ''),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+@bp.route('/company/<int:company_id>/bank_reconciliation', methods=['GET'])
+def get_bank_reconciliation(company_id):
+    """
+    Stämmer av bankkontot (`konto`, 1930 som standard) mot det senaste utgående
+    saldot från ett importerat kontoutdrag.
+    """
+    Company.query.get_or_404(company_id)
+    result = reconciliation_service.reconcile_bank_account(
+        company_id, request.args.get('konto', reconciliation_service.BANK_ACCOUNT))
+    if result is None:
+        return jsonify({'error': 'Inget kontoutdrag med saldo har importerats.'}), 404
+    return jsonify(result)
 
 @bp.route('/transaction/handle_duplicate', methods=['POST'])
 def handle_duplicate():
@@ -98,16 +150,69 @@ def handle_duplicate():
     if transaction.status != 'pending_duplicate':
         return jsonify({'error': 'Transaktionen är inte en väntande dubblett.'}), 400
     if action == 'approve':
+        bank_import_service.assign_free_fingerprint(transaction)
         transaction.status = 'unprocessed'
         db.session.commit()
         return jsonify({'message': 'Transaktionen har godkänts och flyttats till obearbetade.'})
     elif action == 'reject':
-        db.session.delete(transaction)
+        matching_service.delete_transaction(transaction)
         db.session.commit()
         return jsonify({'message': 'Transaktionen har raderats.'})
     else:
         return jsonify({'error': 'Ogiltig åtgärd.'}), 400
 
+@bp.route('/company/<int:company_id>/duplicates/resolve', methods=['POST'])
+def resolve_duplicates(company_id):
+    """
+    Godkänner eller raderar många väntande dubbletter i en förfrågan.
+
+    JSON-kropp: `action` ('approve' eller 'reject') och ett urval: `ids` (lista),
+    `bank_import_id`, `date_from`/`date_to` (ÅÅÅÅ-MM-DD), som kan kombineras,
+    eller `all: true` för alla företagets väntande dubbletter.
+    """
+    data = request.get_json() or {}
+    action = data.get('action')
+    if action not in ('approve', 'reject'):
+        return jsonify({'error': 'Ogiltig åtgärd.'}), 400
+    filters = {key: data.get(key) for key in ('ids', 'bank_import_id', 'date_from', 'date_to')}
+    if all(value is None for value in filters.values()) and not data.get('all'):
+        return jsonify({'error': 'Ange ids, bank_import_id, date_from/date_to eller all.'}), 400
+    try:
+        for key in ('date_from', 'date_to'):
+            if filters[key] is not None:
+                filters[key] = datetime.date.fromisoformat(filters[key])
+        selection = bank_import_service.pending_duplicates(company_id, **filters)
+        count = bank_import_service.resolve_duplicates(company_id, action, selection)
+        db.session.commit()
+    except (ValueError, TypeError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ogiltigt urval: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    if action == 'approve':
+        return jsonify({'message': f'{count} transaktioner har godkänts och flyttats till obearbetade.', 'count': count})
+    return jsonify({'message': f'{count} transaktioner har raderats.', 'count': count})
+
+@bp.route('/company/<int:company_id>/duplicate_policy', methods=['GET'])
+def get_duplicate_policy(company_id):
+    """Hämtar företagets policy för dubbletter vid import."""
+    return jsonify({
+        'policy': bank_import_service.get_duplicate_policy(company_id),
+        'policies': list(bank_import_service.DUPLICATE_POLICIES),
+    })
+
+@bp.route('/company/<int:company_id>/duplicate_policy', methods=['POST'])
+def save_duplicate_policy(company_id):
+    """Sparar företagets policy för dubbletter ('manual', 'reject_exact_overlap' eller 'reject_all')."""
+    Company.query.get_or_404(company_id)
+    try:
+        bank_import_service.set_duplicate_policy(company_id, (request.get_json() or {}).get('policy'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify({'message': 'Dubblettpolicyn har sparats.'})
+
 @bp.route('/company/<int:company_id>/multi_upload_bilagor', methods=['POST'])
 def multi_upload_bilagor(company_id):
     """Hanterar uppladdning av flera bilagor (underlag) samtidigt."""
@@ -163,7 +268,8 @@ def save_bilaga_metadata(bilaga_id):
         bilaga.moms_amount = float(data['total_moms']) if data.get('total_moms') else None
         bilaga.suggested_konto = data.get('suggested_konto')
         bilaga.omvand_skattskyldighet = data.get('omvand_skattskyldighet', False)
-        
+        matching_service.refresh_matched_amounts(bilaga_ids=[bilaga.id])
+
         db.session.commit()
         return jsonify({'message': 'Metadata sparad!'}), 200
     except Exception as e:
@@ -203,6 +309,79 @@ def get_company_attachments(company_id):
     ]
     return jsonify(results)
 
+@bp.route('/company/<int:company_id>/matcha/<string:kind>', methods=['GET'])
+def get_open_items(company_id, kind):
+    """
+    Hämtar nästa sida öppna poster för matchningsvyn.
+    `kind` är 'transactions', 'invoices' eller 'bilagor'. Paginering sker med
+    `cursor` (från föregående svar) och `limit`.
+    """
+    loader = matching_service.OPEN_ITEM_LOADERS.get(kind)
+    if not loader:
+        return jsonify({'error': 'Okänd kolumn.'}), 404
+    try:
+        rows, next_cursor = loader(company_id, limit=pagination.page_size(request.args.get('limit')),
+                                   cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'rows': rows, 'next_cursor': next_cursor})
+
+@bp.route('/company/<int:company_id>/verifikationer', methods=['GET'])
+def get_verifikationer(company_id):
+    """
+    Hämtar nästa sida bokförda verifikationer (nyast först) med poster och
+    kontonamn. Paginering sker med `cursor` och `limit`; `year` filtrerar på år.
+    """
+    try:
+        rows, next_cursor = booking_service.get_verifikationer(
+            company_id,
+            limit=pagination.page_size(request.args.get('limit')),
+            cursor=request.args.get('cursor'),
+            year=request.args.get('year', type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'rows': rows, 'next_cursor': next_cursor})
+
+@bp.route('/company/<int:company_id>/huvudbok', methods=['GET'])
+def get_huvudbok(company_id):
+    """
+    Hämtar en sida av huvudboken. Query-parametrar: `date_from`, `date_to`
+    (ÅÅÅÅ-MM-DD, innevarande år som standard), `konto_from`, `konto_to`,
+    `limit` och `cursor` (från föregående svar).
+    """
+    try:
+        date_from, date_to = report_service.parse_period(request.args.get('date_from'), request.args.get('date_to'))
+        page = report_service.ledger_page(
+            company_id, date_from, date_to,
+            konto_from=request.args.get('konto_from'),
+            konto_to=request.args.get('konto_to'),
+            limit=pagination.page_size(request.args.get('limit'), report_service.LEDGER_PAGE_SIZE),
+            cursor=request.args.get('cursor'),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+@bp.route('/company/<int:company_id>/saldobalans', methods=['GET'])
+def get_saldobalans(company_id):
+    """Hämtar saldobalansen. Query-parametrar som för huvudboken, utan paginering."""
+    try:
+        date_from, date_to = report_service.parse_period(request.args.get('date_from'), request.args.get('date_to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report_service.trial_balance(
+        company_id, date_from, date_to,
+        konto_from=request.args.get('konto_from'), konto_to=request.args.get('konto_to'),
+    ))
+
+@bp.route('/kontoplan', methods=['GET'])
+def get_kontoplan():
+    """Returnerar kontoplanen {kontonummer: beskrivning}. Svaret får cachas av webbläsaren."""
+    response = jsonify(get_account_names())
+    response.cache_control.max_age = 300
+    return response
+
 @bp.route('/verifikation/<int:trans_id>', methods=['GET'])
 def get_verifikation(trans_id):
     """Hämtar all data för en enskild verifikation, inklusive kopplade underlag."""
@@ -365,10 +544,11 @@ def batch_book_invoices_ai():
                 new_entry = BookkeepingEntry(
                     bank_transaction=new_trans,
                     konto=entry_data['konto'],
-                    debet=round(float(entry_data.get('debet', 0)), 2),
-                    kredit=round(float(entry_data.get('kredit', 0)), 2)
+                    debet=float(entry_data.get('debet', 0)),
+                    kredit=float(entry_data.get('kredit', 0))
                 )
                 db.session.add(new_entry)
+            balance_service.refresh_balances([balance_service.period_of(company_id, new_trans.bokforingsdag)])
             db.session.commit()
             success_count += 1
         except Exception as e:
@@ -381,53 +561,37 @@ def create_verifikation(company_id):
     """Skapar en helt ny, manuell verifikation."""
     data = request.json
     try:
-        if not data.get('bokforingsdag') or not data.get('referens'):
-            raise ValueError("Datum och referens är obligatoriska.")
-        total_debet = sum(float(e.get('debet', 0)) for e in data['entries'])
-        total_kredit = sum(float(e.get('kredit', 0)) for e in data['entries'])
-        if abs(total_debet - total_kredit) > 0.01:
-            raise ValueError("Obalans! Debet och kredit summerar inte till samma värde.")
-        
-        new_trans = BankTransaction(
-            company_id=company_id,
-            bokforingsdag=datetime.datetime.strptime(data['bokforingsdag'], '%Y-%m-%d').date(),
-            referens=data['referens'],
-            belopp=total_debet,
-            status='processed'
-        )
-        db.session.add(new_trans)
-
-        # Koppla bilagor och uppdatera deras status/metadata
-        omvand_skattskyldighet = data.get('omvand_skattskyldighet', False)
-        attachment_ids = data.get('attachment_ids', [])
-        if attachment_ids:
-            for att_id in attachment_ids:
-                attachment = Bilaga.query.get(att_id)
-                if attachment:
-                    new_trans.attachments.append(attachment)
-                    attachment.status = 'assigned'
-                    # Spara flaggan på bilagan
-                    attachment.omvand_skattskyldighet = omvand_skattskyldighet
-        
-        for inv_id in data.get('invoice_ids', []):
-            invoice = Invoice.query.get(inv_id)
-            if invoice: new_trans.invoices.append(invoice)
-
-        for entry_data in data['entries']:
-            new_entry = BookkeepingEntry(
-                bank_transaction=new_trans,
-                konto=entry_data['konto'],
-                debet=float(entry_data.get('debet', 0)),
-                kredit=float(entry_data.get('kredit', 0))
-            )
-            db.session.add(new_entry)
-            
+        new_trans, = booking_service.create_verifikationer(company_id, [data])
         db.session.commit()
         return jsonify({'message': 'Verifikation skapad!', 'id': new_trans.id}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/company/<int:company_id>/verifikationer/batch', methods=['POST'])
+def create_verifikationer_batch(company_id):
+    """
+    Skapar många manuella verifikationer i ett anrop, t.ex. från importskript.
+    Tar emot {'verifikationer': [...]} i samma format som en enskild verifikation.
+    Allt eller inget: är någon verifikation ogiltig skapas ingen.
+    """
+    Company.query.get_or_404(company_id)
+    items = (request.get_json(silent=True) or {}).get('verifikationer')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Inga verifikationer att skapa.'}), 400
+    try:
+        # Id:n läses före commit, som annars laddar om varje objekt
+        ids = [t.id for t in booking_service.create_verifikationer(company_id, items)]
+        db.session.commit()
+        return jsonify({'message': f'{len(ids)} verifikationer skapade!', 'ids': ids}), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error creating verifikationer for company {company_id}: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/verifikation/<int:trans_id>', methods=['PUT'])
 def update_verifikation(trans_id):
     """Uppdaterar en befintlig verifikation."""
@@ -435,35 +599,7 @@ def update_verifikation(trans_id):
     data = request.json
     try:
         current_app.logger.info(f"Updating transaction {trans_id} with data: {data}")
-
-        if not data.get('bokforingsdag') or not data.get('referens'):
-            raise ValueError("Datum och referens är obligatoriska.")
-        
-        total_debet = sum(float(e.get('debet', 0)) for e in data['entries'])
-        total_kredit = sum(float(e.get('kredit', 0)) for e in data['entries'])
-        if abs(total_debet - total_kredit) > 0.01:
-            raise ValueError("Obalans! Debet och kredit summerar inte till samma värde.")
-        
-        # Update main transaction details
-        trans.bokforingsdag = datetime.datetime.strptime(data['bokforingsdag'], '%Y-%m-%d').date()
-        trans.referens = data['referens']
-        trans.belopp = total_debet  # Update the total amount
-        trans.status = 'processed'
-        
-        # Clear old entries using a robust method
-        trans.entries.clear()
-        db.session.flush() # Ensure the clear is processed before adding new ones
-
-        # Add new entries
-        for entry_data in data['entries']:
-            new_entry = BookkeepingEntry(
-                bank_transaction_id=trans_id,
-                konto=entry_data['konto'],
-                debet=float(entry_data.get('debet', 0)),
-                kredit=float(entry_data.get('kredit', 0))
-            )
-            db.session.add(new_entry)
-            
+        booking_service.update_verifikation(trans, data)
         db.session.commit()
         current_app.logger.info(f"Successfully updated transaction {trans_id}.")
         return jsonify({'message': 'Verifikation uppdaterad!', 'id': trans.id}), 200
@@ -480,7 +616,7 @@ def delete_verifikation(trans_id):
         # Återställ status på kopplade bilagor
         for att in trans.attachments:
             att.status = 'unassigned'
-        db.session.delete(trans)
+        matching_service.delete_transaction(trans)
         db.session.commit()
         return jsonify({'message': 'Verifikation har raderats permanent.'}), 200
     except Exception as e:
@@ -494,32 +630,67 @@ def create_matchning():
     try:
         if not data.get('matches'):
             raise ValueError("Inga matchningar att skapa.")
-        for match_data in data['matches']:
-            new_match = Matchning(
-                amount=float(match_data['amount']),
-                transaction_id=int(match_data['transaction_id']),
-                invoice_id=int(match_data['invoice_id']) if match_data.get('invoice_id') else None,
-                bilaga_id=int(match_data['bilaga_id']) if match_data.get('bilaga_id') else None
-            )
-            db.session.add(new_match)
+        matching_service.create_matchningar(data['matches'])
         db.session.commit()
         return jsonify({'message': f'{len(data["matches"])} matchningar har skapats!'}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/company/<int:company_id>/auto_match', methods=['GET'])
+def propose_auto_matches(company_id):
+    """Tar fram förslag på automatiska matchningar utan att spara något."""
+    Company.query.get_or_404(company_id)
+    proposals = auto_match_service.find_matches(company_id)
+    return jsonify({'proposals': proposals, 'count': len(proposals)})
+
+@bp.route('/company/<int:company_id>/auto_match', methods=['POST'])
+def apply_auto_matches(company_id):
+    """
+    Skapar matchningar automatiskt för förslag med minst given säkerhet
+    (`min_confidence`: 'high' som standard, 'medium' eller 'low').
+    """
+    Company.query.get_or_404(company_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        result = auto_match_service.apply_matches(company_id, data.get('min_confidence', 'high'))
+        return jsonify({
+            'message': f"{result['created']} matchningar har skapats automatiskt.",
+            **result
+        }), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/matchningar/<int:match_id>', methods=['DELETE'])
 def delete_matchning(match_id):
     """Raderar en specifik matchning."""
     match = Matchning.query.get_or_404(match_id)
     try:
-        db.session.delete(match)
+        matching_service.delete_matchning(match)
         db.session.commit()
         return jsonify({'message': 'Matchningen har raderats.'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/transaction/<int:trans_id>/bankgiro_payments', methods=['GET'])
+def get_bankgiro_payments(trans_id):
+    """Hämtar bankgiroinbetalningarna (från BGMAX) som ingår i en insättning."""
+    BankTransaction.query.get_or_404(trans_id)
+    payments = BankgiroPayment.query.filter_by(bank_transaction_id=trans_id).order_by(BankgiroPayment.id).all()
+    return jsonify([{
+        'id': p.id,
+        'referens': p.referens,
+        'namn': p.namn,
+        'payer_bankgiro': p.payer_bankgiro,
+        'amount': p.amount,
+        'invoice_id': p.invoice_id,
+    } for p in payments])
+
 @bp.route('/transaction/<int:trans_id>/ask_gemini', methods=['POST'])
 def ask_gemini_for_suggestion(trans_id):
     """
@@ -636,14 +807,15 @@ def batch_book_with_ai():
             if not entries_data:
                 raise Exception("Inget förslag kunde genereras.")
             BookkeepingEntry.query.filter_by(bank_transaction_id=trans_id).delete()
-            total_debet = sum(float(e.get('debet', 0)) for e in entries_data)
-            total_kredit = sum(float(e.get('kredit', 0)) for e in entries_data)
-            if abs(total_debet - total_kredit) > 0.01 or total_debet == 0:
+            total_debet = sum_ore(float(e.get('debet', 0)) for e in entries_data)
+            total_kredit = sum_ore(float(e.get('kredit', 0)) for e in entries_data)
+            if total_debet != total_kredit or total_debet == 0:
                 raise Exception("Obalans i förslaget")
             for entry_data in entries_data:
                 new_entry = BookkeepingEntry(bank_transaction_id=trans_id, konto=entry_data['konto'], debet=float(entry_data.get('debet', 0)), kredit=float(entry_data.get('kredit', 0)))
                 db.session.add(new_entry)
             transaction.status = 'processed'
+            balance_service.refresh_balances([balance_service.period_of(transaction.company_id, transaction.bokforingsdag)])
             db.session.commit()
             success_ids.append(trans_id)
         except Exception as e:
@@ -684,6 +856,11 @@ def generate_sie(company_id):
     response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
     
+@bp.route('/proxy_status', methods=['GET'])
+def get_proxy_status():
+    """Returnerar proxyns cachade hälsostatus och mätvärden för anslutningstesterna."""
+    return jsonify({'proxy': proxy_service.get_proxy_metrics()})
+
 @bp.route('/ai_settings', methods=['GET'])
 def get_ai_settings():
     """Hämtar alla AI-inställningar (associationer och custom prompt)."""
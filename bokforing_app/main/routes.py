@@ -7,17 +7,20 @@ som att hämta data från databasen och skicka den till Jinja2-mallarna för ren
 """
 import os
 import time
-from flask import render_template, request, flash, redirect, url_for, Response, current_app, jsonify, send_from_directory
+from flask import render_template, request, flash, redirect, url_for, Response, current_app, jsonify, send_from_directory, stream_with_context
 from bokforing_app.main import bp
-from bokforing_app.models import Company, BankTransaction, BookkeepingEntry, Invoice, InvoiceRow, Client, Bilaga, \
-    Matchning, Konto
+from bokforing_app.models import AccountBalance, Company, BankTransaction, Invoice, Konto
 from bokforing_app import db
-from bokforing_app.services.accounting_config import KONTOPLAN, ASSOCIATION_MAP
+from bokforing_app.services.accounting_config import KONTOPLAN
 import bokforing_app.services.booking_service as booking_service
-import bokforing_app.services.fakturanu_service as fakturanu_service
+import bokforing_app.services.sync_scheduler as sync_scheduler
+import bokforing_app.services.matching_service as matching_service
+import bokforing_app.services.inbox_service as inbox_service
+import bokforing_app.services.balance_service as balance_service
+import bokforing_app.services.report_service as report_service
 from bokforing_app.services.sie_service import generate_sie_file
-from datetime import datetime, timedelta
-from sqlalchemy import extract, func, and_
+from bokforing_app.services.money import from_ore
+from datetime import datetime
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
@@ -55,22 +58,18 @@ def bokforing_page(company_id):
     Hämtar och visar obearbetade transaktioner och potentiella dubbletter.
     """
     company = Company.query.get_or_404(company_id)
+    search = request.args.get('search', '').strip()
 
-    unprocessed_transactions = BankTransaction.query.filter_by(
-        company_id=company_id,
-        status='unprocessed'
-    ).order_by(BankTransaction.bokforingsdag.desc()).all()
-
-    pending_duplicates = BankTransaction.query.filter_by(
-        company_id=company_id,
-        status='pending_duplicate'
-    ).order_by(BankTransaction.bokforingsdag.desc()).all()
+    # Första sidan renderas på servern, resten hämtas från API:t med markören
+    inbox = inbox_service.get_inbox_transactions(company_id, statuses=('unprocessed',), search=search)
 
     return render_template(
         'transactions.html',
         company=company,
-        transactions=unprocessed_transactions,
-        pending_duplicates=pending_duplicates,
+        transactions=inbox['rows'],
+        next_cursor=inbox['next_cursor'],
+        counts=inbox['counts'],
+        search=search,
         kontoplan=KONTOPLAN
     )
 
@@ -82,61 +81,26 @@ def matcha_page(company_id):
     1. Transaktioner med kvarvarande belopp att matcha.
     2. Fakturor med kvarvarande belopp att betala.
     3. Bilagor med kvarvarande belopp att betala.
+    Endast första sidan av varje kolumn renderas; resten hämtas via
+    /api/company/<id>/matcha/<kolumn> när användaren bläddrar vidare.
     """
     company = Company.query.get_or_404(company_id)
 
-    # Subquery för att summera matchade belopp per transaktion
-    subquery_trans = db.session.query(
-        Matchning.transaction_id,
-        func.sum(Matchning.amount).label('total_matched')
-    ).group_by(Matchning.transaction_id).subquery()
-
-    # Hämta transaktioner där matchat belopp är mindre än transaktionens belopp
-    unmatched_transactions = db.session.query(
-        BankTransaction,
-        (BankTransaction.belopp - func.coalesce(subquery_trans.c.total_matched, 0)).label('remaining_amount')
-    ).outerjoin(subquery_trans, BankTransaction.id == subquery_trans.c.transaction_id).filter(
-        BankTransaction.company_id == company_id,
-        func.coalesce(subquery_trans.c.total_matched, 0) < BankTransaction.belopp
-    ).all()
-
-    # Subquery för att summera matchade belopp per faktura
-    subquery_inv = db.session.query(
-        Matchning.invoice_id,
-        func.sum(Matchning.amount).label('total_matched')
-    ).group_by(Matchning.invoice_id).subquery()
-
-    # Hämta fakturor där matchat belopp är mindre än fakturans summa
-    unpaid_invoices = db.session.query(
-        Invoice,
-        (Invoice.sum - func.coalesce(subquery_inv.c.total_matched, 0)).label('remaining_amount')
-    ).outerjoin(subquery_inv, Invoice.id == subquery_inv.c.invoice_id).filter(
-        Invoice.company_id == company_id,
-        func.coalesce(subquery_inv.c.total_matched, 0) < Invoice.sum
-    ).all()
-
-    # Subquery för att summera matchade belopp per bilaga
-    subquery_bil = db.session.query(
-        Matchning.bilaga_id,
-        func.sum(Matchning.amount).label('total_matched')
-    ).group_by(Matchning.bilaga_id).subquery()
-
-    # Hämta bilagor där matchat belopp är mindre än bilagans summa
-    unpaid_bilagor = db.session.query(
-        Bilaga,
-        (Bilaga.brutto_amount - func.coalesce(subquery_bil.c.total_matched, 0)).label('remaining_amount')
-    ).outerjoin(subquery_bil, Bilaga.id == subquery_bil.c.bilaga_id).filter(
-        Bilaga.company_id == company_id,
-        Bilaga.brutto_amount != None,
-        func.coalesce(subquery_bil.c.total_matched, 0) < Bilaga.brutto_amount
-    ).all()
+    unmatched_transactions, transactions_cursor = matching_service.get_open_transactions(company_id)
+    unpaid_invoices, invoices_cursor = matching_service.get_open_invoices(company_id)
+    unpaid_bilagor, bilagor_cursor = matching_service.get_open_bilagor(company_id)
 
     return render_template(
         'matcha.html',
         company=company,
         unmatched_transactions=unmatched_transactions,
         unpaid_invoices=unpaid_invoices,
-        unpaid_bilagor=unpaid_bilagor
+        unpaid_bilagor=unpaid_bilagor,
+        next_cursors={
+            'transactions': transactions_cursor,
+            'invoices': invoices_cursor,
+            'bilagor': bilagor_cursor,
+        }
     )
 
 
@@ -182,116 +146,25 @@ def sync_invoices(company_id):
         flash("API-nycklar för Faktura.nu saknas. Vänligen lägg till dem i företagsprofilen.", "danger")
         return redirect(url_for('main.invoices', company_id=company.id))
 
-    # Hämta senaste ändringsdatum från databasen för att bara hämta nya/ändrade fakturor
-    last_updated_invoice = Invoice.query.filter_by(company_id=company_id).order_by(Invoice.updated_at.desc()).first()
-    modified_since = last_updated_invoice.updated_at.strftime('%Y-%m-%d %H:%M:%S') if last_updated_invoice else None
-
-    params = {}
-    if modified_since:
-        # Använd 'start_date' från API-dokumentationen istället för 'modified_since' (som inte stöds)
-        params['start_date'] = modified_since.split(' ')[0]  # Använd endast datum för filter
-
-    list_result = fakturanu_service.get_invoices(company.fakturanu_key_id, company.fakturanu_password, params=params)
-
-    if 'error' in list_result:
-        flash(f"Synkronisering misslyckades: {list_result['error']}", "danger")
+    try:
+        # Samma markör som bakgrundssynkroniseringen, så att bara nya/ändrade fakturor hämtas
+        result = sync_scheduler.sync_company(company)
+    except Exception as e:
+        current_app.logger.error(f"Oväntat fel vid fakturasynkronisering: {e}", exc_info=True)
+        flash(f"Synkronisering misslyckades: {e}", "danger")
         return redirect(url_for('main.invoices', company_id=company.id))
 
-    # Uppdaterad parsning: Använd 'invoices' istället för 'data' enligt get_invoices-struktur
-    api_invoices_list = list_result.get('invoices', [])
-    current_app.logger.info(f"Hämtade {len(api_invoices_list)} fakturor från API.")
-
-    new_invoices = 0
-    updated_invoices = 0
-    new_clients = 0
-
-    for api_invoice in api_invoices_list:
-        fakturanu_id = api_invoice['id']
-        current_app.logger.debug(f"Behandlar faktura {fakturanu_id}.")
-
-        client_id = api_invoice.get('client_id')
-        client = None
-        if client_id:
-            client = Client.query.filter_by(fakturanu_id=client_id, company_id=company.id).first()
-            if not client:
-                client_details_result = fakturanu_service.get_client_details(company.fakturanu_key_id,
-                                                                             company.fakturanu_password, client_id)
-                if 'data' in client_details_result:
-                    client_data = client_details_result['data']
-                    client = Client(
-                        fakturanu_id=client_id,
-                        company_id=company.id,
-                        name=client_data.get('name'),
-                        org_number=client_data.get('org_number'),
-                        email=client_data.get('email'),
-                        phone=client_data.get('phone'),
-                        street_address=client_data.get('address', {}).get('street_address'),
-                        zip_code=client_data.get('address', {}).get('zip_code'),
-                        city=client_data.get('address', {}).get('city'),
-                        country=client_data.get('address', {}).get('country')
-                    )
-                    db.session.add(client)
-                    new_clients += 1
-                    current_app.logger.debug(f"Skapade ny klient {client_id}.")
-
-        if not client:
-            current_app.logger.warning(f"Kunde inte hitta eller skapa klient för faktura {fakturanu_id}. Hoppar över.")
-            continue
-
-        invoice = Invoice.query.filter_by(fakturanu_id=fakturanu_id).first()
-        status = 'betald' if api_invoice.get('paid_at') else 'skickad' if api_invoice.get('sent') else 'utkast'
-
-        if not invoice:
-            invoice = Invoice(fakturanu_id=fakturanu_id, company_id=company.id)
-            new_invoices += 1
-            current_app.logger.debug(f"Skapade ny faktura {fakturanu_id}.")
-        elif invoice.status != status:
-            updated_invoices += 1
-            current_app.logger.debug(f"Uppdaterade faktura {fakturanu_id} på grund av statusändring.")
-
-        invoice.client = client
-        invoice.number = api_invoice.get('number')
-        invoice.our_reference = api_invoice.get('our_reference')
-        invoice.your_reference = api_invoice.get('your_reference')
-        invoice.locale = api_invoice.get('locale')
-        invoice.currency = api_invoice.get('currency')
-        invoice.sum = float(api_invoice.get('sum', 0.0))
-        invoice.net = float(api_invoice.get('net', 0.0))
-        invoice.tax = float(api_invoice.get('tax', 0.0))
-        invoice.status = status
-        invoice.reverse_charge = api_invoice.get('reverse_charge', False)
-        invoice.date = datetime.strptime(api_invoice['date'], '%Y-%m-%d').date() if api_invoice.get('date') else None
-        invoice.paid_at = datetime.strptime(api_invoice['paid_at'], '%Y-%m-%d').date() if api_invoice.get(
-            'paid_at') else None
-
-        if invoice.date:
-            days_to_due = api_invoice.get('days', 30)
-            invoice.due_date = invoice.date + timedelta(days=days_to_due)
-
-        # Uppdatera rader (rows)
-        InvoiceRow.query.filter_by(invoice_id=invoice.id).delete()
-        for row_data in api_invoice.get('rows', []):
-            new_row = InvoiceRow(
-                invoice=invoice,
-                product_id=row_data.get('product_id'),
-                product_code=row_data.get('product_code'),
-                product_name=row_data.get('product_name'),
-                product_unit=row_data.get('product_unit'),
-                discount=float(row_data.get('discount', 0.0)),
-                amount=float(row_data.get('amount', 0.0)),
-                price=float(row_data.get('product_price', 0.0)),
-                tax_rate=int(row_data.get('product_tax', 0))
-            )
-            db.session.add(new_row)
-
-        db.session.add(invoice)
-        current_app.logger.debug(f"Lade till/ uppdaterade faktura {fakturanu_id} i sessionen.")
+    if 'error' in result:
+        flash(f"Synkronisering misslyckades: {result['error']}", "danger")
+        return redirect(url_for('main.invoices', company_id=company.id))
 
-    db.session.commit()
     current_app.logger.info(
-        f"Synkronisering slutförd: {new_invoices} nya fakturor, {updated_invoices} uppdaterade, {new_clients} nya klienter.")
+        f"Synkronisering slutförd: {result['new']} nya fakturor, {result['updated']} uppdaterade, "
+        f"{result['unchanged']} oförändrade, {result['new_clients']} nya klienter "
+        f"(hämtning {result['fetch_seconds']}s, skrivning {result['write_seconds']}s).")
     flash(
-        f'{new_invoices} nya fakturor, {updated_invoices} uppdaterade fakturor och {new_clients} nya klienter synkroniserades.',
+        f"{result['new']} nya fakturor, {result['updated']} uppdaterade fakturor och {result['new_clients']} nya klienter synkroniserades. "
+        f"{result['unchanged']} fakturor var oförändrade.",
         'success')
 
     return redirect(url_for('main.invoices', company_id=company.id))
@@ -315,14 +188,21 @@ def toggle_reverse_charge(invoice_id):
 
 @bp.route('/company/<int:company_id>/verifikationer', methods=['GET'])
 def verifikationer_page(company_id):
-    """Visar en lista över alla bokförda verifikationer för ett företag."""
+    """
+    Visar bokförda verifikationer för ett företag. Första sidan renderas här,
+    resten hämtas med oändlig scroll från API:t. Kontoplanen till redigeringsmodalen
+    hämtas separat från /api/kontoplan.
+    """
     company = Company.query.get_or_404(company_id)
-    transactions = booking_service.get_verifikationer(company_id)
+    year = request.args.get('year', type=int)
+    transactions, next_cursor = booking_service.get_verifikationer(company_id, year=year)
     return render_template(
         'verifikationer.html',
         company=company,
         transactions=transactions,
-        kontoplan=KONTOPLAN
+        next_cursor=next_cursor,
+        years=booking_service.get_verifikation_years(company_id),
+        selected_year=year
     )
 
 
@@ -339,39 +219,43 @@ def bilagor_page(company_id):
     )
 
 
+def _report_months(year, quarter, month):
+    """Rapportperiodens första och sista månad som (år, månad), hela historiken utan år."""
+    if not year:
+        return (0, 1), (9999, 12)
+    if quarter:
+        first = (int(quarter) - 1) * 3 + 1
+        return (year, first), (year, first + 2)
+    if month:
+        return (year, int(month)), (year, int(month))
+    return (year, 1), (year, 12)
+
+
 @bp.route('/company/<int:company_id>/momsrapport', methods=['GET'])
 def momsrapport_page(company_id):
-    """Genererar och visar en momsrapport för en vald period."""
+    """Genererar och visar en momsrapport för en vald period, från månadssaldona per konto."""
     company = Company.query.get_or_404(company_id)
 
-    available_years = db.session.query(extract('year', BankTransaction.bokforingsdag)).distinct().order_by(
-        extract('year', BankTransaction.bokforingsdag).desc()).all()
+    available_years = db.session.query(AccountBalance.year).filter(
+        AccountBalance.company_id == company_id).distinct().order_by(AccountBalance.year.desc()).all()
     available_years = [y[0] for y in available_years if y[0] is not None]
 
     selected_year = request.args.get('year', str(datetime.now().year) if available_years else '', type=int)
     selected_quarter = request.args.get('quarter', '')
     selected_month = request.args.get('month', '')
 
-    query = BankTransaction.query.filter_by(company_id=company_id, status='processed')
-
     report_period = str(selected_year)
-    if selected_year:
-        query = query.filter(extract('year', BankTransaction.bokforingsdag) == selected_year)
-
     if selected_quarter:
         report_period += f" Kvartal {selected_quarter}"
-        start_month = (int(selected_quarter) - 1) * 3 + 1
-        end_month = start_month + 2
-        query = query.filter(extract('month', BankTransaction.bokforingsdag).between(start_month, end_month))
     elif selected_month:
         report_period += f" Månad {selected_month}"
-        query = query.filter(extract('month', BankTransaction.bokforingsdag) == int(selected_month))
 
-    transactions = query.all()
+    balances = balance_service.get_balances(company_id, *_report_months(selected_year, selected_quarter, selected_month))
 
+    # Summeras i hela ören och omvandlas till kronor före rendering
     moms_data = {}
     total_utgaende = 0
-    total_ingende = .0
+    total_ingende = 0
 
     moms_konton = {
         '2611': 'Utgående moms (25%)', '2612': 'Utgående moms (12%)', '2613': 'Utgående moms (6%)',
@@ -379,24 +263,25 @@ def momsrapport_page(company_id):
     }
 
     for konto_nr, desc in moms_konton.items():
+        debet, kredit = balances.get(konto_nr, (0, 0))
         moms_data[konto_nr] = {'description': desc, 'utgaende': 0, 'ingende': 0}
+        if konto_nr.startswith('261'):
+            moms_data[konto_nr]['utgaende'] = kredit
+            total_utgaende += kredit
+        elif konto_nr.startswith('264'):
+            moms_data[konto_nr]['ingende'] = debet
+            total_ingende += debet
 
-    for trans in transactions:
-        for entry in trans.entries:
-            if entry.konto in moms_konton:
-                if entry.konto.startswith('261'):
-                    moms_data[entry.konto]['utgaende'] += entry.kredit
-                    total_utgaende += entry.kredit
-                elif entry.konto.startswith('264'):
-                    moms_data[entry.konto]['ingende'] += entry.debet
-                    total_ingende += entry.debet
+    for row in moms_data.values():
+        row['utgaende'] = from_ore(row['utgaende'])
+        row['ingende'] = from_ore(row['ingende'])
 
     return render_template(
         'momsrapport.html',
         company=company,
         moms_data=moms_data,
-        total_utgaende=total_utgaende,
-        total_ingende=total_ingende,
+        total_utgaende=from_ore(total_utgaende),
+        total_ingende=from_ore(total_ingende),
         available_years=available_years,
         selected_year=selected_year,
         selected_quarter=selected_quarter,
@@ -415,34 +300,26 @@ def export_moms_xml(company_id):
     selected_quarter = request.args.get('quarter', '')
     selected_month = request.args.get('month', '')
 
-    query = BookkeepingEntry.query.join(BankTransaction).filter(
-        BankTransaction.company_id == company_id,
-        BankTransaction.status == 'processed'
-    )
-
-    period_str = ""
-    if selected_year:
-        query = query.filter(extract('year', BankTransaction.bokforingsdag) == selected_year)
-        period_str = str(selected_year)
-
-    if selected_quarter:
-        start_month = (int(selected_quarter) - 1) * 3 + 1
-        end_month = start_month + 2
-        query = query.filter(extract('month', BankTransaction.bokforingsdag).between(start_month, end_month))
-    elif selected_month:
-        query = query.filter(extract('month', BankTransaction.bokforingsdag) == int(selected_month))
+    period_str = str(selected_year) if selected_year else ""
+    if selected_month and not selected_quarter:
         period_str += str(selected_month).zfill(2)
-    else:
+    elif not selected_quarter:
         period_str += "12"
 
-    entries = query.all()
+    balances = balance_service.get_balances(company_id, *_report_months(selected_year, selected_quarter, selected_month))
+
+    def kredit(prefix):
+        return from_ore(sum(k for konto, (_, k) in balances.items() if konto.startswith(prefix)))
+
+    def debet(prefix):
+        return from_ore(sum(d for konto, (d, _) in balances.items() if konto.startswith(prefix)))
 
     xml_data = {
-        'ForsMomsEjAnnan': sum(e.kredit for e in entries if e.konto.startswith('30')),
-        'MomsUtgHog': sum(e.kredit for e in entries if e.konto == '2611'),
-        'MomsUtgMedel': sum(e.kredit for e in entries if e.konto == '2612'),
-        'MomsUtgLag': sum(e.kredit for e in entries if e.konto == '2613'),
-        'MomsIngAvdr': sum(e.debet for e in entries if e.konto.startswith('264')),
+        'ForsMomsEjAnnan': kredit('30'),
+        'MomsUtgHog': from_ore(balances.get('2611', (0, 0))[1]),
+        'MomsUtgMedel': from_ore(balances.get('2612', (0, 0))[1]),
+        'MomsUtgLag': from_ore(balances.get('2613', (0, 0))[1]),
+        'MomsIngAvdr': debet('264'),
     }
 
     total_utg_moms = xml_data.get('MomsUtgHog', 0) + xml_data.get('MomsUtgMedel', 0) + xml_data.get('MomsUtgLag', 0)
@@ -469,6 +346,95 @@ def export_moms_xml(company_id):
     )
 
 
+def _report_args():
+    """Period och kontointervall för huvudbok och saldobalans från query-parametrarna."""
+    date_from, date_to = report_service.parse_period(request.args.get('date_from'), request.args.get('date_to'))
+    return date_from, date_to, request.args.get('konto_from') or None, request.args.get('konto_to') or None
+
+
+def _report_filename(name, company, date_from, date_to):
+    return f"{name}_{company.org_nummer}_{date_from:%Y%m%d}-{date_to:%Y%m%d}.csv"
+
+
+@bp.route('/company/<int:company_id>/huvudbok', methods=['GET'])
+def huvudbok_page(company_id):
+    """Visar huvudboken för en period, en sida i taget."""
+    company = Company.query.get_or_404(company_id)
+    try:
+        date_from, date_to, konto_from, konto_to = _report_args()
+        page = report_service.ledger_page(
+            company_id, date_from, date_to, konto_from, konto_to,
+            limit=report_service.LEDGER_PAGE_SIZE, cursor=request.args.get('cursor'),
+        )
+    except ValueError as e:
+        flash(f"Ogiltigt urval: {e}", "danger")
+        return redirect(url_for('main.huvudbok_page', company_id=company_id))
+    return render_template(
+        'huvudbok.html',
+        company=company,
+        accounts=page['accounts'],
+        next_cursor=page['next_cursor'],
+        date_from=date_from,
+        date_to=date_to,
+        konto_from=konto_from or '',
+        konto_to=konto_to or '',
+    )
+
+
+@bp.route('/company/<int:company_id>/huvudbok/export_csv', methods=['GET'])
+def export_huvudbok_csv(company_id):
+    """Exporterar hela huvudboken för perioden som CSV. Filen strömmas medan den skapas."""
+    company = Company.query.get_or_404(company_id)
+    try:
+        date_from, date_to, konto_from, konto_to = _report_args()
+    except ValueError as e:
+        flash(f"Ogiltigt urval: {e}", "danger")
+        return redirect(url_for('main.huvudbok_page', company_id=company_id))
+    return Response(
+        stream_with_context(report_service.ledger_csv(company_id, date_from, date_to, konto_from, konto_to)),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment;filename={_report_filename("huvudbok", company, date_from, date_to)}'}
+    )
+
+
+@bp.route('/company/<int:company_id>/saldobalans', methods=['GET'])
+def saldobalans_page(company_id):
+    """Visar saldobalansen för en period."""
+    company = Company.query.get_or_404(company_id)
+    try:
+        date_from, date_to, konto_from, konto_to = _report_args()
+    except ValueError as e:
+        flash(f"Ogiltigt urval: {e}", "danger")
+        return redirect(url_for('main.saldobalans_page', company_id=company_id))
+    report = report_service.trial_balance(company_id, date_from, date_to, konto_from, konto_to)
+    return render_template(
+        'saldobalans.html',
+        company=company,
+        rows=report['rows'],
+        totals=report['totals'],
+        date_from=date_from,
+        date_to=date_to,
+        konto_from=konto_from or '',
+        konto_to=konto_to or '',
+    )
+
+
+@bp.route('/company/<int:company_id>/saldobalans/export_csv', methods=['GET'])
+def export_saldobalans_csv(company_id):
+    """Exporterar saldobalansen för perioden som CSV."""
+    company = Company.query.get_or_404(company_id)
+    try:
+        date_from, date_to, konto_from, konto_to = _report_args()
+    except ValueError as e:
+        flash(f"Ogiltigt urval: {e}", "danger")
+        return redirect(url_for('main.saldobalans_page', company_id=company_id))
+    return Response(
+        stream_with_context(report_service.trial_balance_csv(company_id, date_from, date_to, konto_from, konto_to)),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment;filename={_report_filename("saldobalans", company, date_from, date_to)}'}
+    )
+
+
 @bp.route('/ai_settings_page', methods=['GET'])
 def ai_settings_page():
     """Visar sidan för AI-inställningar."""
@@ -530,7 +496,7 @@ def api_generate_sie():
                         accounts_dict[account_num] = {"name": account_name}
                         current_app.logger.warning(f"Konto {account_num} fanns i en verifikation men inte i Konto-tabellen. Lades till dynamiskt.")
 
-                    amount = entry.debet - entry.kredit
+                    amount = from_ore((entry.debet_ore or 0) - (entry.kredit_ore or 0))
                     ver_transactions.append({
                         "account": account_num,
                         "amount": amount,
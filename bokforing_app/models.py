@@ -6,22 +6,31 @@ Denna fil innehåller alla ORM-klasser (Object-Relational Mapping) som represent
 tabellerna i databasen. Varje klass motsvarar en tabell och definierar dess
 kolumner, relationer och beteenden.
 
+Alla belopp lagras som heltal i öre i kolumner med suffixet `_ore`. Kronattributen
+med de ursprungliga namnen (`belopp`, `debet`, `sum`, ...) räknar om automatiskt,
+se `bokforing_app.services.money`.
+
 Modeller:
 - Company: Representerar ett företag/klient i systemet.
 - BankTransaction: Representerar en enskild banktransaktion (verifikation).
 - BookkeepingEntry: Representerar en rad i en verifikation (debet/kredit).
+- AccountBalance: Summerad debet och kredit per företag, månad och konto.
 - Bilaga: Representerar ett uppladdat underlag (t.ex. kvitto, PDF).
 - Invoice: Representerar en kundfaktura, synkroniserad från Fakturan.nu.
 - InvoiceRow: En rad på en kundfaktura.
 - Client: En kund till ett företag, synkroniserad från Fakturan.nu.
 - Matchning: En kopplingstabell med belopp för att matcha transaktioner med fakturor/bilagor.
+- BankImport: En uppladdning av ett kontoutdrag med saldon och avstämningsresultat.
+- BankgiroPayment: En inbetalning från en BGMAX-fil, kopplad till insättningen och fakturan.
 - Association: En regel för att automatiskt koppla transaktionsreferenser till konton.
 - Setting: En tabell för generella systeminställningar.
 - Konto: Representerar ett konto i BAS-kontoplanen.
 """
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy.ext.hybrid import hybrid_property
 from bokforing_app import db
+from bokforing_app.services.money import from_ore, to_ore
 
 # --- Association Tables for Many-to-Many Relationships ---
 
@@ -40,6 +49,39 @@ bilaga_transaction_association = db.Table('bilaga_transaction_association',
 
 # --- Main Models ---
 
+def _starts_as(column_name):
+    """
+    Standardvärde som kopierar en annan kolumn i samma INSERT, t.ex. att
+    `remaining_amount` börjar som hela beloppet innan något har matchats.
+    """
+    def default(context):
+        return context.get_current_parameters().get(column_name)
+    return default
+
+
+def _kronor(ore_attribute):
+    """
+    Kronattribut för en beloppskolumn som lagras i hela ören. Läsning ger kronor
+    (float), tilldelning omvandlas till öre och i SQL-uttryck blir det `kolumn / 100.0`.
+    Använd `*_ore`-kolumnen direkt för exakta summor, jämförelser och index.
+    """
+    def fget(self):
+        return from_ore(getattr(self, ore_attribute))
+
+    def fset(self, value):
+        setattr(self, ore_attribute, to_ore(value))
+
+    def expr(cls):
+        return getattr(cls, ore_attribute) / 100.0
+
+    return hybrid_property(fget, fset, expr=expr)
+
+
+def _not_sqlite(ddl, target, bind, **kw):
+    """DDL-villkor för index som bara skapas utanför SQLite."""
+    return kw['dialect'].name != 'sqlite'
+
+
 class Company(db.Model):
     """
     Representerar ett företag som använder bokföringssystemet.
@@ -72,8 +114,23 @@ class BankTransaction(db.Model):
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
     bokforingsdag = db.Column(db.Date, nullable=False)
     referens = db.Column(db.String(200))
-    belopp = db.Column(db.Float, nullable=False)
+    belopp_ore = db.Column(db.BigInteger, nullable=False)
     status = db.Column(db.String(20), default='unprocessed') # Ex: 'unprocessed', 'processed', 'pending_duplicate'
+    # Dubblettnyckel för importerade rader, se bank_import_service. NULL för manuella
+    # verifikationer och väntande dubbletter.
+    fingerprint = db.Column(db.String(64), nullable=True)
+    # Strukturerad referens (OCR) från camt-filer, för matchning mot fakturor
+    ocr = db.Column(db.String(50), nullable=True)
+    # Importen (kontoutdraget) som transaktionen kom från
+    bank_import_id = db.Column(db.Integer, db.ForeignKey('bank_import.id'), nullable=True, index=True)
+
+    # Denormaliserade matchningssummor, underhålls av matching_service.refresh_matched_amounts
+    matched_amount_ore = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    remaining_amount_ore = db.Column(db.BigInteger, nullable=False, default=_starts_as('belopp_ore'))
+
+    belopp = _kronor('belopp_ore')
+    matched_amount = _kronor('matched_amount_ore')
+    remaining_amount = _kronor('remaining_amount_ore')
 
     company = db.relationship('Company', back_populates='transactions')
     entries = db.relationship('BookkeepingEntry', backref='bank_transaction', lazy=True, cascade="all, delete-orphan")
@@ -85,16 +142,53 @@ class BankTransaction(db.Model):
     # Ny relation för delbetalningar/matchningar
     matchningar = db.relationship('Matchning', back_populates='transaction', lazy=True, cascade="all, delete-orphan")
 
+    # Index för keyset-paginering på (bokforingsdag, id) per företag, för inkorgen
+    # per status, för prefixsökning på referens och för dubblettkontrollen. Referensindexet
+    # har NOCASE i SQLite, där LIKE är skiftlägesokänsligt; andra databaser får ett vanligt index
+    __table_args__ = (
+        db.Index('ix_bank_transaction_company_dag_id', 'company_id', 'bokforingsdag', 'id'),
+        db.Index('ix_bank_transaction_company_status_dag_id', 'company_id', 'status', 'bokforingsdag', 'id'),
+        db.Index('ix_bank_transaction_company_referens', 'company_id',
+                 db.text('referens COLLATE NOCASE')).ddl_if(dialect='sqlite'),
+        db.Index('ix_bank_transaction_company_referens', 'company_id', 'referens').ddl_if(callable_=_not_sqlite),
+        db.Index('ix_bank_transaction_company_fingerprint', 'company_id', 'fingerprint', unique=True),
+    )
+
 class BookkeepingEntry(db.Model):
     """
     Representerar en enskild rad (post) i en verifikation.
     Varje verifikation består av minst två sådana rader (debet och kredit).
     """
     id = db.Column(db.Integer, primary_key=True)
-    bank_transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transaction.id'), nullable=False)
+    bank_transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transaction.id'), nullable=False, index=True)
     konto = db.Column(db.String(10), nullable=False)
-    debet = db.Column(db.Float, default=0.0)
-    kredit = db.Column(db.Float, default=0.0)
+    debet_ore = db.Column(db.BigInteger, default=0)
+    kredit_ore = db.Column(db.BigInteger, default=0)
+
+    debet = _kronor('debet_ore')
+    kredit = _kronor('kredit_ore')
+
+class AccountBalance(db.Model):
+    """
+    Summan av debet och kredit per företag, månad och konto för bokförda
+    verifikationer. Underhålls av balance_service i samma transaktion som posterna
+    ändras, så att periodrapporter kan läsa några rader per konto och månad i
+    stället för alla poster.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    konto = db.Column(db.String(10), nullable=False)
+    debet_ore = db.Column(db.BigInteger, nullable=False, default=0)
+    kredit_ore = db.Column(db.BigInteger, nullable=False, default=0)
+
+    debet = _kronor('debet_ore')
+    kredit = _kronor('kredit_ore')
+
+    __table_args__ = (
+        db.Index('ix_account_balance_period_konto', 'company_id', 'year', 'month', 'konto', unique=True),
+    )
 
 class Bilaga(db.Model):
     """
@@ -112,16 +206,30 @@ class Bilaga(db.Model):
     fakturadatum = db.Column(db.Date, nullable=True)
     forfallodag = db.Column(db.Date, nullable=True)
     ocr = db.Column(db.String(50), nullable=True)
-    brutto_amount = db.Column(db.Float, nullable=True)
-    netto_amount = db.Column(db.Float, nullable=True)
-    moms_amount = db.Column(db.Float, nullable=True)
+    brutto_amount_ore = db.Column(db.BigInteger, nullable=True)
+    netto_amount_ore = db.Column(db.BigInteger, nullable=True)
+    moms_amount_ore = db.Column(db.BigInteger, nullable=True)
     suggested_konto = db.Column(db.String(10), nullable=True)
     omvand_skattskyldighet = db.Column(db.Boolean, default=False, nullable=False) # Flagga för omvänd skattskyldighet
 
+    # Denormaliserade matchningssummor, underhålls av matching_service.refresh_matched_amounts
+    matched_amount_ore = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    remaining_amount_ore = db.Column(db.BigInteger, nullable=True, default=_starts_as('brutto_amount_ore'))
+
+    brutto_amount = _kronor('brutto_amount_ore')
+    netto_amount = _kronor('netto_amount_ore')
+    moms_amount = _kronor('moms_amount_ore')
+    matched_amount = _kronor('matched_amount_ore')
+    remaining_amount = _kronor('remaining_amount_ore')
+
     company = db.relationship('Company', back_populates='bilagor')
     transactions = db.relationship('BankTransaction', secondary=bilaga_transaction_association, back_populates='attachments')
     matchningar = db.relationship('Matchning', back_populates='bilaga', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_bilaga_company_fakturadatum_id', 'company_id', 'fakturadatum', 'id'),
+    )
+
 class Invoice(db.Model):
     """
     Representerar en kundfaktura, oftast synkroniserad från ett externt system som Fakturan.nu.
@@ -139,13 +247,23 @@ class Invoice(db.Model):
     paid_at = db.Column(db.Date, nullable=True)
     locale = db.Column(db.String(10))
     currency = db.Column(db.String(10))
-    sum = db.Column(db.Float)
-    net = db.Column(db.Float)
-    tax = db.Column(db.Float)
+    sum_ore = db.Column(db.BigInteger)
+    net_ore = db.Column(db.BigInteger)
+    tax_ore = db.Column(db.BigInteger)
     status = db.Column(db.String(20)) # Ex: 'utkast', 'skickad', 'betald'
     reverse_charge = db.Column(db.Boolean, default=False) # Flagga för omvänd skattskyldighet
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_hash = db.Column(db.String(64), nullable=True) # Fingeravtryck av API-datan vid senaste synkronisering
+
+    # Denormaliserade matchningssummor, underhålls av matching_service.refresh_matched_amounts
+    matched_amount_ore = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    remaining_amount_ore = db.Column(db.BigInteger, nullable=True, default=_starts_as('sum_ore'))
 
+    sum = _kronor('sum_ore')
+    net = _kronor('net_ore')
+    tax = _kronor('tax_ore')
+    matched_amount = _kronor('matched_amount_ore')
+    remaining_amount = _kronor('remaining_amount_ore')
 
     company = db.relationship('Company', back_populates='invoices')
     client = db.relationship('Client', back_populates='invoices')
@@ -153,13 +271,18 @@ class Invoice(db.Model):
     transactions = db.relationship('BankTransaction', secondary=invoice_transaction_association, back_populates='invoices')
     matchningar = db.relationship('Matchning', back_populates='invoice', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_invoice_company_date_id', 'company_id', 'date', 'id'),
+        db.Index('ix_invoice_company_number', 'company_id', 'number'),
+    )
+
 class InvoiceRow(db.Model):
     """Representerar en rad på en kundfaktura."""
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=False)
     product_name = db.Column(db.String(200))
-    amount = db.Column(db.Float)
-    price = db.Column(db.Float)
+    amount = db.Column(db.Float) # Antal
+    price_ore = db.Column(db.BigInteger) # Styckpris
     tax_rate = db.Column(db.Integer)
     # ... andra fält från Fakturan.nu
     product_id = db.Column(db.Integer)
@@ -167,6 +290,8 @@ class InvoiceRow(db.Model):
     product_unit = db.Column(db.String(20))
     discount = db.Column(db.Float)
 
+    price = _kronor('price_ore')
+
     invoice = db.relationship('Invoice', back_populates='rows')
 
 class Client(db.Model):
@@ -193,23 +318,94 @@ class Matchning(db.Model):
     representerar en specifik summa som kopplar ihop en transaktion med en faktura eller en bilaga.
     """
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)  # Det specifikt matchade beloppet
+    amount_ore = db.Column(db.BigInteger, nullable=False)  # Det specifikt matchade beloppet
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Foreign Keys: En matchning måste alltid ha en transaktion.
-    transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transaction.id'), nullable=False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transaction.id'), nullable=False, index=True)
     # En matchning kan ha antingen en faktura ELLER en bilaga.
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=True)
-    bilaga_id = db.Column(db.Integer, db.ForeignKey('bilaga.id'), nullable=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=True, index=True)
+    bilaga_id = db.Column(db.Integer, db.ForeignKey('bilaga.id'), nullable=True, index=True)
     
     # Relationer tillbaka till huvudmodellerna
     transaction = db.relationship('BankTransaction', back_populates='matchningar')
     invoice = db.relationship('Invoice', back_populates='matchningar')
     bilaga = db.relationship('Bilaga', back_populates='matchningar')
 
+    amount = _kronor('amount_ore')
+
     def __repr__(self):
         return f'<Matchning {self.id}: {self.amount}kr - Trans {self.transaction_id} -> {"Invoice" if self.invoice else "Bilaga"} {self.invoice_id or self.bilaga_id}>'
 
+class BankImport(db.Model):
+    """
+    En uppladdning av ett kontoutdrag. Sparar utdragets saldon och resultatet av
+    saldoavstämningen vid importen, se reconciliation_service.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    filename = db.Column(db.String(255))
+    format = db.Column(db.String(50))
+    new_count = db.Column(db.Integer, default=0)
+    duplicate_count = db.Column(db.Integer, default=0)
+
+    first_date = db.Column(db.Date)
+    last_date = db.Column(db.Date)
+    opening_balance_ore = db.Column(db.BigInteger, nullable=True)  # Saldo före utdragets första rad
+    closing_balance_ore = db.Column(db.BigInteger, nullable=True)  # Saldo efter utdragets sista rad
+    closing_date = db.Column(db.Date, nullable=True)
+    # None om filen saknar saldon, annars om alla saldon stämde
+    reconciled = db.Column(db.Boolean, nullable=True)
+    balance_errors = db.Column(db.Integer, default=0)
+    balance_issues = db.Column(db.Text, nullable=True)  # JSON-lista med de första avvikelserna
+
+    opening_balance = _kronor('opening_balance_ore')
+    closing_balance = _kronor('closing_balance_ore')
+
+    transactions = db.relationship('BankTransaction', backref='bank_import', lazy=True)
+
+    __table_args__ = (
+        db.Index('ix_bank_import_company_closing', 'company_id', 'closing_date', 'id'),
+    )
+
+class BankgiroPayment(db.Model):
+    """
+    En enskild inbetalning (eller ett avdrag) från en BGMAX-fil från Bankgirot.
+    Inbetalningarna på en insättning kopplas till den banktransaktion som
+    insättningen blev på kontot, och till den kundfaktura som OCR-referensen anger.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    bank_transaction_id = db.Column(db.Integer, db.ForeignKey('bank_transaction.id'), nullable=True, index=True)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), nullable=True, index=True)
+
+    # Insättningen som betalningen ingår i
+    betalningsdag = db.Column(db.Date, nullable=False)
+    bankgiro = db.Column(db.String(10))  # Mottagarens bankgironummer
+    deposit_serial = db.Column(db.String(5))  # Insättningens löpnummer
+    deposit_amount_ore = db.Column(db.BigInteger, nullable=False)
+
+    # Betalningen
+    record_type = db.Column(db.String(2), nullable=False)  # '20' betalning, '21' avdrag
+    payer_bankgiro = db.Column(db.String(10))
+    referens = db.Column(db.String(25))
+    extra_referenser = db.Column(db.Text)  # Referenser från extra referensposter, blankstegsseparerade
+    amount_ore = db.Column(db.BigInteger, nullable=False)  # Negativt för avdrag
+    bgc_serial = db.Column(db.String(12))  # Bankgirots löpnummer för betalningen
+    namn = db.Column(db.String(70))
+
+    amount = _kronor('amount_ore')
+    deposit_amount = _kronor('deposit_amount_ore')
+
+    transaction = db.relationship('BankTransaction')
+    invoice = db.relationship('Invoice')
+
+    # En insättning importeras bara en gång, och okopplade insättningar söks per företag
+    __table_args__ = (
+        db.Index('ix_bankgiro_payment_company_deposit', 'company_id', 'betalningsdag', 'bankgiro', 'deposit_serial'),
+    )
+
 class Konto(db.Model):
     """Representerar ett konto i BAS-kontoplanen."""
     id = db.Column(db.Integer, primary_key=True)
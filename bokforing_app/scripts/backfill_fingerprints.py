@@ -0,0 +1,67 @@
+"""
+Beräknar fingeravtryck för befintliga transaktioner, så att dubblettkontrollen
+vid import känner igen rader som redan finns. Kolumnen och dess unika index
+skapas av migreringen (`flask db upgrade`).
+
+Alla transaktioner utom väntande dubbletter får ett fingeravtryck, även manuella
+verifikationer, eftersom den tidigare kontrollen jämförde mot alla transaktioner.
+Likadana rader numreras i id-ordning. Rader som redan har ett fingeravtryck
+lämnas orörda, så skriptet kan köras flera gånger.
+
+Körs från projektets rot:
+    python -m bokforing_app.scripts.backfill_fingerprints
+"""
+from collections import Counter
+
+from sqlalchemy import update
+
+from bokforing_app import create_app, db
+from bokforing_app.models import BankTransaction
+from bokforing_app.services.bank_import_service import IMPORT_CHUNK_SIZE, fingerprint, normalize_reference
+
+
+def backfill_company(company_id):
+    """Beräknar saknade fingeravtryck för ett företag. Returnerar antal uppdaterade rader."""
+    taken = {fp for fp, in db.session.query(BankTransaction.fingerprint).filter(
+        BankTransaction.company_id == company_id, BankTransaction.fingerprint.isnot(None))}
+    rows = db.session.query(
+        BankTransaction.id, BankTransaction.bokforingsdag, BankTransaction.referens, BankTransaction.belopp_ore,
+    ).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.fingerprint.is_(None),
+        BankTransaction.status != 'pending_duplicate',
+    ).order_by(BankTransaction.id).all()
+
+    seen = Counter()
+    values = []
+    for trans_id, bokforingsdag, referens, belopp_ore in rows:
+        key = (bokforingsdag, normalize_reference(referens), belopp_ore)
+        while True:
+            fp = fingerprint(*key, occurrence=seen[key])
+            seen[key] += 1
+            if fp not in taken:
+                break
+        taken.add(fp)
+        values.append({'id': trans_id, 'fingerprint': fp})
+
+    for i in range(0, len(values), IMPORT_CHUNK_SIZE):
+        db.session.execute(update(BankTransaction), values[i:i + IMPORT_CHUNK_SIZE])
+    db.session.commit()
+    return len(values)
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        company_ids = [cid for cid, in db.session.query(BankTransaction.company_id).distinct()]
+        total = 0
+        for company_id in company_ids:
+            count = backfill_company(company_id)
+            if count:
+                print(f"Företag {company_id}: {count} fingeravtryck")
+            total += count
+    print(f"Klart, {total} transaktioner fick fingeravtryck.")
+
+
+if __name__ == "__main__":
+    main()
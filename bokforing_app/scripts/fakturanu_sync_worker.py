@@ -0,0 +1,46 @@
+"""
+Bakgrundsprocess som synkroniserar fakturor från Fakturan.nu för alla företag
+med API-nycklar.
+
+Körs från projektets rot:
+    python -m bokforing_app.scripts.fakturanu_sync_worker --interval 900 --jitter 60
+
+Stoppas med Ctrl+C eller SIGTERM. En pågående synkronisering avslutas mellan
+två sidor och tas upp igen från samma markör vid nästa start.
+"""
+import argparse
+import logging
+import signal
+import threading
+
+from bokforing_app import create_app
+from bokforing_app.services import sync_scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schemalagd synkronisering av fakturor från Fakturan.nu.")
+    parser.add_argument('--interval', type=float, default=sync_scheduler.SYNC_INTERVAL_SECONDS,
+                        help="Sekunder mellan två synkroniseringar av samma företag.")
+    parser.add_argument('--jitter', type=float, default=sync_scheduler.SYNC_JITTER_SECONDS,
+                        help="Maximal slumpmässig förskjutning (±) av varje körning i sekunder.")
+    parser.add_argument('--once', action='store_true', help="Synkronisera alla företag en gång och avsluta.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        logging.getLogger(__name__).info(f"Fick signal {signum}, stoppar efter pågående sida...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    app = create_app()
+    with app.app_context():
+        sync_scheduler.run_scheduler(stop_event, interval=args.interval, jitter=args.jitter, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Kontrollerar och bygger om månadssaldona per konto (`AccountBalance`) från
+verifikationernas poster, t.ex. första gången efter uppgraderingen eller om
+poster har ändrats utanför applikationen.
+
+Körs från projektets rot:
+    python -m bokforing_app.scripts.rebuild_balances                # kontrollera och bygg om
+    python -m bokforing_app.scripts.rebuild_balances --check        # bara kontrollera
+    python -m bokforing_app.scripts.rebuild_balances --company 3    # ett företag
+
+Avslutas med kod 1 om avvikelser hittades vid --check, t.ex. för att köras i cron.
+"""
+import argparse
+import sys
+
+from bokforing_app import create_app
+from bokforing_app.services.balance_service import rebuild_balances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrollera och bygg om månadssaldona per konto.")
+    parser.add_argument('--check', action='store_true', help="Rapportera avvikelser utan att ändra något.")
+    parser.add_argument('--company', type=int, help="Endast detta företag (id).")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        result = rebuild_balances(company_id=args.company, check_only=args.check)
+
+    print(f"{result['periods']} månader kontrollerade, {result['mismatched']} avvek")
+    if args.check and result['mismatched']:
+        sys.exit(1)
+    if not args.check:
+        print("Månadssaldona är ombyggda." if result['mismatched'] else "Inga avvikelser hittades.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Kontrollerar och återställer de denormaliserade matchningssummorna
+(`matched_amount` och `remaining_amount`) på transaktioner, fakturor och bilagor
+mot Matchning-tabellen.
+
+Körs från projektets rot:
+    python -m bokforing_app.scripts.rebuild_matched_amounts          # kontrollera och återställ
+    python -m bokforing_app.scripts.rebuild_matched_amounts --check  # bara kontrollera
+
+Avslutas med kod 1 om avvikelser hittades vid --check, t.ex. för att köras i cron.
+"""
+import argparse
+import sys
+
+from bokforing_app import create_app
+from bokforing_app.services.matching_service import rebuild_matched_amounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontrollera och återställ matchningssummorna.")
+    parser.add_argument('--check', action='store_true', help="Rapportera avvikelser utan att ändra något.")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        mismatches = rebuild_matched_amounts(check_only=args.check)
+
+    for table, count in mismatches.items():
+        print(f"{table}: {count} avvikande rader")
+    if args.check and any(mismatches.values()):
+        sys.exit(1)
+    if not args.check:
+        print("Matchningssummorna är återställda." if any(mismatches.values()) else "Inga avvikelser hittades.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1279,5 +1279,14 @@ def load_accounting_config():
 
     current_app.logger.info("Accounting config loaded from DB.")
 
+
+def get_account_names():
+    """
+    Returnerar kontoplanen {kontonummer: beskrivning} som laddades från databasen.
+    Kartan hålls i minnet mellan anrop; moduler som gjort `from ... import KONTOPLAN`
+    ser inte omladdningar, så läs via denna funktion.
+    """
+    return KONTOPLAN
+
 # Initial laddning (kan behöva anropas explicit vid appstart)
 # load_accounting_config()
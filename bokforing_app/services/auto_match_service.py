@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Automatisk matchning av banktransaktioner mot kundfakturor och bilagor.
+
+Alla öppna fakturor och bilagor för ett företag läses in en gång och indexeras i
+minnet på:
+- OCR-nummer och fakturanummer (siffrorna i referensen),
+- exakt belopp i öre (hashtabell),
+- datum (sorterad lista för sökning inom ett datumfönster med bisect).
+
+Varje öppen transaktion slås sedan upp i indexen i stället för att jämföras mot
+varje underlag, så körtiden växer ungefär linjärt med antalet poster.
+Inbetalningar (positiva belopp) matchas mot kundfakturor och utbetalningar
+(negativa belopp) mot bilagor. Hittas ingen enskild post söks en kombination av
+upp till MAX_SUBSET_SIZE poster inom datumfönstret vars summa exakt motsvarar
+transaktionen (begränsad subset-sum-sökning), t.ex. en betalning av flera fakturor.
+
+Förslag med säkerheten 'high' (referens och belopp stämmer) kan skapas som
+Matchning-rader direkt; övriga föreslås för manuell kontroll i matchningsvyn.
+"""
+import bisect
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from bokforing_app import db
+from bokforing_app.models import BankTransaction, Bilaga, Invoice
+from bokforing_app.services import matching_service
+from bokforing_app.services.money import from_ore
+
+DATE_WINDOW_DAYS = 60        # Hur långt från underlagets datum en betalning får ligga
+MIN_REFERENCE_DIGITS = 3     # Kortare siffergrupper i referensen ignoreras (t.ex. datumdelar)
+MAX_SUBSET_CANDIDATES = 12   # Antal närliggande poster som prövas i subset-sum-sökningen
+MAX_SUBSET_SIZE = 4          # Max antal underlag som en betalning kan täcka
+CONFIDENCE_LEVELS = ('low', 'medium', 'high')
+
+_DIGITS = re.compile(r'\d+')
+
+
+def _digits(value: Optional[str]) -> Optional[str]:
+    """Normaliserar ett OCR- eller fakturanummer till enbart siffror utan inledande nollor."""
+    if not value:
+        return None
+    digits = ''.join(_DIGITS.findall(value)).lstrip('0')
+    return digits if len(digits) >= MIN_REFERENCE_DIGITS else None
+
+
+@dataclass
+class OpenItem:
+    kind: str            # 'invoice' eller 'bilaga'
+    id: int
+    remaining_ore: int
+    item_date: Optional[date]
+    references: List[str] = field(default_factory=list)
+
+
+class OpenItemIndex:
+    """Index över öppna poster av en sort (fakturor eller bilagor)."""
+
+    def __init__(self, items: List[OpenItem]):
+        self.by_reference: Dict[str, List[OpenItem]] = defaultdict(list)
+        self.by_amount: Dict[int, List[OpenItem]] = defaultdict(list)
+        for item in items:
+            for ref in item.references:
+                self.by_reference[ref].append(item)
+            self.by_amount[item.remaining_ore].append(item)
+        dated = sorted((i for i in items if i.item_date), key=lambda i: (i.item_date, i.id))
+        self._dates = [i.item_date for i in dated]
+        self._dated = dated
+
+    def nearest(self, around: date, limit: int, days: int = DATE_WINDOW_DAYS) -> List[OpenItem]:
+        """
+        Upp till `limit` öppna poster inom ±`days` dagar, närmast i tid först.
+        Söker utåt från `around` i den sorterade listan, så kostnaden beror på
+        `limit` och inte på hur många poster som ligger i fönstret.
+        """
+        lo_bound = around - timedelta(days=days)
+        hi_bound = around + timedelta(days=days)
+        right = bisect.bisect_left(self._dates, around)
+        left = right - 1
+        found = []
+        while len(found) < limit:
+            left_ok = left >= 0 and self._dates[left] >= lo_bound
+            right_ok = right < len(self._dates) and self._dates[right] <= hi_bound
+            if not left_ok and not right_ok:
+                break
+            if left_ok and (not right_ok or around - self._dates[left] <= self._dates[right] - around):
+                item, left = self._dated[left], left - 1
+            else:
+                item, right = self._dated[right], right + 1
+            if item.remaining_ore > 0:
+                found.append(item)
+        return found
+
+    def take(self, item: OpenItem, amount_ore: int) -> None:
+        """Minskar postens kvarvarande belopp så att den inte matchas två gånger."""
+        self.by_amount[item.remaining_ore].remove(item)
+        item.remaining_ore -= amount_ore
+        if item.remaining_ore > 0:
+            self.by_amount[item.remaining_ore].append(item)
+
+
+def _load_invoices(company_id: int) -> List[OpenItem]:
+    rows = db.session.query(
+        Invoice.id, Invoice.number, Invoice.date, Invoice.due_date, Invoice.remaining_amount_ore,
+    ).filter(Invoice.company_id == company_id, Invoice.remaining_amount_ore > 0)
+
+    items = []
+    for invoice_id, number, invoice_date, due_date, remaining in rows:
+        ref = _digits(number)
+        items.append(OpenItem('invoice', invoice_id, remaining, due_date or invoice_date, [ref] if ref else []))
+    return items
+
+
+def _load_bilagor(company_id: int) -> List[OpenItem]:
+    rows = db.session.query(
+        Bilaga.id, Bilaga.ocr, Bilaga.fakturanr, Bilaga.fakturadatum, Bilaga.forfallodag, Bilaga.remaining_amount_ore,
+    ).filter(Bilaga.company_id == company_id, Bilaga.remaining_amount_ore > 0)
+
+    items = []
+    for bilaga_id, ocr, fakturanr, fakturadatum, forfallodag, remaining in rows:
+        refs = [r for r in {_digits(ocr), _digits(fakturanr)} if r]
+        items.append(OpenItem('bilaga', bilaga_id, remaining, forfallodag or fakturadatum, refs))
+    return items
+
+
+def _load_transactions(company_id: int) -> List[Dict[str, Any]]:
+    # Utbetalningar har negativt belopp men matchas med positiva belopp, därför abs()
+    rows = db.session.query(
+        BankTransaction.id, BankTransaction.bokforingsdag, BankTransaction.referens, BankTransaction.ocr,
+        BankTransaction.belopp_ore, BankTransaction.matched_amount_ore,
+    ).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status != 'pending_duplicate',
+        BankTransaction.matched_amount_ore < func.abs(BankTransaction.belopp_ore),
+    ).order_by(BankTransaction.bokforingsdag, BankTransaction.id)
+
+    transactions = []
+    for trans_id, bokforingsdag, referens, ocr, belopp, matched in rows:
+        remaining = abs(belopp) - matched
+        if remaining > 0:
+            refs = {d.lstrip('0') for d in _DIGITS.findall(referens or '') if len(d.lstrip('0')) >= MIN_REFERENCE_DIGITS}
+            if _digits(ocr):
+                refs.add(_digits(ocr))
+            transactions.append({'id': trans_id, 'date': bokforingsdag, 'remaining_ore': remaining,
+                                 'incoming': belopp > 0, 'references': refs, 'referens': referens})
+    return transactions
+
+
+def _find_subset(candidates: List[OpenItem], target: int) -> Optional[List[OpenItem]]:
+    """
+    Söker en kombination av högst MAX_SUBSET_SIZE poster vars kvarvarande belopp
+    summerar exakt till `target` öre. Anroparen begränsar `candidates` till
+    MAX_SUBSET_CANDIDATES poster, vilket håller sökrymden liten.
+    """
+    pool = sorted((c for c in candidates if 0 < c.remaining_ore <= target),
+                  key=lambda c: c.remaining_ore, reverse=True)
+    # suffix[i] = summan av pool[i:], för att kunna avbryta grenar som inte kan nå målet
+    suffix = [0] * (len(pool) + 1)
+    for i in range(len(pool) - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + pool[i].remaining_ore
+
+    def search(start: int, remaining: int, chosen: List[OpenItem]) -> Optional[List[OpenItem]]:
+        if remaining == 0:
+            return list(chosen) if len(chosen) > 1 else None
+        if len(chosen) == MAX_SUBSET_SIZE or suffix[start] < remaining:
+            return None
+        for i in range(start, len(pool)):
+            amount = pool[i].remaining_ore
+            if amount > remaining:
+                continue
+            chosen.append(pool[i])
+            found = search(i + 1, remaining - amount, chosen)
+            chosen.pop()
+            if found:
+                return found
+        return None
+
+    return search(0, target, [])
+
+
+def _match_transaction(trans: Dict[str, Any], index: OpenItemIndex) -> Optional[Tuple[str, str, List[Tuple[OpenItem, int]]]]:
+    """Returnerar (metod, säkerhet, [(post, belopp i öre)]) för bästa matchningen, eller None."""
+    target = trans['remaining_ore']
+
+    # 1. Referens (OCR/fakturanummer): exakt belopp eller delbetalning
+    by_ref = [item for ref in trans['references'] for item in index.by_reference.get(ref, ())
+              if item.remaining_ore > 0]
+    if by_ref:
+        exact = next((item for item in by_ref if item.remaining_ore == target), None)
+        if exact:
+            return 'reference', 'high', [(exact, target)]
+        if len(by_ref) == 1:
+            item = by_ref[0]
+            return 'reference_partial', 'medium', [(item, min(target, item.remaining_ore))]
+
+    # 2. Exakt belopp inom datumfönstret, närmast i tid först
+    def distance(item: OpenItem) -> int:
+        return abs((item.item_date - trans['date']).days) if item.item_date else DATE_WINDOW_DAYS
+
+    same_amount = [item for item in index.by_amount.get(target, ()) if distance(item) <= DATE_WINDOW_DAYS]
+    if same_amount:
+        best = min(same_amount, key=lambda i: (distance(i), i.id))
+        return 'amount', 'medium' if len(same_amount) == 1 else 'low', [(best, target)]
+
+    # 3. Flera underlag som tillsammans motsvarar betalningen
+    subset = _find_subset(index.nearest(trans['date'], MAX_SUBSET_CANDIDATES), target)
+    if subset:
+        return 'subset', 'low', [(item, item.remaining_ore) for item in subset]
+    return None
+
+
+def find_matches(company_id: int) -> List[Dict[str, Any]]:
+    """
+    Tar fram matchningsförslag för alla öppna transaktioner i ett företag, äldst
+    först. Inget skrivs till databasen.
+
+    Returns:
+        En lista med förslag: {'transaction_id', 'referens', 'method', 'confidence',
+        'matches': [{'transaction_id', 'invoice_id', 'bilaga_id', 'amount'}]}.
+    """
+    invoices = OpenItemIndex(_load_invoices(company_id))
+    bilagor = OpenItemIndex(_load_bilagor(company_id))
+
+    proposals = []
+    for trans in _load_transactions(company_id):
+        index = invoices if trans['incoming'] else bilagor
+        result = _match_transaction(trans, index)
+        if not result:
+            continue
+        method, confidence, parts = result
+        for item, amount_ore in parts:
+            index.take(item, amount_ore)
+        proposals.append({
+            'transaction_id': trans['id'],
+            'referens': trans['referens'],
+            'method': method,
+            'confidence': confidence,
+            'matches': [{
+                'transaction_id': trans['id'],
+                'invoice_id': item.id if item.kind == 'invoice' else None,
+                'bilaga_id': item.id if item.kind == 'bilaga' else None,
+                'amount': from_ore(amount_ore),
+            } for item, amount_ore in parts],
+        })
+    return proposals
+
+
+def apply_matches(company_id: int, min_confidence: str = 'high') -> Dict[str, Any]:
+    """
+    Kör den automatiska matchningen och skapar Matchning-rader för förslag med
+    minst säkerheten `min_confidence`. Övriga förslag returneras för granskning.
+
+    Returns:
+        {'created': antal matchningar, 'applied': [förslag], 'proposed': [förslag]}
+    """
+    if min_confidence not in CONFIDENCE_LEVELS:
+        raise ValueError(f"Ogiltig säkerhetsnivå: {min_confidence}")
+    threshold = CONFIDENCE_LEVELS.index(min_confidence)
+
+    applied, proposed = [], []
+    for proposal in find_matches(company_id):
+        (applied if CONFIDENCE_LEVELS.index(proposal['confidence']) >= threshold else proposed).append(proposal)
+
+    created = matching_service.create_matchningar([m for p in applied for m in p['matches']])
+    db.session.commit()
+    return {'created': len(created), 'applied': applied, 'proposed': proposed}
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Månadssaldon per konto: summerad debet och kredit per (företag, år, månad, konto)
+för bokförda verifikationer, i tabellen AccountBalance.
+
+Tabellen underhålls som matchningssummorna i matching_service: den som ändrar
+poster, datum eller status på verifikationer anropar `refresh_balances` med de
+berörda perioderna i samma transaktion. En period räknas om med en DELETE och en
+INSERT ... SELECT över periodens poster, så resultatet blir rätt oavsett hur
+posterna ändrades. Vid ändrat datum ska både den gamla och den nya perioden
+räknas om, och vid borttagning ska perioderna hämtas innan raderna tas bort.
+`rebuild_balances` kontrollerar och bygger om hela tabellen.
+
+Periodrapporter (moms, huvudbok, saldobalans) läser sedan några rader per konto
+och månad i stället för alla poster. `range_sums` ger summorna för valfria datum:
+hela månader från tabellen och bara de delar av månader som ligger utanför från
+posterna.
+"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import Select, delete, func, insert, literal, select
+
+from bokforing_app import db
+from bokforing_app.models import AccountBalance, BankTransaction, BookkeepingEntry
+
+BOOKED_STATUS = 'processed'
+
+# (company_id, år, månad)
+Period = Tuple[int, int, int]
+
+
+def period_of(company_id: int, day: date) -> Period:
+    return company_id, day.year, day.month
+
+
+def _month_range(year: int, month: int) -> Tuple[date, date]:
+    """Första dagen i månaden och första dagen i nästa månad."""
+    return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+
+
+def transaction_periods(transaction_ids) -> Set[Period]:
+    """
+    Perioderna för de bokförda verifikationerna i `transaction_ids` (en lista med
+    id eller en select-sats som ger id). Hämtas innan de tas bort eller flyttas.
+    """
+    if not isinstance(transaction_ids, Select):
+        transaction_ids = list(transaction_ids)
+        if not transaction_ids:
+            return set()
+    rows = db.session.query(BankTransaction.company_id, BankTransaction.bokforingsdag).filter(
+        BankTransaction.id.in_(transaction_ids), BankTransaction.status == BOOKED_STATUS).distinct()
+    return {period_of(company_id, day) for company_id, day in rows}
+
+
+def _aggregate(company_id: int, start: date, end: date):
+    """Select med (konto, debet_ore, kredit_ore) per konto för företagets bokförda poster i [start, end)."""
+    return select(
+        BookkeepingEntry.konto,
+        func.coalesce(func.sum(BookkeepingEntry.debet_ore), 0),
+        func.coalesce(func.sum(BookkeepingEntry.kredit_ore), 0),
+    ).join(BankTransaction, BookkeepingEntry.bank_transaction_id == BankTransaction.id).where(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status == BOOKED_STATUS,
+        BankTransaction.bokforingsdag >= start,
+        BankTransaction.bokforingsdag < end,
+    ).group_by(BookkeepingEntry.konto)
+
+
+def refresh_balances(periods: Iterable[Period]) -> None:
+    """
+    Räknar om månadssaldona för angivna perioder från posterna, med en DELETE och
+    en INSERT ... SELECT per period. Körs i anroparens transaktion; anroparen committar.
+    """
+    periods = sorted(set(periods))
+    if not periods:
+        return
+    db.session.flush()
+    for company_id, year, month in periods:
+        start, end = _month_range(year, month)
+        db.session.execute(delete(AccountBalance).where(
+            AccountBalance.company_id == company_id,
+            AccountBalance.year == year,
+            AccountBalance.month == month,
+        ))
+        sums = _aggregate(company_id, start, end).subquery()
+        db.session.execute(insert(AccountBalance).from_select(
+            ['company_id', 'year', 'month', 'konto', 'debet_ore', 'kredit_ore'],
+            select(literal(company_id), literal(year), literal(month), *sums.c),
+        ))
+
+
+def _booked_periods(company_id: Optional[int]) -> Set[Period]:
+    """Alla perioder som har bokförda verifikationer eller sparade saldon."""
+    query = db.session.query(BankTransaction.company_id, BankTransaction.bokforingsdag).filter(
+        BankTransaction.status == BOOKED_STATUS, BankTransaction.entries.any()).distinct()
+    stored = db.session.query(AccountBalance.company_id, AccountBalance.year, AccountBalance.month).distinct()
+    if company_id is not None:
+        query = query.filter(BankTransaction.company_id == company_id)
+        stored = stored.filter(AccountBalance.company_id == company_id)
+    return {period_of(c, day) for c, day in query} | {tuple(p) for p in stored}
+
+
+def rebuild_balances(company_id: Optional[int] = None, check_only: bool = False) -> Dict[str, int]:
+    """
+    Jämför månadssaldona med posterna för alla perioder (för ett företag eller
+    alla) och räknar om de perioder som avviker (om inte `check_only`).
+
+    Returns:
+        {'periods': antal kontrollerade perioder, 'mismatched': antal avvikande perioder}
+    """
+    periods = _booked_periods(company_id)
+    mismatched = []
+    for period in sorted(periods):
+        c, year, month = period
+        expected = {konto: (debet, kredit) for konto, debet, kredit in db.session.execute(
+            _aggregate(c, *_month_range(year, month)))}
+        stored = {konto: (debet, kredit) for konto, debet, kredit in db.session.query(
+            AccountBalance.konto, AccountBalance.debet_ore, AccountBalance.kredit_ore).filter(
+            AccountBalance.company_id == c, AccountBalance.year == year, AccountBalance.month == month)}
+        if expected != stored:
+            mismatched.append(period)
+    if mismatched and not check_only:
+        refresh_balances(mismatched)
+        db.session.commit()
+    return {'periods': len(periods), 'mismatched': len(mismatched)}
+
+
+def get_balances(company_id: int, start: Tuple[int, int], end: Tuple[int, int]) -> Dict[str, Tuple[int, int]]:
+    """
+    Summerad debet och kredit i öre per konto för månaderna från `start` till och
+    med `end`, givna som (år, månad). Returnerar {konto: (debet_ore, kredit_ore)}.
+    """
+    rows = db.session.query(
+        AccountBalance.konto, func.sum(AccountBalance.debet_ore), func.sum(AccountBalance.kredit_ore),
+    ).filter(
+        AccountBalance.company_id == company_id,
+        AccountBalance.year.between(start[0], end[0]),
+        (AccountBalance.year * 100 + AccountBalance.month).between(start[0] * 100 + start[1], end[0] * 100 + end[1]),
+    ).group_by(AccountBalance.konto)
+    return {konto: (debet, kredit) for konto, debet, kredit in rows}
+
+
+def entry_sums(company_id: int, start: date, end: date) -> Dict[str, Tuple[int, int]]:
+    """Debet och kredit i öre per konto direkt från posterna, för datum i [start, end)."""
+    return {konto: (debet, kredit) for konto, debet, kredit in db.session.execute(_aggregate(company_id, start, end))}
+
+
+def range_sums(company_id: int, start: Optional[date], end: date) -> Dict[str, Tuple[int, int]]:
+    """
+    Debet och kredit i öre per konto för bokföringsdagar från `start` (None för
+    hela historiken) till och med `end`. Hela månader läses från månadssaldona,
+    påbörjade månader i kanterna från posterna.
+    """
+    start = start or date.min
+    end_exclusive = end + timedelta(days=1)
+    first_full = start if start.day == 1 else _month_range(start.year, start.month)[1]
+    full_end = date(end_exclusive.year, end_exclusive.month, 1)
+    if first_full >= full_end:
+        return entry_sums(company_id, start, end_exclusive)
+
+    last_full = full_end - timedelta(days=1)
+    parts = [get_balances(company_id, (first_full.year, first_full.month), (last_full.year, last_full.month))]
+    if start < first_full:
+        parts.append(entry_sums(company_id, start, first_full))
+    if full_end < end_exclusive:
+        parts.append(entry_sums(company_id, full_end, end_exclusive))
+    sums = {}
+    for part in parts:
+        for konto, (debet, kredit) in part.items():
+            d, k = sums.get(konto, (0, 0))
+            sums[konto] = (d + debet, k + kredit)
+    return sums
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Register över bankernas exportformat.
+
+Varje format känner igen sig själv på de första SNIFF_BYTES byten av filen
+(teckenkodning, avgränsare och kolumnrubriker) och vet hur raderna ska tolkas.
+`detect_format` provar formaten i registreringsordning utan att läsa hela filen,
+och `parse_bank_file` läser sedan filen en gång med det format som valdes.
+
+Ett nytt bankformat läggs till med `register_format`, antingen som ett
+`CsvFormat` med kolumnmappning eller som ett eget objekt med samma metoder
+(`name`, `label`, `sniff(head)` och `parse(file)`), se t.ex. camt_format.
+
+Alla format ger rader som dicts med `bokforingsdag` (date), `referens` och
+`belopp_ore` (int), som `bank_import_service.import_transactions` tar emot.
+Format som har en saldokolumn lägger till `saldo_ore`, saldot efter raden, som
+avstäms vid importen (se reconciliation_service).
+"""
+import csv
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from bokforing_app.services.camt_format import CamtFormat
+from bokforing_app.services.money import to_ore
+
+SNIFF_BYTES = 4096
+HEADER_SEARCH_LINES = 5   # Rubrikraden får föregås av t.ex. en rad med kontonummer och period
+
+BankRow = Dict[str, Any]
+
+
+class UnknownBankFormat(ValueError):
+    """Filen matchar inget registrerat bankformat."""
+
+
+def decode(data: bytes) -> Tuple[str, str]:
+    """
+    Avkodar filinnehåll som UTF-8 (med eller utan BOM) och annars Latin-1, som
+    äldre bankexporter använder. Returnerar (text, teckenkodning).
+    """
+    try:
+        return data.decode('utf-8-sig'), 'utf-8'
+    except UnicodeDecodeError as e:
+        # En flerbytesekvens kan ha klippts av i slutet av ett utdrag
+        if e.start >= len(data) - 3 and e.reason == 'unexpected end of data':
+            return data[:e.start].decode('utf-8-sig'), 'utf-8'
+        return data.decode('latin-1'), 'latin-1'
+
+
+def parse_amount(text: str, decimal: str = ',') -> int:
+    """Tolkar ett belopp som '-1 234,50' eller '1234.50' till öre."""
+    cleaned = str(text).replace(' ', '').replace('\u00a0', '').replace('\u2212', '-')
+    if decimal == ',':
+        cleaned = cleaned.replace('.', '').replace(',', '.')
+    else:
+        cleaned = cleaned.replace(',', '')
+    ore = to_ore(cleaned)
+    if ore is None:
+        raise ValueError("Belopp saknas")
+    return ore
+
+
+def parse_date(text: str, formats: Sequence[str]) -> date:
+    text = str(text).strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Ogiltigt datum: {text!r}")
+
+
+@dataclass(frozen=True)
+class CsvFormat:
+    """
+    Ett CSV-format med kolumnrubriker (`columns` mappar fält till rubrik) eller
+    utan rubrikrad (`columns` mappar fält till kolumnindex och `columns_count`
+    anger antalet kolumner på varje rad). `optional_columns` används om de finns,
+    t.ex. {'saldo': 'Saldo'}.
+    """
+    name: str
+    label: str
+    delimiter: str
+    columns: Dict[str, Union[str, int]]
+    decimal: str = ','
+    date_formats: Tuple[str, ...] = ('%Y-%m-%d',)
+    columns_count: Optional[int] = None
+    optional_columns: Dict[str, Union[str, int]] = field(default_factory=dict)
+
+    @property
+    def has_header(self) -> bool:
+        return self.columns_count is None
+
+    def _header_index(self, lines: List[str]) -> Optional[int]:
+        """Index för rubrikraden bland `lines`, eller None om den inte finns."""
+        wanted = set(self.columns.values())
+        for i, line in enumerate(lines[:HEADER_SEARCH_LINES]):
+            cells = next(csv.reader([line], delimiter=self.delimiter), [])
+            if wanted <= {c.strip() for c in cells}:
+                return i
+        return None
+
+    def sniff(self, head: bytes) -> bool:
+        text, _ = decode(head)
+        lines = text.splitlines()
+        if self.has_header:
+            return self._header_index(lines) is not None
+        first = next(csv.reader(lines[:1], delimiter=self.delimiter), [])
+        if len(first) != self.columns_count:
+            return False
+        try:
+            parse_date(first[self.columns['bokforingsdag']], self.date_formats)
+            parse_amount(first[self.columns['belopp']], self.decimal)
+        except ValueError:
+            return False
+        return True
+
+    def parse(self, file) -> Iterator[Tuple[int, Optional[BankRow], Optional[str]]]:
+        """
+        Tolkar filen (ett binärt filobjekt) rad för rad. Ger (radnummer, rad, None)
+        för giltiga rader och (radnummer, None, felmeddelande) för rader som inte
+        kunde tolkas.
+        Rader utan datum (tomma rader, summeringar) hoppas över tyst.
+        """
+        text, _ = decode(file.read())
+        lines = text.splitlines()
+        start = 0
+        index = {**self.columns, **self.optional_columns}
+        if self.has_header:
+            header_at = self._header_index(lines)
+            if header_at is None:
+                raise UnknownBankFormat(f"Rubrikraden för {self.label} saknas")
+            header = [c.strip() for c in next(csv.reader([lines[header_at]], delimiter=self.delimiter))]
+            index = {name: header.index(title) for name, title in index.items() if title in header}
+            start = header_at + 1
+        saldo_at = index.get('saldo')
+
+        for line_no, cells in enumerate(csv.reader(lines[start:], delimiter=self.delimiter), start=start + 1):
+            try:
+                day = cells[index['bokforingsdag']].strip()
+                if not day:
+                    continue
+                row = {
+                    'bokforingsdag': parse_date(day, self.date_formats),
+                    'referens': ' '.join(cells[index['referens']].split()),
+                    'belopp_ore': parse_amount(cells[index['belopp']], self.decimal),
+                }
+                if saldo_at is not None and saldo_at < len(cells) and cells[saldo_at].strip():
+                    try:
+                        row['saldo_ore'] = parse_amount(cells[saldo_at], self.decimal)
+                    except ValueError:
+                        pass  # Raden importeras ändå, men ingår inte i saldoavstämningen
+                yield line_no, row, None
+            except (ValueError, IndexError) as e:
+                yield line_no, None, str(e)
+
+
+_FORMATS: List[Any] = []
+
+
+def register_format(bank_format: Any) -> Any:
+    """Lägger till ett format sist i registret. Ett format med samma namn ersätts."""
+    _FORMATS[:] = [f for f in _FORMATS if f.name != bank_format.name]
+    _FORMATS.append(bank_format)
+    return bank_format
+
+
+def registered_formats() -> List[Any]:
+    return list(_FORMATS)
+
+
+def detect_format(head: bytes) -> Any:
+    """
+    Väljer format utifrån filens början.
+
+    Raises:
+        UnknownBankFormat: Om inget format känner igen filen.
+    """
+    for bank_format in _FORMATS:
+        if bank_format.sniff(head):
+            return bank_format
+    raise UnknownBankFormat(
+        "Okänt filformat. Kända format: " + ", ".join(f.label for f in _FORMATS)
+    )
+
+
+def parse_bank_file(file) -> Tuple[Any, Iterator[Tuple[int, Optional[BankRow], Optional[str]]]]:
+    """
+    Känner igen formatet på ett binärt filobjekt och returnerar (format,
+    radgenerator från format.parse). Filen läses inte förrän generatorn används.
+    """
+    head = file.read(SNIFF_BYTES)
+    file.seek(0)
+    bank_format = detect_format(head)
+    return bank_format, bank_format.parse(file)
+
+
+# Swedbank: en rad med period före rubrikerna, semikolon och decimalkomma
+register_format(CsvFormat(
+    name='swedbank', label='Swedbank', delimiter=';',
+    columns={'bokforingsdag': 'Bokföringsdag', 'referens': 'Referens', 'belopp': 'Insättning/Uttag'},
+    optional_columns={'saldo': 'Bokfört saldo'},
+))
+
+# SEB: export av kontoutdrag
+register_format(CsvFormat(
+    name='seb', label='SEB', delimiter=';',
+    columns={'bokforingsdag': 'Bokföringsdatum', 'referens': 'Text/mottagare', 'belopp': 'Belopp'},
+    optional_columns={'saldo': 'Saldo'},
+))
+
+# Handelsbanken: kontotransaktioner
+register_format(CsvFormat(
+    name='handelsbanken', label='Handelsbanken', delimiter=';',
+    columns={'bokforingsdag': 'Reskontradatum', 'referens': 'Text', 'belopp': 'Belopp'},
+    optional_columns={'saldo': 'Saldo'},
+))
+
+# Nordea: datum skrivs ibland med snedstreck
+register_format(CsvFormat(
+    name='nordea', label='Nordea', delimiter=';',
+    columns={'bokforingsdag': 'Bokföringsdag', 'referens': 'Rubrik', 'belopp': 'Belopp'},
+    optional_columns={'saldo': 'Saldo'},
+    date_formats=('%Y/%m/%d', '%Y-%m-%d'),
+))
+
+# Enkel CSV utan rubriker: datum, referens, belopp, valuta, saldo
+register_format(CsvFormat(
+    name='simple', label='CSV (datum, referens, belopp, valuta, saldo)', delimiter=',',
+    columns={'bokforingsdag': 0, 'referens': 1, 'belopp': 2}, decimal='.', columns_count=5,
+    optional_columns={'saldo': 4},
+))
+
+# ISO 20022 camt.053/054 (XML), läses strömmande
+register_format(CamtFormat())
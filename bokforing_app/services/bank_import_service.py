@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Import av banktransaktioner med dubblettkontroll via fingeravtryck.
+
+Varje importerad transaktion får ett fingeravtryck: SHA-256 av datum, normaliserad
+referens, belopp i öre och ett löpnummer för rader som är helt lika inom samma
+import (t.ex. två likadana kortköp samma dag). Fingeravtrycket är unikt per
+företag (unikt index på (company_id, fingerprint)), så en rad är en dubblett om
+dess fingeravtryck redan finns. Kontrollen görs med en indexerad IN-fråga per
+del av filen i stället för att hela transaktionshistoriken läses in.
+
+Dubbletter sparas som 'pending_duplicate' utan fingeravtryck. Godkänns en
+dubblett får den nästa lediga löpnummer, så att en senare import av samma rad
+känns igen. `resolve_duplicates` godkänner eller avvisar ett helt urval dubbletter
+med mängdoperationer i stället för en förfrågan per transaktion.
+
+Varje företag har en policy för dubbletter (`Setting` med nyckeln
+'duplicate_policy_<company_id>') som tillämpas direkt efter importen:
+- 'manual': alla dubbletter väntar på granskning (standard).
+- 'reject_exact_overlap': dubbletterna avvisas om de exakt motsvarar de
+  transaktioner som redan finns i det överlappande datumintervallet, t.ex. när
+  ett nytt utdrag börjar några dagar före det förra slutade. Avviker överlappet
+  väntar alla på granskning.
+- 'reject_all': alla dubbletter avvisas.
+"""
+import hashlib
+import os
+from collections import Counter, defaultdict
+from datetime import date
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from sqlalchemy import Select, func, insert, or_, select, update
+
+from bokforing_app import db
+from bokforing_app.models import BankTransaction, Setting
+from bokforing_app.services import inbox_service, matching_service
+
+IMPORT_CHUNK_SIZE = 500
+DUPLICATE_POLICY_KEY_PREFIX = 'duplicate_policy_'
+DUPLICATE_POLICIES = ('manual', 'reject_exact_overlap', 'reject_all')
+DEFAULT_DUPLICATE_POLICY = os.getenv('DUPLICATE_POLICY', 'manual')
+REFERENS_MAX_LENGTH = BankTransaction.__table__.c.referens.type.length
+
+
+def normalize_reference(referens: Any) -> str:
+    """Referensen utan inledande, avslutande och dubbla blanksteg, i gemener."""
+    return ' '.join(str(referens or '').split()).casefold()
+
+
+def fingerprint(bokforingsdag: date, referens: Any, belopp_ore: int, occurrence: int = 0) -> str:
+    """Fingeravtrycket för en transaktion; `occurrence` skiljer likadana rader åt."""
+    key = f"{bokforingsdag.isoformat()}|{normalize_reference(referens)}|{belopp_ore}|{occurrence}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def with_fingerprints(rows: List[Dict[str, Any]], seen: Optional[Counter] = None) -> List[Dict[str, Any]]:
+    """
+    Sätter 'fingerprint' på varje rad (dict med bokforingsdag, referens och
+    belopp_ore). Likadana rader får löpnummer 0, 1, 2, ... i den ordning de står.
+    Skicka samma `seen` för alla delar av en fil så att numreringen fortsätter.
+    """
+    seen = Counter() if seen is None else seen
+    for row in rows:
+        key = (row['bokforingsdag'], normalize_reference(row['referens']), row['belopp_ore'])
+        row['fingerprint'] = fingerprint(*key, occurrence=seen[key])
+        seen[key] += 1
+    return rows
+
+
+def existing_fingerprints(company_id: int, fingerprints: Iterable[str]) -> Set[str]:
+    """De fingeravtryck bland `fingerprints` som redan finns hos företaget."""
+    fingerprints = list(fingerprints)
+    found = set()
+    for i in range(0, len(fingerprints), IMPORT_CHUNK_SIZE):
+        found.update(fp for fp, in db.session.query(BankTransaction.fingerprint).filter(
+            BankTransaction.company_id == company_id,
+            BankTransaction.fingerprint.in_(fingerprints[i:i + IMPORT_CHUNK_SIZE]),
+        ))
+    return found
+
+
+def import_transactions(company_id: int, rows: Iterable[Dict[str, Any]],
+                        bank_import_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Sparar importerade rader som banktransaktioner. Nya rader blir 'unprocessed',
+    rader vars fingeravtryck redan finns blir 'pending_duplicate'. Anroparen committar.
+
+    Raderna läses IMPORT_CHUNK_SIZE åt gången, så en generator från en strömmande
+    parser behöver aldrig hållas i minnet i sin helhet.
+
+    Args:
+        rows: Dicts med bokforingsdag (date), referens, belopp_ore och valfritt ocr,
+            i filens ordning.
+        bank_import_id: BankImport som transaktionerna kommer från.
+
+    Returns:
+        {'new': antal nya, 'duplicates': antal dubbletter}
+    """
+    rows = iter(rows)
+    seen = Counter()
+    stats = {'new': 0, 'duplicates': 0}
+    while True:
+        chunk = with_fingerprints(list(islice(rows, IMPORT_CHUNK_SIZE)), seen)
+        if not chunk:
+            break
+        taken = existing_fingerprints(company_id, (row['fingerprint'] for row in chunk))
+        values = []
+        for row in chunk:
+            is_duplicate = row['fingerprint'] in taken
+            values.append({
+                'company_id': company_id,
+                'bokforingsdag': row['bokforingsdag'],
+                'referens': row['referens'][:REFERENS_MAX_LENGTH],
+                'belopp_ore': row['belopp_ore'],
+                'ocr': row.get('ocr'),
+                'bank_import_id': bank_import_id,
+                'status': 'pending_duplicate' if is_duplicate else 'unprocessed',
+                'fingerprint': None if is_duplicate else row['fingerprint'],
+            })
+            stats['duplicates' if is_duplicate else 'new'] += 1
+        db.session.execute(insert(BankTransaction), values)
+
+    if stats['new'] or stats['duplicates']:
+        # Bulkinserten går inte via flush, så inkorgens räknare töms här
+        inbox_service.invalidate_counts([company_id])
+    return stats
+
+
+def free_fingerprints(company_id: int, transactions: Iterable[Any]) -> Dict[int, str]:
+    """
+    Nästa lediga fingeravtryck för var och en av `transactions` (rader med id,
+    bokforingsdag, referens och belopp_ore). Likadana transaktioner får olika
+    löpnummer i id-ordning. Returnerar {id: fingeravtryck}.
+    """
+    groups = defaultdict(list)
+    for t in sorted(transactions, key=lambda t: t.id):
+        groups[(t.bokforingsdag, normalize_reference(t.referens), t.belopp_ore)].append(t.id)
+    start = dict.fromkeys(groups, 0)
+    result = {}
+    while groups:
+        candidates = {key: [fingerprint(*key, occurrence=n) for n in range(start[key], start[key] + len(ids) + 10)]
+                      for key, ids in groups.items()}
+        taken = existing_fingerprints(company_id, chain.from_iterable(candidates.values()))
+        remaining = {}
+        for key, ids in groups.items():
+            free = [fp for fp in candidates[key] if fp not in taken]
+            result.update(zip(ids, free))
+            if len(free) < len(ids):
+                remaining[key] = ids[len(free):]
+                start[key] += len(candidates[key])
+        groups = remaining
+    return result
+
+
+def assign_free_fingerprint(transaction: BankTransaction) -> None:
+    """Ger en godkänd dubblett fingeravtrycket med nästa lediga löpnummer."""
+    transaction.fingerprint = free_fingerprints(transaction.company_id, [transaction])[transaction.id]
+
+
+def pending_duplicates(company_id: int, ids: Optional[Sequence[int]] = None, bank_import_id: Optional[int] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None) -> Select:
+    """Select-sats med id för företagets väntande dubbletter som matchar filtret."""
+    stmt = select(BankTransaction.id).where(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status == 'pending_duplicate',
+    )
+    if ids is not None:
+        stmt = stmt.where(BankTransaction.id.in_(ids))
+    if bank_import_id is not None:
+        stmt = stmt.where(BankTransaction.bank_import_id == bank_import_id)
+    if date_from is not None:
+        stmt = stmt.where(BankTransaction.bokforingsdag >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(BankTransaction.bokforingsdag <= date_to)
+    return stmt
+
+
+def resolve_duplicates(company_id: int, action: str, selection: Select) -> int:
+    """
+    Godkänner ('approve') eller avvisar ('reject') alla väntande dubbletter i
+    `selection` (från pending_duplicates). Godkända blir 'unprocessed' och får
+    lediga fingeravtryck, avvisade tas bort. Anroparen committar.
+
+    Returns:
+        Antalet godkända eller borttagna transaktioner.
+
+    Raises:
+        ValueError: Vid okänd åtgärd.
+    """
+    if action == 'reject':
+        count = matching_service.delete_transactions(selection)
+    elif action == 'approve':
+        rows = db.session.execute(
+            select(BankTransaction.id, BankTransaction.bokforingsdag, BankTransaction.referens, BankTransaction.belopp_ore)
+            .where(BankTransaction.id.in_(selection)).order_by(BankTransaction.id)
+        ).all()
+        count = len(rows)
+        values = [{'id': id_, 'status': 'unprocessed', 'fingerprint': fp}
+                  for id_, fp in free_fingerprints(company_id, rows).items()]
+        for i in range(0, count, IMPORT_CHUNK_SIZE):
+            db.session.execute(update(BankTransaction), values[i:i + IMPORT_CHUNK_SIZE])
+    else:
+        raise ValueError(f"Ogiltig åtgärd: {action!r}")
+    if count:
+        inbox_service.invalidate_counts([company_id])
+    return count
+
+
+def _policy_key(company_id: int) -> str:
+    return f"{DUPLICATE_POLICY_KEY_PREFIX}{company_id}"
+
+
+def get_duplicate_policy(company_id: int) -> str:
+    """Företagets policy för dubbletter vid import, se DUPLICATE_POLICIES."""
+    setting = Setting.query.filter_by(key=_policy_key(company_id)).first()
+    return setting.value if setting and setting.value in DUPLICATE_POLICIES else DEFAULT_DUPLICATE_POLICY
+
+
+def set_duplicate_policy(company_id: int, policy: str) -> None:
+    """Sparar företagets policy för dubbletter. Anroparen committar."""
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Okänd policy: {policy!r}. Giltiga: {', '.join(DUPLICATE_POLICIES)}")
+    setting = Setting.query.filter_by(key=_policy_key(company_id)).first()
+    if setting:
+        setting.value = policy
+    else:
+        db.session.add(Setting(key=_policy_key(company_id), value=policy))
+
+
+def _is_exact_overlap(company_id: int, bank_import_id: int) -> bool:
+    """
+    Sant om importens dubbletter täcker överlappet exakt: inom dubbletternas
+    datumintervall är alla importens rader dubbletter och motsvarar precis de
+    transaktioner som redan fanns, varken fler eller färre.
+    """
+    first, last, duplicates = db.session.query(
+        func.min(BankTransaction.bokforingsdag), func.max(BankTransaction.bokforingsdag), func.count(),
+    ).filter(
+        BankTransaction.bank_import_id == bank_import_id,
+        BankTransaction.status == 'pending_duplicate',
+    ).one()
+    if not duplicates:
+        return False
+    in_window = (BankTransaction.company_id == company_id, BankTransaction.bokforingsdag.between(first, last))
+    new_in_window = db.session.query(func.count()).filter(
+        *in_window,
+        BankTransaction.bank_import_id == bank_import_id,
+        BankTransaction.status != 'pending_duplicate',
+    ).scalar()
+    existing_in_window = db.session.query(func.count()).filter(
+        *in_window,
+        or_(BankTransaction.bank_import_id != bank_import_id, BankTransaction.bank_import_id.is_(None)),
+        BankTransaction.fingerprint.isnot(None),
+    ).scalar()
+    return new_in_window == 0 and existing_in_window == duplicates
+
+
+def apply_duplicate_policy(company_id: int, bank_import_id: int) -> int:
+    """
+    Avvisar importens dubbletter om företagets policy säger det. Körs efter
+    import_transactions. Returnerar antalet avvisade dubbletter.
+    """
+    policy = get_duplicate_policy(company_id)
+    if policy == 'reject_all' or (policy == 'reject_exact_overlap' and _is_exact_overlap(company_id, bank_import_id)):
+        return resolve_duplicates(company_id, 'reject', pending_duplicates(company_id, bank_import_id=bank_import_id))
+    return 0
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Import av BGMAX-filer från Bankgirot (inbetalningar till bankgiro).
+
+En BGMAX-fil består av poster med fast bredd (80 tecken, ISO 8859-1) där de två
+första tecknen anger posttypen:
+    01 start, 05 öppning av insättning, 20 betalning, 21 avdrag,
+    22/23 extra referens, 25 information, 26 namn, 27/28 adress,
+    29 organisationsnummer, 15 insättning, 70 slut.
+Filen läses rad för rad och varje insättning (05 ... 15) lämnas vidare när dess
+15-post är läst.
+
+Varje betalning sparas som en BankgiroPayment. Insättningen kopplas till den
+banktransaktion som har samma belopp inom DEPOSIT_WINDOW_DAYS dagar efter
+betalningsdagen. Betalningen kopplas till den kundfaktura vars nummer anges av
+referensen, som den står eller som OCR-nummer med kontrollsiffra (och
+längdsiffra). Fakturorna för hela filen slås upp med IN-frågor mot indexet på
+(company_id, number). När både insättning och faktura är kända skapas en
+Matchning, så fakturan blir betald utan manuell matchning.
+
+Insättningar som redan har importerats hoppas över. En insättning vars
+banktransaktion inte har importerats ännu kopplas när kontoutdraget laddas upp
+(se `link_deposits`).
+"""
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert, select
+
+from bokforing_app import db
+from bokforing_app.models import BankgiroPayment, BankTransaction, Invoice
+from bokforing_app.services import matching_service
+from bokforing_app.services.money import from_ore
+
+DEPOSIT_WINDOW_DAYS = 3   # Insättningen syns på kontot samma dag eller några bankdagar senare
+LOOKUP_CHUNK_SIZE = 500
+RECORD_LENGTH = 80
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def is_bgmax(head: bytes) -> bool:
+    """Känner igen en BGMAX-fil på startposten."""
+    return head.lstrip(b'\xef\xbb\xbf').startswith(b'01BGMAX')
+
+
+def _amount(field: str) -> int:
+    if not field.strip().isdigit():
+        raise ValueError(f"Ogiltigt belopp: {field!r}")
+    return int(field)
+
+
+def parse_bgmax(file) -> Iterator[Dict[str, Any]]:
+    """
+    Läser en BGMAX-fil (binärt filobjekt) och ger en dict per insättning:
+    {'bankgiro', 'betalningsdag', 'deposit_serial', 'deposit_amount_ore',
+    'payments': [{'record_type', 'payer_bankgiro', 'referens', 'extra_referenser',
+    'amount_ore', 'bgc_serial', 'namn'}]}.
+
+    Raises:
+        ValueError: Om filen inte är en BGMAX-fil, en post inte kan tolkas eller
+            antalet betalningar inte stämmer med slutposten.
+    """
+    bankgiro = None
+    payments: List[Dict[str, Any]] = []
+    payment_count = 0
+    ended = False
+
+    for line_no, raw in enumerate(file, start=1):
+        record = raw.decode('latin-1').rstrip('\r\n').ljust(RECORD_LENGTH)
+        if line_no == 1:
+            record = record.lstrip('\xef\xbb\xbf')  # UTF-8-BOM avkodad som Latin-1
+        code = record[:2]
+        try:
+            if line_no == 1:
+                if code != '01' or record[2:22].strip() != 'BGMAX':
+                    raise ValueError("Filen är inte en BGMAX-fil")
+            elif code == '05':
+                bankgiro = record[2:12].lstrip('0')
+                payments = []
+            elif code in ('20', '21'):
+                amount = _amount(record[37:55])
+                payments.append({
+                    'record_type': code,
+                    'payer_bankgiro': record[2:12].lstrip('0') or None,
+                    'referens': record[12:37].strip() or None,
+                    'extra_referenser': None,
+                    'amount_ore': amount if code == '20' else -amount,
+                    'bgc_serial': record[57:69].strip() or None,
+                    'namn': None,
+                })
+                if code == '20':
+                    payment_count += 1
+            elif code in ('22', '23') and payments:
+                reference = record[12:37].strip()
+                if reference:
+                    extra = payments[-1]['extra_referenser']
+                    payments[-1]['extra_referenser'] = f"{extra} {reference}" if extra else reference
+            elif code == '26' and payments:
+                payments[-1]['namn'] = record[2:37].strip() or None
+            elif code == '15':
+                yield {
+                    'bankgiro': bankgiro,
+                    'betalningsdag': datetime.strptime(record[37:45], '%Y%m%d').date(),
+                    'deposit_serial': record[45:50].strip(),
+                    'deposit_amount_ore': _amount(record[50:68]),
+                    'payments': payments,
+                }
+                payments = []
+            elif code == '70':
+                expected = _amount(record[2:10])
+                if expected != payment_count:
+                    raise ValueError(f"Slutposten anger {expected} betalningar men filen innehåller {payment_count}")
+                ended = True
+        except ValueError as e:
+            raise ValueError(f"Rad {line_no}: {e}")
+
+    if not ended:
+        raise ValueError("Slutpost (70) saknas, filen är ofullständig")
+
+
+def _luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        n = int(digit) * (2 if i % 2 else 1)
+        total += n - 9 if n > 9 else n
+    return total % 10 == 0
+
+
+def invoice_number_candidates(reference: Optional[str]) -> List[str]:
+    """
+    Fakturanummer som en referens kan avse: referensen själv, och om den är ett
+    giltigt OCR-nummer även utan kontrollsiffra respektive utan längd- och kontrollsiffra.
+    """
+    if not reference:
+        return []
+    candidates = [reference.strip()]
+    digits = _NON_DIGITS.sub('', reference).lstrip('0')
+    if digits:
+        candidates.append(digits)
+        if len(digits) >= 2 and _luhn_valid(digits):
+            candidates.append(digits[:-1])
+            if len(digits) >= 3 and int(digits[-2]) == len(digits) % 10:
+                candidates.append(digits[:-2])
+    return list(dict.fromkeys(c for c in candidates if c))
+
+
+def _payment_candidates(payment: Dict[str, Any]) -> List[str]:
+    references = [payment['referens'], *(payment['extra_referenser'] or '').split()]
+    return [c for ref in references for c in invoice_number_candidates(ref)]
+
+
+def _invoices_by_number(company_id: int, numbers: Iterable[str]) -> Dict[str, int]:
+    numbers = list(set(numbers))
+    found = {}
+    for i in range(0, len(numbers), LOOKUP_CHUNK_SIZE):
+        found.update(db.session.query(Invoice.number, Invoice.id).filter(
+            Invoice.company_id == company_id,
+            Invoice.number.in_(numbers[i:i + LOOKUP_CHUNK_SIZE]),
+        ))
+    return found
+
+
+def _match_deposits(company_id: int, deposits: List[Dict[str, Any]]) -> Dict[int, int]:
+    """
+    Hittar banktransaktionen för varje insättning med en fråga: samma belopp,
+    bokförd 0..DEPOSIT_WINDOW_DAYS dagar efter betalningsdagen och inte redan
+    kopplad till en annan insättning. Returnerar {index i deposits: transaktions-id}.
+    """
+    if not deposits:
+        return {}
+    first = min(d['betalningsdag'] for d in deposits)
+    last = max(d['betalningsdag'] for d in deposits) + timedelta(days=DEPOSIT_WINDOW_DAYS)
+    linked = select(BankgiroPayment.bank_transaction_id).where(
+        BankgiroPayment.company_id == company_id,
+        BankgiroPayment.bank_transaction_id.isnot(None),
+    )
+    candidates = defaultdict(list)
+    for trans_id, belopp_ore, bokforingsdag in db.session.query(
+        BankTransaction.id, BankTransaction.belopp_ore, BankTransaction.bokforingsdag,
+    ).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.bokforingsdag.between(first, last),
+        BankTransaction.belopp_ore.in_(list({d['deposit_amount_ore'] for d in deposits})),
+        BankTransaction.id.notin_(linked),
+    ).order_by(BankTransaction.bokforingsdag, BankTransaction.id):
+        candidates[belopp_ore].append((bokforingsdag, trans_id))
+
+    result = {}
+    taken = set()
+    for i, deposit in sorted(enumerate(deposits), key=lambda d: d[1]['betalningsdag']):
+        day = deposit['betalningsdag']
+        for bokforingsdag, trans_id in candidates.get(deposit['deposit_amount_ore'], ()):
+            if trans_id not in taken and day <= bokforingsdag <= day + timedelta(days=DEPOSIT_WINDOW_DAYS):
+                result[i] = trans_id
+                taken.add(trans_id)
+                break
+    return result
+
+
+def _create_matchningar(payments: Iterable[Dict[str, Any]]) -> int:
+    """
+    Skapar matchningar mellan insättningens transaktion och fakturan för
+    betalningar där båda är kända, högst fakturans kvarvarande belopp.
+    """
+    payments = [p for p in payments if p['bank_transaction_id'] and p['invoice_id'] and p['amount_ore'] > 0]
+    if not payments:
+        return 0
+    invoice_ids = list({p['invoice_id'] for p in payments})
+    remaining = {}
+    for i in range(0, len(invoice_ids), LOOKUP_CHUNK_SIZE):
+        remaining.update(db.session.query(Invoice.id, Invoice.remaining_amount_ore).filter(
+            Invoice.id.in_(invoice_ids[i:i + LOOKUP_CHUNK_SIZE])))
+
+    matches = []
+    for payment in payments:
+        amount_ore = min(payment['amount_ore'], remaining.get(payment['invoice_id']) or 0)
+        if amount_ore > 0:
+            remaining[payment['invoice_id']] -= amount_ore
+            matches.append({'transaction_id': payment['bank_transaction_id'],
+                            'invoice_id': payment['invoice_id'], 'amount': from_ore(amount_ore)})
+    matching_service.create_matchningar(matches)
+    return len(matches)
+
+
+def import_bgmax(company_id: int, file) -> Dict[str, int]:
+    """
+    Importerar en BGMAX-fil: sparar betalningarna, kopplar insättningarna till
+    banktransaktioner och betalningarna till fakturor, och skapar matchningar.
+    Anroparen committar.
+
+    Returns:
+        {'deposits', 'payments', 'skipped' (redan importerade insättningar),
+         'linked' (insättningar kopplade till en transaktion), 'invoices'
+         (betalningar med hittad faktura), 'matched' (skapade matchningar)}
+    """
+    deposits = list(parse_bgmax(file))
+
+    existing = set(db.session.query(
+        BankgiroPayment.betalningsdag, BankgiroPayment.bankgiro, BankgiroPayment.deposit_serial,
+    ).filter(
+        BankgiroPayment.company_id == company_id,
+        BankgiroPayment.betalningsdag.in_(list({d['betalningsdag'] for d in deposits})),
+    ).distinct())
+    new_deposits = [d for d in deposits
+                    if (d['betalningsdag'], d['bankgiro'], d['deposit_serial']) not in existing]
+
+    invoices = _invoices_by_number(company_id, (
+        c for d in new_deposits for p in d['payments'] for c in _payment_candidates(p)))
+    transactions = _match_deposits(company_id, new_deposits)
+
+    rows = []
+    for i, deposit in enumerate(new_deposits):
+        for payment in deposit['payments']:
+            invoice_id = next((invoices[c] for c in _payment_candidates(payment) if c in invoices), None)
+            rows.append({
+                **payment,
+                'company_id': company_id,
+                'bank_transaction_id': transactions.get(i),
+                'invoice_id': invoice_id if payment['amount_ore'] > 0 else None,
+                'betalningsdag': deposit['betalningsdag'],
+                'bankgiro': deposit['bankgiro'],
+                'deposit_serial': deposit['deposit_serial'],
+                'deposit_amount_ore': deposit['deposit_amount_ore'],
+            })
+    if rows:
+        db.session.execute(insert(BankgiroPayment), rows)
+
+    return {
+        'deposits': len(new_deposits),
+        'payments': len(rows),
+        'skipped': len(deposits) - len(new_deposits),
+        'linked': len(transactions),
+        'invoices': sum(1 for r in rows if r['invoice_id']),
+        'matched': _create_matchningar(rows),
+    }
+
+
+def link_deposits(company_id: int) -> int:
+    """
+    Kopplar insättningar som importerats innan deras banktransaktion fanns, t.ex.
+    efter uppladdning av ett kontoutdrag, och skapar deras matchningar.
+    Returnerar antalet kopplade insättningar. Anroparen committar.
+    """
+    payments = db.session.query(BankgiroPayment).filter(
+        BankgiroPayment.company_id == company_id,
+        BankgiroPayment.bank_transaction_id.is_(None),
+    ).all()
+    if not payments:
+        return 0
+
+    by_deposit = defaultdict(list)
+    for payment in payments:
+        by_deposit[(payment.betalningsdag, payment.bankgiro, payment.deposit_serial)].append(payment)
+    keys = list(by_deposit)
+    deposits = [{'betalningsdag': k[0], 'deposit_amount_ore': by_deposit[k][0].deposit_amount_ore} for k in keys]
+
+    transactions = _match_deposits(company_id, deposits)
+    linked = []
+    for i, trans_id in transactions.items():
+        for payment in by_deposit[keys[i]]:
+            payment.bank_transaction_id = trans_id
+            linked.append({'bank_transaction_id': trans_id, 'invoice_id': payment.invoice_id,
+                           'amount_ore': payment.amount_ore})
+    db.session.flush()
+    _create_matchningar(linked)
+    return len(transactions)
@@ -1,16 +1,23 @@
 # -*- coding: utf-8 -*-
 
-import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 import math
 import os
 import json
 from flask import current_app, flash
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import selectinload
 from bokforing_app import db
-from bokforing_app.models import BankTransaction, BookkeepingEntry, Bilaga, Konto, Association
-from bokforing_app.services.accounting_config import KONTOPLAN, ASSOCIATION_MAP
+from bokforing_app.models import BankImport, BankTransaction, BookkeepingEntry, Bilaga, Invoice, Konto, Association
+from bokforing_app.services.accounting_config import KONTOPLAN, ASSOCIATION_MAP, get_account_names
+from bokforing_app.services import (
+    balance_service, bank_formats, bank_import_service, bgmax_service, pagination, reconciliation_service,
+)
 from bokforing_app.services.pdf_reader import extract_exact_json_from_pdf
 from bokforing_app.services.file_service import save_bilaga_file
+from bokforing_app.services.image_preprocessor import is_supported, preprocess_for_extraction
+from bokforing_app.services.matching_service import refresh_matched_amounts
+from bokforing_app.services.money import from_ore, sum_ore, to_ore
 
 
 def get_company_data(company_id):
@@ -27,11 +34,56 @@ def get_company_data(company_id):
     return transactions, unassigned_bilagor
 
 
-def get_verifikationer(company_id):
-    return BankTransaction.query.filter_by(
-        company_id=company_id,
-        status='processed'
-    ).order_by(BankTransaction.bokforingsdag.desc()).all()
+def get_verifikationer(company_id, limit=pagination.DEFAULT_PAGE_SIZE, cursor=None, year=None):
+    """
+    Hämtar en sida bokförda verifikationer, nyast först, med keyset-paginering på
+    (bokforingsdag, id). Posterna laddas med en extra fråga för hela sidan
+    (selectinload) och kontonamnen slås upp i den cachade kontoplanen.
+
+    Returns:
+        (lista med verifikationer som dicts, markör för nästa sida eller None)
+
+    Raises:
+        ValueError: Om markören är ogiltig.
+    """
+    query = BankTransaction.query.options(selectinload(BankTransaction.entries)).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status == 'processed',
+    )
+    if year:
+        query = query.filter(BankTransaction.bokforingsdag >= date(year, 1, 1),
+                             BankTransaction.bokforingsdag < date(year + 1, 1, 1))
+    after = pagination.keyset_after(BankTransaction.bokforingsdag, BankTransaction.id,
+                                    pagination.decode_cursor(cursor), descending=True)
+    if after is not None:
+        query = query.filter(after)
+    query = query.order_by(*pagination.keyset_order(BankTransaction.bokforingsdag, BankTransaction.id,
+                                                    descending=True))
+
+    rows, next_cursor = pagination.fetch_page(query, limit, lambda t: (t.bokforingsdag, t.id))
+    account_names = get_account_names()
+    return [{
+        'id': trans.id,
+        'bokforingsdag': trans.bokforingsdag.strftime('%Y-%m-%d'),
+        'referens': trans.referens,
+        'belopp': trans.belopp,
+        'entries': [{
+            'konto': entry.konto,
+            'namn': account_names.get(entry.konto, 'Okänt'),
+            'debet': entry.debet,
+            'kredit': entry.kredit,
+        } for entry in trans.entries],
+    } for trans in rows], next_cursor
+
+
+def get_verifikation_years(company_id):
+    """Åren (nyast först) som har bokförda verifikationer, från första till sista bokföringsdag."""
+    first, last = db.session.query(
+        func.min(BankTransaction.bokforingsdag), func.max(BankTransaction.bokforingsdag)
+    ).filter(BankTransaction.company_id == company_id, BankTransaction.status == 'processed').one()
+    if not first:
+        return []
+    return list(range(last.year, first.year - 1, -1))
 
 
 def get_all_bilagor(company_id):
@@ -40,74 +92,57 @@ def get_all_bilagor(company_id):
     ).order_by(Bilaga.status.asc(), Bilaga.fakturadatum.desc()).all()
 
 
-def process_csv_upload(file, company_id):
+def process_bank_file_upload(file, company_id):
     """
-    Bearbetar en uppladdad CSV-fil. Försöker först med det gamla formatet (semikolon-separerad),
-    sedan med det nya formatet (komma-separerad).
+    Bearbetar en uppladdad kontoutdragsfil (CSV eller camt.053/054). Bankformatet
+    känns igen på filens början (se bank_formats) och filen tolkas sedan en gång,
+    strömmande, med det formatet.
     Nya transaktioner importeras som 'unprocessed'.
-    Dubbletter flaggas som 'pending_duplicate' för manuell granskning.
+    Dubbletter flaggas som 'pending_duplicate' för manuell granskning, om inte
+    företagets dubblettpolicy avvisar dem direkt.
+    Filens saldon stäms av under importen och sparas på en BankImport.
     """
-    try:
-        # Försök med det gamla formatet
-        file.seek(0)
-        df = pd.read_csv(file, sep=';', header=1, decimal=',', encoding='latin-1', quoting=1)
-        df = df.dropna(subset=['Bokföringsdag'])
-        column_map = {'Bokföringsdag': 'bokforingsdag', 'Referens': 'referens', 'Insättning/Uttag': 'belopp'}
-    except Exception:
-        try:
-            # Försök med det nya formatet
-            file.seek(0)
-            df = pd.read_csv(file, sep=',', header=None, decimal='.', encoding='utf-8', quoting=1)
-            df.columns = ['bokforingsdag', 'referens', 'belopp', 'valuta', 'saldo']
-            column_map = {'bokforingsdag': 'bokforingsdag', 'referens': 'referens', 'belopp': 'belopp'}
-        except Exception as e:
-            raise ValueError(f"Kunde inte läsa CSV-filen med något av de kända formaten. Fel: {e}")
+    bank_format, parsed = bank_formats.parse_bank_file(file)
+    bank_import = BankImport(company_id=company_id, filename=getattr(file, 'filename', None), format=bank_format.label)
+    db.session.add(bank_import)
+    db.session.flush()
 
-    new_transactions_count = 0
-    duplicates_found_count = 0
+    def valid_rows():
+        for line_no, row, error in parsed:
+            if error:
+                current_app.logger.warning(f"Hoppar över ogiltig rad {line_no} i {bank_format.label}-filen: {error}")
+                continue
+            yield line_no, row
 
-    existing_transactions = db.session.query(
-        BankTransaction.bokforingsdag,
-        BankTransaction.referens,
-        BankTransaction.belopp
-    ).filter_by(company_id=company_id).all()
-    
-    existing_set = set((t.bokforingsdag, t.referens, t.belopp) for t in existing_transactions)
+    # Dubbletter känns igen på fingeravtrycket, se bank_import_service
+    tracker = reconciliation_service.BalanceTracker()
+    stats = bank_import_service.import_transactions(company_id, tracker.track(valid_rows()), bank_import.id)
+    issues = tracker.apply_to(bank_import)
+    bank_import.new_count, bank_import.duplicate_count = stats['new'], stats['duplicates']
+    stats['auto_rejected'] = bank_import_service.apply_duplicate_policy(company_id, bank_import.id)
+    stats['duplicates'] -= stats['auto_rejected']
+    # Bankgiroinsättningar från tidigare BGMAX-filer kan nu ha fått sin transaktion
+    bgmax_service.link_deposits(company_id)
+    db.session.commit()
+
+    stats.update({
+        'format': bank_format.label,
+        'reconciled': bank_import.reconciled,
+        'closing_balance': bank_import.closing_balance,
+        'closing_date': bank_import.closing_date,
+        'balance_issues': issues,
+    })
+    return stats
 
-    for _, row in df.iterrows():
-        try:
-            bokforingsdag = datetime.strptime(str(row[column_map['bokforingsdag']]), '%Y-%m-%d').date()
-            belopp = round(float(row[column_map['belopp']]), 2)
-            referens = str(row[column_map['referens']])
-
-            current_transaction_tuple = (bokforingsdag, referens, belopp)
-            is_duplicate = current_transaction_tuple in existing_set
-
-            new_trans = BankTransaction(
-                company_id=company_id,
-                bokforingsdag=bokforingsdag,
-                referens=referens,
-                belopp=belopp,
-                status='pending_duplicate' if is_duplicate else 'unprocessed'
-            )
-            db.session.add(new_trans)
-            
-            if is_duplicate:
-                duplicates_found_count += 1
-            else:
-                new_transactions_count += 1
-                existing_set.add(current_transaction_tuple)
-
-        except (ValueError, TypeError, KeyError) as e:
-            current_app.logger.warning(f"Hoppar över ogiltig rad i CSV: {row}. Fel: {e}")
-            continue
 
+def process_bgmax_upload(file, company_id):
+    """
+    Bearbetar en uppladdad BGMAX-fil: sparar bankgiroinbetalningarna och matchar
+    dem mot fakturor och insättningar, se bgmax_service.
+    """
+    stats = bgmax_service.import_bgmax(company_id, file)
     db.session.commit()
-    
-    return {
-        "new": new_transactions_count,
-        "duplicates": duplicates_found_count
-    }
+    return stats
 
 
 def helper_clean_currency(text):
@@ -124,9 +159,15 @@ def process_bilaga_upload(file, company_id, base_upload_path):
     )
     
     parsed_data = None
-    if filename.lower().endswith('.pdf'):
+    if is_supported(filename):
         try:
-            json_string = extract_exact_json_from_pdf(absolute_filepath)
+            # Skala ned, gråskala och beskär sidor innan filen skickas till AI:n
+            send_path, mime_type = preprocess_for_extraction(absolute_filepath)
+            try:
+                json_string = extract_exact_json_from_pdf(send_path, mime_type)
+            finally:
+                if send_path != absolute_filepath:
+                    os.remove(send_path)
             parsed_data = json.loads(json_string)
             if 'error' in parsed_data:
                 print(f"--- Gemini AI Error for {filename}: {parsed_data['error']} ---")
@@ -146,12 +187,12 @@ def process_bilaga_upload(file, company_id, base_upload_path):
     if parsed_data:
         new_bilaga.fakturanr = parsed_data.get('fakturanr')
         new_bilaga.ocr = parsed_data.get('ocr')
-        brutto = helper_clean_currency(parsed_data.get('total_brutto')) or helper_clean_currency(parsed_data.get('att_betala'))
-        netto = helper_clean_currency(parsed_data.get('total_netto'))
-        final_moms = round(brutto - netto, 2) if brutto is not None and netto is not None else helper_clean_currency(parsed_data.get('total_moms'))
-        new_bilaga.brutto_amount = brutto
-        new_bilaga.netto_amount = netto
-        new_bilaga.moms_amount = final_moms
+        brutto = to_ore(helper_clean_currency(parsed_data.get('total_brutto')) or helper_clean_currency(parsed_data.get('att_betala')))
+        netto = to_ore(helper_clean_currency(parsed_data.get('total_netto')))
+        final_moms = brutto - netto if brutto is not None and netto is not None else to_ore(helper_clean_currency(parsed_data.get('total_moms')))
+        new_bilaga.brutto_amount_ore = brutto
+        new_bilaga.netto_amount_ore = netto
+        new_bilaga.moms_amount_ore = final_moms
         try:
             new_bilaga.fakturadatum = datetime.strptime(parsed_data.get('fakturadatum'), '%Y-%m-%d').date() if parsed_data.get('fakturadatum') else None
             new_bilaga.forfallodag = datetime.strptime(parsed_data.get('forfallodag'), '%Y-%m-%d').date() if parsed_data.get('forfallodag') else None
@@ -172,13 +213,14 @@ def update_bilaga_metadata_service(bilaga_id, data):
     bilaga.forfallodag = datetime.strptime(data['forfallodag'], '%Y-%m-%d').date() if data.get('forfallodag') else None
     bilaga.fakturanr = data.get('fakturanr')
     bilaga.ocr = data.get('ocr')
-    brutto = helper_clean_currency(data.get('total_brutto'))
-    moms = helper_clean_currency(data.get('total_moms'))
-    bilaga.brutto_amount = brutto
-    bilaga.moms_amount = moms
+    brutto = to_ore(helper_clean_currency(data.get('total_brutto')))
+    moms = to_ore(helper_clean_currency(data.get('total_moms')))
+    bilaga.brutto_amount_ore = brutto
+    bilaga.moms_amount_ore = moms
     if brutto is not None and moms is not None:
-         bilaga.netto_amount = round(brutto - moms, 2)
+         bilaga.netto_amount_ore = brutto - moms
     bilaga.suggested_konto = data.get('suggested_konto')
+    refresh_matched_amounts(bilaga_ids=[bilaga.id])
     db.session.commit()
     return bilaga
 
@@ -186,10 +228,10 @@ def bokfor_bilaga_service(bilaga_id, entries_data):
     bilaga = Bilaga.query.get_or_404(bilaga_id)
     if bilaga.status == 'assigned':
         raise Exception('Denna bilaga är redan bokförd.')
-    total_debet = sum(helper_clean_currency(e.get('debet', 0)) for e in entries_data)
-    total_kredit = sum(helper_clean_currency(e.get('kredit', 0)) for e in entries_data)
-    if not math.isclose(total_debet, total_kredit, abs_tol=0.01) or total_debet == 0:
-        raise Exception(f'Obalans! Debet ({total_debet}) matchar inte Kredit ({total_kredit}).')
+    total_debet = sum_ore(helper_clean_currency(e.get('debet', 0)) for e in entries_data)
+    total_kredit = sum_ore(helper_clean_currency(e.get('kredit', 0)) for e in entries_data)
+    if total_debet != total_kredit or total_debet == 0:
+        raise Exception(f'Obalans! Debet ({from_ore(total_debet)}) matchar inte Kredit ({from_ore(total_kredit)}).')
     manual_ver = BankTransaction(
         company_id=bilaga.company_id,
         bokforingsdag=bilaga.fakturadatum or datetime.now().date(),
@@ -210,5 +252,112 @@ def bokfor_bilaga_service(bilaga_id, entries_data):
             db.session.add(new_entry)
     bilaga.bank_transaction_id = manual_ver.id
     bilaga.status = 'assigned'
+    balance_service.refresh_balances([balance_service.period_of(manual_ver.company_id, manual_ver.bokforingsdag)])
     db.session.commit()
     return manual_ver.id
+
+
+def _parse_verifikation(data):
+    """Validerar indata för en manuell verifikation och returnerar (datum, referens, poster, summa debet i öre)."""
+    if not data.get('bokforingsdag') or not data.get('referens'):
+        raise ValueError("Datum och referens är obligatoriska.")
+    entries = [{
+        'konto': entry_data['konto'],
+        'debet_ore': to_ore(entry_data.get('debet') or 0),
+        'kredit_ore': to_ore(entry_data.get('kredit') or 0),
+    } for entry_data in data.get('entries', [])]
+    total_debet = sum(e['debet_ore'] for e in entries)
+    total_kredit = sum(e['kredit_ore'] for e in entries)
+    if total_debet != total_kredit:
+        raise ValueError("Obalans! Debet och kredit summerar inte till samma värde.")
+    bokforingsdag = datetime.strptime(data['bokforingsdag'], '%Y-%m-%d').date()
+    return bokforingsdag, data['referens'], entries, total_debet
+
+
+def _insert_entries(entries_by_transaction):
+    """Skriver posterna för flera verifikationer med en enda bulk-INSERT."""
+    rows = [dict(entry, bank_transaction_id=trans_id)
+            for trans_id, entries in entries_by_transaction for entry in entries]
+    if rows:
+        db.session.execute(insert(BookkeepingEntry), rows)
+
+
+def create_verifikationer(company_id, items):
+    """
+    Skapar manuella verifikationer. Alla refererade bilagor och fakturor hämtas med
+    en IN-fråga per tabell och alla poster skrivs med en bulk-INSERT. Månadssaldona
+    räknas om en gång per berörd månad. Anroparen committar.
+
+    Args:
+        items: Dicts med 'bokforingsdag', 'referens', 'entries' och valfritt
+            'attachment_ids', 'invoice_ids' och 'omvand_skattskyldighet'.
+
+    Returns:
+        De skapade BankTransaction-objekten, i samma ordning som `items`.
+
+    Raises:
+        ValueError: Om någon verifikation är ogiltig. Felet anger dess position.
+    """
+    parsed = []
+    for position, data in enumerate(items, start=1):
+        try:
+            parsed.append(_parse_verifikation(data))
+        except (ValueError, KeyError, TypeError) as e:
+            prefix = f"Verifikation {position}: " if len(items) > 1 else ""
+            raise ValueError(f"{prefix}{e}")
+
+    attachment_ids = {int(i) for data in items for i in data.get('attachment_ids') or []}
+    invoice_ids = {int(i) for data in items for i in data.get('invoice_ids') or []}
+    attachments = {b.id: b for b in Bilaga.query.filter(Bilaga.id.in_(attachment_ids))} if attachment_ids else {}
+    invoices = {i.id: i for i in Invoice.query.filter(Invoice.id.in_(invoice_ids))} if invoice_ids else {}
+
+    transactions = []
+    for data, (bokforingsdag, referens, _, total_debet) in zip(items, parsed):
+        new_trans = BankTransaction(
+            company_id=company_id,
+            bokforingsdag=bokforingsdag,
+            referens=referens,
+            belopp_ore=total_debet,
+            status='processed'
+        )
+        # Koppla bilagor och uppdatera deras status/metadata
+        omvand_skattskyldighet = data.get('omvand_skattskyldighet', False)
+        for att_id in data.get('attachment_ids') or []:
+            attachment = attachments.get(int(att_id))
+            if attachment:
+                new_trans.attachments.append(attachment)
+                attachment.status = 'assigned'
+                attachment.omvand_skattskyldighet = omvand_skattskyldighet
+        for inv_id in data.get('invoice_ids') or []:
+            invoice = invoices.get(int(inv_id))
+            if invoice:
+                new_trans.invoices.append(invoice)
+        transactions.append(new_trans)
+
+    db.session.add_all(transactions)
+    db.session.flush()
+    _insert_entries((trans.id, entries) for trans, (_, _, entries, _) in zip(transactions, parsed))
+    balance_service.refresh_balances(balance_service.period_of(company_id, t.bokforingsdag) for t in transactions)
+    return transactions
+
+
+def update_verifikation(trans, data):
+    """
+    Uppdaterar datum, referens och poster för en verifikation. De gamla posterna
+    tas bort med en DELETE och de nya skrivs med en bulk-INSERT. Anroparen committar.
+
+    Raises:
+        ValueError: Om verifikationen är ogiltig.
+    """
+    bokforingsdag, referens, entries, total_debet = _parse_verifikation(data)
+    old_period = balance_service.period_of(trans.company_id, trans.bokforingsdag)
+    trans.bokforingsdag = bokforingsdag
+    trans.referens = referens
+    trans.belopp_ore = total_debet
+    trans.status = 'processed'
+    db.session.execute(delete(BookkeepingEntry).where(BookkeepingEntry.bank_transaction_id == trans.id))
+    _insert_entries([(trans.id, entries)])
+    db.session.expire(trans, ['entries'])
+    refresh_matched_amounts(transaction_ids=[trans.id])
+    balance_service.refresh_balances([old_period, balance_service.period_of(trans.company_id, bokforingsdag)])
+    return trans
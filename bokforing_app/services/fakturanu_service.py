@@ -2,11 +2,14 @@
 """
 Service för att kommunicera med Fakturan.nu API.
 """
+import os
 import json
 import logging
+import threading
 import time
-from typing import Dict, Optional, Any
-from urllib.parse import urljoin  # Ny: För att hantera relativa URL:er
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, Optional, Any
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode  # För att hantera pagineringslänkar
 
 import requests
 from requests.auth import HTTPBasicAuth
@@ -14,11 +17,16 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from requests.exceptions import ConnectionError
 
-from . import proxy_service
+from . import http_clients, proxy_service
 
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://www.fakturan.nu/api/v2"
+# Kan pekas om mot en lokal ersättare av API:et, t.ex. benchmarks/mock_fakturanu.py
+BASE_URL = os.getenv("FAKTURANU_BASE_URL", "https://www.fakturan.nu/api/v2").rstrip('/')
+
+# Parallell paginering: antal samtidiga sidhämtningar och max nya anrop per sekund
+MAX_PAGE_WORKERS = int(os.getenv("FAKTURANU_MAX_WORKERS", "4"))
+MAX_REQUESTS_PER_SECOND = float(os.getenv("FAKTURANU_MAX_RPS", "5"))
 
 
 def requests_retry_session(
@@ -28,7 +36,8 @@ def requests_retry_session(
     session: Optional[requests.Session] = None,
 ) -> requests.Session:
     """
-    Skapar en requests.Session med retry-logik för transienta fel.
+    Skapar en requests.Session med retry-logik för transienta fel och en
+    anslutningspool dimensionerad enligt `http_clients.POOL_MAXSIZE`.
     """
     session = session or requests.Session()
     retry = Retry(
@@ -39,7 +48,11 @@ def requests_retry_session(
         status_forcelist=status_forcelist,
         allowed_methods=["GET", "POST", "PUT"]
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=http_clients.POOL_MAXSIZE,
+        pool_maxsize=http_clients.POOL_MAXSIZE,
+    )
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
@@ -67,7 +80,7 @@ def _make_request(
     auth = HTTPBasicAuth(api_key_id, api_password)
     headers = {'Content-Type': 'application/json'}
     proxies = proxy_service.get_proxies() if use_proxy else None
-    session = requests_retry_session()
+    session = http_clients.get_session('fakturanu', requests_retry_session)
 
     start_time = time.time()
 
@@ -93,6 +106,8 @@ def _make_request(
             timeout=timeout * (2 if not use_proxy else 1),
             verify=True
         )
+        if proxies:
+            proxy_service.report_proxy_success()
 
         duration = time.time() - start_time
         logger.info(f"--- RESPONSE FRÅN FAKTURAN.NU API (Tid: {duration:.2f}s) ---")
@@ -106,6 +121,8 @@ def _make_request(
         return response.json()
 
     except (requests.exceptions.ProxyError, ConnectionError) as e:
+        if use_proxy and proxies:
+            proxy_service.report_proxy_failure()
         if use_proxy:
             logger.warning(f"Proxy-relaterat fel: {e}. Försöker igen utan proxy.")
             return _make_request(method, endpoint, api_key_id, api_password, params, data, timeout, use_proxy=False, full_url=full_url)
@@ -127,50 +144,141 @@ def _make_request(
         return {'error': error_message}
 
 
-def get_invoices(api_key_id: str, api_password: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+class _RateLimiter:
+    """Enkel trådsäker hastighetsbegränsare: minst 1/rate sekunder mellan anropens start."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _absolute_url(url: str) -> str:
+    """Gör en relativ pagineringslänk absolut (lägg till BASE_URL om relativ)."""
+    return urljoin(BASE_URL, url) if url.startswith('/') else url
+
+
+def _page_url(template_url: str, page: int) -> Optional[str]:
     """
-    Hämtar en lista över alla fakturor med paginering baserat på API-dokumentationen.
-    Följer 'next'-länken för att hämta efterföljande sidor.
-    Returnerar {'invoices': [list of all invoices], 'total_count': int, 'total_pages': int}.
+    Bygger URL:en för en viss sida utifrån en pagineringslänk från API:et genom att
+    byta ut 'page'-parametern. Returnerar None om länken saknar 'page'.
+    """
+    parsed = urlparse(template_url)
+    query = parse_qs(parsed.query, keep_blank_values=True)
+    if 'page' not in query:
+        return None
+    query['page'] = [str(page)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def iter_invoice_pages(
+    api_key_id: str,
+    api_password: str,
+    params: Optional[Dict[str, Any]] = None,
+    concurrent: bool = True,
+    max_workers: int = MAX_PAGE_WORKERS,
+    max_requests_per_second: float = MAX_REQUESTS_PER_SECOND,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Hämtar fakturasidor och levererar dem en i taget så snart de anländer, så att
+    anroparen kan börja skriva till databasen innan sista sidan hämtats.
+
+    Första sidan hämtas alltid först eftersom den innehåller 'total_pages'. Med
+    `concurrent=True` hämtas sedan sidorna 2..N parallellt av högst `max_workers`
+    trådar och högst `max_requests_per_second` nya anrop per sekund; sidorna kan
+    då komma i godtycklig ordning. Saknar pagineringslänken en 'page'-parameter
+    följs 'next'-länkarna sekventiellt som tidigare.
+
+    Yields:
+        {'page': int, 'invoices': [...], 'total_pages': int} per sida, eller ett
+        enda {'error': ...} varefter hämtningen avbryts.
     """
-    all_invoices = []
-    next_url = None
-    current_page = 0
-    total_pages = 0  # Uppdateras från respons
     base_timeout = 120  # Per sida
 
     # Initial anrop med endpoint och params (t.ex. start_date, end_date)
     result = _make_request('GET', 'invoices', api_key_id, api_password, params=params, timeout=base_timeout)
     if 'error' in result:
-        return result
+        yield result
+        return
 
-    # Hämta första sidans data
-    page_invoices = result.get('data', [])
-    all_invoices.extend(page_invoices)
     paging = result.get('paging', {})
-    total_pages = paging.get('total_pages', 1)
+    total_pages = paging.get('total_pages', 1) or 1
     current_page = paging.get('current_page', 1)
     next_url = paging.get('next')
-
-    logger.info(f"Hämtade sida {current_page} ({len(page_invoices)} fakturor).")
-
-    # Loop för efterföljande sidor via 'next'
-    while next_url:
-        # Använd full_url för nästa anrop (lägg till BASE_URL om relativ)
-        full_next_url = urljoin(BASE_URL, next_url) if next_url.startswith('/') else next_url
-
-        result = _make_request('GET', '', api_key_id, api_password, timeout=base_timeout, full_url=full_next_url)
-        if 'error' in result:
-            return result
-
-        page_invoices = result.get('data', [])
-        all_invoices.extend(page_invoices)
-        paging = result.get('paging', {})
-        current_page = paging.get('current_page', current_page + 1)
-        next_url = paging.get('next')
-
-        logger.info(f"Hämtade sida {current_page} ({len(page_invoices)} fakturor).")
-
+    logger.info(f"Hämtade sida {current_page} av {total_pages} ({len(result.get('data', []))} fakturor).")
+    yield {'page': current_page, 'invoices': result.get('data', []), 'total_pages': total_pages}
+
+    if not next_url:
+        return
+
+    next_url = _absolute_url(next_url)
+    page_urls = {}
+    if concurrent and total_pages > 2:
+        page_urls = {page: _page_url(next_url, page) for page in range(current_page + 1, total_pages + 1)}
+        if not all(page_urls.values()):
+            page_urls = {}
+
+    if not page_urls:
+        # Sekventiell hämtning via 'next'-länkarna
+        while next_url:
+            result = _make_request('GET', '', api_key_id, api_password, timeout=base_timeout, full_url=next_url)
+            if 'error' in result:
+                yield result
+                return
+            paging = result.get('paging', {})
+            current_page = paging.get('current_page', current_page + 1)
+            next_url = _absolute_url(paging['next']) if paging.get('next') else None
+            logger.info(f"Hämtade sida {current_page} ({len(result.get('data', []))} fakturor).")
+            yield {'page': current_page, 'invoices': result.get('data', []), 'total_pages': total_pages}
+        return
+
+    limiter = _RateLimiter(max_requests_per_second)
+
+    def fetch(url: str) -> Dict[str, Any]:
+        limiter.wait()
+        return _make_request('GET', '', api_key_id, api_password, timeout=base_timeout, full_url=url)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fakturanu-page') as pool:
+        futures = {pool.submit(fetch, url): page for page, url in page_urls.items()}
+        try:
+            for future in as_completed(futures):
+                page = futures[future]
+                result = future.result()
+                if 'error' in result:
+                    yield result
+                    return
+                logger.info(f"Hämtade sida {page} av {total_pages} ({len(result.get('data', []))} fakturor).")
+                yield {'page': page, 'invoices': result.get('data', []), 'total_pages': total_pages}
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def get_invoices(api_key_id: str, api_password: str, params: Optional[Dict[str, Any]] = None,
+                 concurrent: bool = True) -> Dict[str, Any]:
+    """
+    Hämtar en lista över alla fakturor med paginering baserat på API-dokumentationen.
+    Sidorna hämtas via `iter_invoice_pages` (parallellt om `concurrent`) och slås
+    ihop i sidordning.
+    Returnerar {'invoices': [list of all invoices], 'total_count': int, 'total_pages': int}.
+    """
+    pages = {}
+    total_pages = 0
+    for page in iter_invoice_pages(api_key_id, api_password, params=params, concurrent=concurrent):
+        if 'error' in page:
+            return page
+        pages[page['page']] = page['invoices']
+        total_pages = page['total_pages']
+
+    all_invoices = [invoice for page_number in sorted(pages) for invoice in pages[page_number]]
     logger.info(f"Hämtade totalt {len(all_invoices)} fakturor från {total_pages} sidor.")
     return {
         'invoices': all_invoices,
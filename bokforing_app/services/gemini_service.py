@@ -18,17 +18,21 @@ from requests.exceptions import ConnectionError, ProxyError  # För fallback-han
 from flask import current_app
 from bokforing_app.models import BankTransaction, Invoice
 from bokforing_app.services.accounting_config import KONTOPLAN
-from bokforing_app.services import proxy_service  # Korrigerad: Absolut import
+from bokforing_app.services import http_clients, proxy_service  # Korrigerad: Absolut import
+
+# Kan pekas om mot en lokal ersättare av API:et, t.ex. benchmarks/mock_gemini.py
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip('/')
 
 
 def requests_retry_session(
         retries=5,
         backoff_factor=1,
-        status_forcelist=(500, 502, 503, 504),
+        status_forcelist=(429, 500, 502, 503, 504),
         session=None,
 ):
     """
     Skapar en `requests.Session` som automatiskt försöker igen vid nätverksfel.
+    Anslutningspoolen dimensioneras enligt `http_clients.POOL_MAXSIZE`.
     """
     session = session or requests.Session()
     retry = Retry(
@@ -39,7 +43,11 @@ def requests_retry_session(
         status_forcelist=status_forcelist,
         allowed_methods=["POST", "GET"],  # Ändrat till lista för kompatibilitet
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=http_clients.POOL_MAXSIZE,
+        pool_maxsize=http_clients.POOL_MAXSIZE,
+    )
     session.mount('http://', adapter)
     session.mount('https://', adapter)
     return session
@@ -58,12 +66,11 @@ def _call_gemini_api(prompt: str, use_proxy: bool = True) -> Dict:
 
     proxies = proxy_service.get_proxies() if use_proxy else None
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-latest:generateContent?key={api_key}"
+    url = f"{GEMINI_BASE_URL}/v1beta/models/gemini-flash-latest:generateContent?key={api_key}"
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
 
-    session = requests_retry_session()
-    if proxies:
-        session.proxies = proxies
+    # Delad session; proxy skickas per anrop så att sessionen kan användas från flera trådar
+    session = http_clients.get_session('gemini', requests_retry_session)
 
     start_time = time.time()
 
@@ -74,7 +81,9 @@ def _call_gemini_api(prompt: str, use_proxy: bool = True) -> Dict:
     print("========================================================")
 
     try:
-        response = session.post(url, json=payload, timeout=120)  # Ökat timeout
+        response = session.post(url, json=payload, proxies=proxies, timeout=120)  # Ökat timeout
+        if proxies:
+            proxy_service.report_proxy_success()
         response.raise_for_status()
 
         duration = time.time() - start_time
@@ -96,6 +105,8 @@ def _call_gemini_api(prompt: str, use_proxy: bool = True) -> Dict:
         return parsed_json
 
     except (ProxyError, ConnectionError) as e:
+        if use_proxy and proxies:
+            proxy_service.report_proxy_failure()
         if use_proxy:
             current_app.logger.warning(f"Proxy-relaterat fel i Gemini-anrop: {e}. Försöker igen utan proxy.")
             return _call_gemini_api(prompt, use_proxy=False)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Långlivade, delade HTTP-klienter per extern tjänst.
+
+I stället för att skapa en ny `requests.Session` eller `httpx.Client` för varje
+anrop (och därmed betala för en ny TCP+TLS-handskakning, dessutom via SOCKS-proxyn)
+skapas en klient per tjänst första gången den behövs och återanvänds sedan av
+alla trådar i processen. Klienterna har en anslutningspool vars storlek och
+keep-alive-tid styrs av miljövariablerna HTTP_POOL_MAXSIZE och HTTP_KEEPALIVE_SECONDS.
+
+Både `requests.Session` (med urllib3-poolen) och `httpx.Client` är trådsäkra för
+anrop, så länge ingen ändrar sessionens tillstånd (t.ex. `session.proxies`)
+efter att den skapats. Proxy skickas därför per anrop.
+"""
+import os
+import atexit
+import logging
+import threading
+from typing import Callable, Dict, Hashable
+
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+_lock = threading.Lock()
+_sessions: Dict[Hashable, requests.Session] = {}
+_httpx_clients: Dict[Hashable, httpx.Client] = {}
+
+
+def httpx_limits() -> httpx.Limits:
+    """Poolgränser för httpx-klienter enligt konfigurationen."""
+    return httpx.Limits(
+        max_connections=POOL_MAXSIZE,
+        max_keepalive_connections=POOL_MAXSIZE,
+        keepalive_expiry=KEEPALIVE_SECONDS,
+    )
+
+
+def get_session(key: Hashable, factory: Callable[[], requests.Session]) -> requests.Session:
+    """
+    Returnerar den delade `requests.Session` för `key`. Skapas med `factory`
+    första gången den efterfrågas.
+    """
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = factory()
+                _sessions[key] = session
+                logger.info(f"Skapade delad HTTP-session för '{key}' (poolstorlek {POOL_MAXSIZE}).")
+    return session
+
+
+def get_httpx_client(key: Hashable, factory: Callable[[], httpx.Client]) -> httpx.Client:
+    """
+    Returnerar den delade `httpx.Client` för `key`. Skapas med `factory`
+    första gången den efterfrågas.
+    """
+    client = _httpx_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _httpx_clients.get(key)
+            if client is None:
+                client = factory()
+                _httpx_clients[key] = client
+                logger.info(f"Skapade delad httpx-klient för '{key}' (poolstorlek {POOL_MAXSIZE}).")
+    return client
+
+
+def close_all() -> None:
+    """Stänger alla delade klienter, t.ex. vid processens slut."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        for client in _httpx_clients.values():
+            client.close()
+        _sessions.clear()
+        _httpx_clients.clear()
+
+
+atexit.register(close_all)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Förbehandling av bilagor innan de skickas till Gemini för dataextraktion.
+
+Mobilfoton och inskannade dokument är ofta flera megabyte stora i färg och
+med full upplösning, trots att AI:n bara behöver kunna läsa texten. Denna modul:
+- roterar enligt EXIF, gråskalar och skalar ned bilder och sparar dem som
+  komprimerad JPEG (eller en gråskale-PDF om det finns flera sidor),
+- tar bort tomma sidor,
+- skickar bara första och sista sidorna (där fakturauppgifter och totaler står)
+  när dokumentet är långt.
+
+PDF-sidor läses med pypdf. Sidor med text behålls som de är, medan inskannade
+sidor (utan text) ersätts av sin sidbild och går samma väg som fotona ovan.
+"""
+import io
+import os
+import logging
+import mimetypes
+import tempfile
+from typing import List, Optional, Tuple, Union
+
+from PIL import Image, ImageOps, ImageSequence, ImageStat
+from pypdf import PageObject, PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp', '.bmp'}
+PDF_EXTENSION = '.pdf'
+
+MAX_IMAGE_SIDE = 1600        # Längsta sida i pixlar efter nedskalning
+JPEG_QUALITY = 70
+BLANK_STDDEV_THRESHOLD = 4.0  # Standardavvikelse i gråskala under vilken en sida räknas som tom
+MAX_PAGES = 3                # Dokument med fler sidor än så beskärs
+KEEP_FIRST_PAGES = 1
+KEEP_LAST_PAGES = 1
+
+
+def is_supported(filename: str) -> bool:
+    """Returnerar True om filtypen kan skickas till AI-extraktionen."""
+    ext = os.path.splitext(filename)[1].lower()
+    return ext == PDF_EXTENSION or ext in IMAGE_EXTENSIONS
+
+
+def select_pages(page_count: int) -> List[int]:
+    """
+    Väljer vilka sidindex som ska skickas. Korta dokument skickas i sin helhet,
+    långa reduceras till de första och sista sidorna.
+    """
+    if page_count <= MAX_PAGES:
+        return list(range(page_count))
+    first = list(range(min(KEEP_FIRST_PAGES, page_count)))
+    last = list(range(max(page_count - KEEP_LAST_PAGES, len(first)), page_count))
+    return first + last
+
+
+def _is_blank(image: Image.Image) -> bool:
+    """En sida är tom om den nästan saknar kontrast (mätt på en liten miniatyr för att dämpa brus)."""
+    thumb = image.copy()
+    thumb.thumbnail((128, 128))
+    return ImageStat.Stat(thumb).stddev[0] < BLANK_STDDEV_THRESHOLD
+
+
+def _prepare_image_page(frame: Image.Image) -> Image.Image:
+    page = ImageOps.exif_transpose(frame).convert('L')
+    page.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    return page
+
+
+def _write_images(pages: List[Image.Image]) -> Tuple[str, str]:
+    """Sparar förbehandlade sidor som JPEG (en sida) eller gråskale-PDF i en temporär fil."""
+    if len(pages) == 1:
+        fd, out_path = tempfile.mkstemp(suffix='.jpg')
+        with os.fdopen(fd, 'wb') as out:
+            pages[0].save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        return out_path, 'image/jpeg'
+    fd, out_path = tempfile.mkstemp(suffix='.pdf')
+    with os.fdopen(fd, 'wb') as out:
+        pages[0].save(out, format='PDF', save_all=True, append_images=pages[1:],
+                      resolution=150, quality=JPEG_QUALITY)
+    return out_path, 'application/pdf'
+
+
+def _preprocess_image(path: str) -> Tuple[str, str]:
+    with Image.open(path) as img:
+        pages = [_prepare_image_page(frame) for frame in ImageSequence.Iterator(img)]
+
+    content_pages = [p for p in pages if not _is_blank(p)] or pages[:1]
+    selected = [content_pages[i] for i in select_pages(len(content_pages))]
+    out_path, mime_type = _write_images(selected)
+
+    logger.info(f"Förbehandlade {os.path.basename(path)}: {len(pages)} sidor -> {len(selected)}, "
+                f"{os.path.getsize(path)} -> {os.path.getsize(out_path)} byte.")
+    return out_path, mime_type
+
+
+def _scanned_page(page: PageObject) -> Optional[Image.Image]:
+    """
+    Sidbilden för en inskannad sida (utan text), förbehandlad som ett foto.
+    Returnerar None för sidor med text. En sida utan både text och bilder ger en tom bild.
+    """
+    if (page.extract_text() or '').strip():
+        return None
+    images = [embedded.image for embedded in page.images]
+    if not images:
+        return Image.new('L', (1, 1), 255)
+    # Skannern lägger sidan som en bild; ta den största om det finns flera
+    scan = max(images, key=lambda image: image.width * image.height)
+    if page.rotation:
+        scan = scan.rotate(-page.rotation, expand=True)
+    return _prepare_image_page(scan)
+
+
+def _preprocess_pdf(path: str) -> Tuple[str, str]:
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+
+    pages: List[Union[PageObject, Image.Image]] = []
+    for page in reader.pages:
+        try:
+            scan = _scanned_page(page)
+        except Exception:
+            scan = None  # Sidan kunde inte tolkas, behåll den som den är
+        if scan is None:
+            pages.append(page)
+        elif not _is_blank(scan):
+            pages.append(scan)
+
+    if not pages:
+        pages = [reader.pages[0]]
+    selected = [pages[i] for i in select_pages(len(pages))]
+
+    if all(isinstance(p, Image.Image) for p in selected):
+        out_path, mime_type = _write_images(selected)
+    elif len(selected) == page_count and not any(isinstance(p, Image.Image) for p in selected):
+        return path, 'application/pdf'
+    else:
+        writer = PdfWriter()
+        for page in selected:
+            if isinstance(page, Image.Image):
+                buffer = io.BytesIO()
+                page.save(buffer, format='PDF', resolution=150, quality=JPEG_QUALITY)
+                page = PdfReader(buffer).pages[0]
+            writer.add_page(page)
+        fd, out_path = tempfile.mkstemp(suffix='.pdf')
+        with os.fdopen(fd, 'wb') as out:
+            writer.write(out)
+        mime_type = 'application/pdf'
+
+    logger.info(f"Förbehandlade {os.path.basename(path)}: {page_count} sidor -> {len(selected)}, "
+                f"{os.path.getsize(path)} -> {os.path.getsize(out_path)} byte.")
+    return out_path, mime_type
+
+
+def preprocess_for_extraction(path: str) -> Tuple[str, str]:
+    """
+    Förbereder en bilaga för AI-extraktion.
+
+    Returns:
+        En tupel (sökväg, mime_type). Om sökvägen skiljer sig från `path` är det en
+        temporär fil som anroparen ansvarar för att radera. Vid fel returneras
+        originalfilen oförändrad.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in IMAGE_EXTENSIONS:
+            return _preprocess_image(path)
+        if ext == PDF_EXTENSION:
+            return _preprocess_pdf(path)
+    except Exception as e:
+        logger.warning(f"Förbehandling av {path} misslyckades, skickar originalet. Fel: {e}")
+
+    return path, mimetypes.guess_type(path)[0] or 'application/octet-stream'
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Inkorgen: obearbetade banktransaktioner och väntande dubbletter.
+
+Listan pagineras med keyset-paginering på (sorteringskolumn, id), så att varje
+sida är en begränsad indexsökning även efter stora CSV-importer. Sökning sker
+som prefixsökning på `referens` (LIKE 'text%'). LIKE skiljer inte på stora och
+små bokstäver i SQLite, så indexet på (company_id, referens) har sorteringen
+NOCASE; bara då kan SQLite göra om sökningen till en intervallsökning i indexet.
+
+Antalet rader räknas med en GROUP BY-fråga per företag och sökning och cachas i
+processen i INBOX_COUNT_TTL sekunder. Cachen töms för ett företag så fort en av
+dess transaktioner läggs till, ändras eller tas bort i en flush, så siffrorna är
+aktuella inom samma process och högst INBOX_COUNT_TTL sekunder gamla mellan processer.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from bokforing_app import db
+from bokforing_app.models import BankTransaction
+from bokforing_app.services import pagination
+
+INBOX_COUNT_TTL = float(os.getenv("INBOX_COUNT_TTL", "30"))
+INBOX_COUNT_CACHE_SIZE = 1000
+INBOX_STATUSES = ('unprocessed', 'pending_duplicate')
+
+# Sorteringsnyckel i API:t -> kolumn. Id används alltid som andra nyckel.
+SORT_COLUMNS = {
+    'bokforingsdag': BankTransaction.bokforingsdag,
+    'belopp': BankTransaction.belopp_ore,
+    'referens': BankTransaction.referens,
+}
+
+_count_cache: Dict[Tuple[int, Tuple[str, ...], str], Tuple[float, Dict[str, int]]] = {}
+_count_lock = threading.Lock()
+
+
+def _escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _base_query(company_id: int, statuses: Sequence[str], search: str):
+    query = db.session.query(BankTransaction).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status.in_(statuses),
+    )
+    if search:
+        query = query.filter(BankTransaction.referens.like(_escape_like(search) + '%', escape='\\'))
+    return query
+
+
+def count_inbox(company_id: int, statuses: Sequence[str] = INBOX_STATUSES, search: str = '') -> Dict[str, int]:
+    """
+    Antal transaktioner i inkorgen per status samt totalt, t.ex.
+    {'total': 120, 'unprocessed': 118, 'pending_duplicate': 2}. Resultatet cachas.
+    """
+    key = (company_id, tuple(statuses), search or '')
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(key)
+        if cached and now - cached[0] < INBOX_COUNT_TTL:
+            return dict(cached[1])
+
+    rows = _base_query(company_id, statuses, search).with_entities(
+        BankTransaction.status, func.count(BankTransaction.id)
+    ).group_by(BankTransaction.status).all()
+    counts = {status: 0 for status in statuses}
+    counts.update({status: n for status, n in rows})
+    counts['total'] = sum(n for _, n in rows)
+
+    with _count_lock:
+        if len(_count_cache) >= INBOX_COUNT_CACHE_SIZE:
+            _count_cache.clear()
+        _count_cache[key] = (now, counts)
+    return dict(counts)
+
+
+def invalidate_counts(company_ids: Optional[Sequence[int]] = None) -> None:
+    """Tömmer den cachade räkningen för angivna företag (alla om None)."""
+    with _count_lock:
+        if company_ids is None:
+            _count_cache.clear()
+            return
+        for key in [k for k in _count_cache if k[0] in company_ids]:
+            del _count_cache[key]
+
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_on_flush(session, flush_context):
+    company_ids = {obj.company_id for obj in (*session.new, *session.dirty, *session.deleted)
+                   if isinstance(obj, BankTransaction)}
+    if company_ids:
+        invalidate_counts(company_ids)
+
+
+def get_inbox_transactions(company_id: int, statuses: Sequence[str] = INBOX_STATUSES,
+                           limit: int = pagination.DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                           sort: str = 'bokforingsdag', order: str = 'desc', search: str = '') -> Dict[str, Any]:
+    """
+    Hämtar en sida av inkorgen.
+
+    Args:
+        statuses: Statusar som ska visas, en delmängd av INBOX_STATUSES.
+        cursor: Markören från föregående sida, eller None för första sidan.
+        sort: 'bokforingsdag', 'belopp' eller 'referens'.
+        order: 'asc' eller 'desc'.
+        search: Början av referensen (skiftlägesokänsligt i SQLite, känsligt i PostgreSQL).
+
+    Returns:
+        {'rows': [...], 'next_cursor': str | None, 'counts': {...}}
+
+    Raises:
+        ValueError: Vid okänd sortering, status eller ogiltig markör.
+    """
+    column = SORT_COLUMNS.get(sort)
+    if column is None:
+        raise ValueError(f"Okänd sortering: {sort}")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Okänd sorteringsordning: {order}")
+    unknown = set(statuses) - set(INBOX_STATUSES)
+    if unknown or not statuses:
+        raise ValueError(f"Ogiltig status: {', '.join(sorted(unknown)) or 'ingen'}")
+    descending = order == 'desc'
+    search = (search or '').strip()
+
+    query = _base_query(company_id, statuses, search)
+    decoded = pagination.decode_cursor(cursor, date_positions=(0,) if sort == 'bokforingsdag' else ())
+    after = pagination.keyset_after(column, BankTransaction.id, decoded, descending=descending)
+    if after is not None:
+        query = query.filter(after)
+    query = query.order_by(*pagination.keyset_order(column, BankTransaction.id, descending=descending))
+
+    rows, next_cursor = pagination.fetch_page(query, limit, lambda t: (getattr(t, column.key), t.id))
+    return {
+        'rows': [{
+            'id': t.id,
+            'bokforingsdag': t.bokforingsdag.strftime('%Y-%m-%d'),
+            'referens': t.referens,
+            'belopp': t.belopp,
+            'status': t.status,
+        } for t in rows],
+        'next_cursor': next_cursor,
+        'counts': count_inbox(company_id, statuses, search),
+    }
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Synkronisering av kundfakturor och kunder från Fakturan.nu till den lokala databasen.
+
+Synkroniseringen arbetar sida för sida medan sidorna strömmar in från API:et:
+- befintliga fakturor och kunder för sidan hämtas med en IN-fråga vardera,
+- okända kunder hämtas parallellt från API:et,
+- kunder och fakturor skrivs med bulk-upsert (INSERT ... ON CONFLICT DO UPDATE)
+  och fakturaraderna ersätts med en DELETE ... IN och en bulk-INSERT.
+Antalet databasfrågor blir därmed proportionellt mot antalet sidor i stället för
+antalet fakturor.
+
+Varje faktura från API:et får ett fingeravtryck (SHA-256 av de fält och rader som
+sparas lokalt) som lagras i `Invoice.sync_hash`. Fakturor vars fingeravtryck inte
+ändrats sedan förra synkroniseringen hoppas över helt, utan skrivningar.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert
+
+from bokforing_app import db
+from bokforing_app.models import Client, Company, Invoice, InvoiceRow
+from bokforing_app.services import fakturanu_service, matching_service
+from bokforing_app.services.money import to_ore
+
+logger = logging.getLogger(__name__)
+
+UPSERT_CHUNK_SIZE = 500
+
+INVOICE_UPDATE_COLUMNS = [
+    'client_id', 'number', 'date', 'due_date', 'our_reference', 'your_reference', 'paid_at',
+    'locale', 'currency', 'sum_ore', 'net_ore', 'tax_ore', 'status', 'reverse_charge', 'updated_at', 'sync_hash',
+]
+FINGERPRINT_INVOICE_FIELDS = [
+    'id', 'client_id', 'number', 'date', 'days', 'our_reference', 'your_reference', 'paid_at', 'sent',
+    'locale', 'currency', 'sum', 'net', 'tax', 'reverse_charge',
+]
+FINGERPRINT_ROW_FIELDS = [
+    'product_id', 'product_code', 'product_name', 'product_unit', 'discount', 'amount',
+    'product_price', 'product_tax',
+]
+CLIENT_UPDATE_COLUMNS = [
+    'name', 'org_number', 'email', 'phone', 'street_address', 'zip_code', 'city', 'country',
+]
+
+
+def _chunks(items: List[Any], size: int = UPSERT_CHUNK_SIZE) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _upsert(model, rows: List[Dict[str, Any]], update_columns: List[str]) -> None:
+    """
+    Infogar eller uppdaterar rader på den unika kolumnen `fakturanu_id` med en
+    INSERT ... ON CONFLICT DO UPDATE per chunk (SQLite och PostgreSQL). För andra
+    databaser används ORM:ens merge rad för rad.
+    """
+    if not rows:
+        return
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        existing = {obj.fakturanu_id: obj for obj in model.query.filter(
+            model.fakturanu_id.in_([r['fakturanu_id'] for r in rows]))}
+        for row in rows:
+            obj = existing.get(row['fakturanu_id']) or model()
+            for key, value in row.items():
+                setattr(obj, key, value)
+            db.session.add(obj)
+        db.session.flush()
+        return
+
+    for chunk in _chunks(rows):
+        stmt = dialect_insert(model.__table__).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['fakturanu_id'],
+            set_={col: stmt.excluded[col] for col in update_columns},
+        )
+        db.session.execute(stmt)
+
+
+def invoice_fingerprint(api_invoice: Dict[str, Any]) -> str:
+    """
+    Stabilt fingeravtryck för en faktura från API:et, beräknat på de fält och
+    rader som faktiskt sparas lokalt. Nyckelordningen påverkar inte resultatet.
+    """
+    relevant = {field: api_invoice.get(field) for field in FINGERPRINT_INVOICE_FIELDS}
+    relevant['rows'] = [{field: row.get(field) for field in FINGERPRINT_ROW_FIELDS}
+                        for row in api_invoice.get('rows', [])]
+    canonical = json.dumps(relevant, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _client_values(fakturanu_client_id: int, company_id: int, client_data: Dict[str, Any]) -> Dict[str, Any]:
+    address = client_data.get('address') or {}
+    return {
+        'fakturanu_id': fakturanu_client_id,
+        'company_id': company_id,
+        'name': client_data.get('name'),
+        'org_number': client_data.get('org_number'),
+        'email': client_data.get('email'),
+        'phone': client_data.get('phone'),
+        'street_address': address.get('street_address'),
+        'zip_code': address.get('zip_code'),
+        'city': address.get('city'),
+        'country': address.get('country'),
+    }
+
+
+def _parse_date(value: Optional[str]):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _invoice_values(api_invoice: Dict[str, Any], company_id: int, client_pk: int, now: datetime) -> Dict[str, Any]:
+    invoice_date = _parse_date(api_invoice.get('date'))
+    return {
+        'fakturanu_id': api_invoice['id'],
+        'company_id': company_id,
+        'client_id': client_pk,
+        'number': api_invoice.get('number'),
+        'date': invoice_date,
+        'due_date': invoice_date + timedelta(days=api_invoice.get('days', 30)) if invoice_date else None,
+        'our_reference': api_invoice.get('our_reference'),
+        'your_reference': api_invoice.get('your_reference'),
+        'paid_at': _parse_date(api_invoice.get('paid_at')),
+        'locale': api_invoice.get('locale'),
+        'currency': api_invoice.get('currency'),
+        'sum_ore': to_ore(api_invoice.get('sum') or 0),
+        'net_ore': to_ore(api_invoice.get('net') or 0),
+        'tax_ore': to_ore(api_invoice.get('tax') or 0),
+        'status': 'betald' if api_invoice.get('paid_at') else 'skickad' if api_invoice.get('sent') else 'utkast',
+        'reverse_charge': api_invoice.get('reverse_charge', False),
+        'updated_at': now,
+        'sync_hash': invoice_fingerprint(api_invoice),
+    }
+
+
+def _row_values(invoice_pk: int, row_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'invoice_id': invoice_pk,
+        'product_id': row_data.get('product_id'),
+        'product_code': row_data.get('product_code'),
+        'product_name': row_data.get('product_name'),
+        'product_unit': row_data.get('product_unit'),
+        'discount': float(row_data.get('discount', 0.0)),
+        'amount': float(row_data.get('amount', 0.0)),
+        'price_ore': to_ore(row_data.get('product_price') or 0),
+        'tax_rate': int(row_data.get('product_tax', 0)),
+    }
+
+
+def _fetch_clients(company: Company, client_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Hämtar okända kunder parallellt från Fakturan.nu. Returnerar {fakturanu_id: kunddata}."""
+    if not client_ids:
+        return {}
+
+    def fetch(client_id):
+        return client_id, fakturanu_service.get_client_details(
+            company.fakturanu_key_id, company.fakturanu_password, client_id)
+
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=fakturanu_service.MAX_PAGE_WORKERS,
+                            thread_name_prefix='fakturanu-client') as pool:
+        for client_id, result in pool.map(fetch, client_ids):
+            if 'data' in result:
+                fetched[client_id] = result['data']
+            else:
+                logger.warning(f"Kunde inte hämta klient {client_id}: {result.get('error')}")
+    return fetched
+
+
+def _sync_page(company: Company, api_invoices: List[Dict[str, Any]], stats: Dict[str, int]) -> None:
+    """Skriver en sida fakturor till databasen med bulk-operationer. Oförändrade fakturor hoppas över."""
+    now = datetime.utcnow()
+
+    # 0. Vilka fakturor finns redan och med vilket fingeravtryck (en IN-fråga)
+    existing = dict(db.session.query(Invoice.fakturanu_id, Invoice.sync_hash).filter(
+        Invoice.fakturanu_id.in_([inv['id'] for inv in api_invoices])))
+    changed = []
+    for api_invoice in api_invoices:
+        fid = api_invoice['id']
+        if fid in existing and existing[fid] == invoice_fingerprint(api_invoice):
+            stats['unchanged'] += 1
+        else:
+            changed.append(api_invoice)
+    if not changed:
+        return
+    api_invoices = changed
+
+    # 1. Kunder: befintliga med en IN-fråga, okända hämtas parallellt och upsertas
+    client_ids = {inv['client_id'] for inv in api_invoices if inv.get('client_id')}
+    clients = {fakturanu_id: pk for fakturanu_id, pk in db.session.query(Client.fakturanu_id, Client.id).filter(
+        Client.company_id == company.id, Client.fakturanu_id.in_(client_ids))} if client_ids else {}
+
+    missing = sorted(client_ids - clients.keys())
+    fetched = _fetch_clients(company, missing)
+    if fetched:
+        _upsert(Client, [_client_values(cid, company.id, data) for cid, data in fetched.items()],
+                CLIENT_UPDATE_COLUMNS)
+        clients.update(db.session.query(Client.fakturanu_id, Client.id).filter(
+            Client.fakturanu_id.in_(list(fetched))))
+        stats['new_clients'] += len(fetched)
+
+    # 2. Fakturor: bulk-upsert av nya och ändrade
+    invoice_rows = []
+    for api_invoice in api_invoices:
+        client_pk = clients.get(api_invoice.get('client_id'))
+        if not client_pk:
+            logger.warning(f"Kunde inte hitta eller skapa klient för faktura {api_invoice['id']}. Hoppar över.")
+            stats['skipped'] += 1
+            continue
+        invoice_rows.append(_invoice_values(api_invoice, company.id, client_pk, now))
+        if api_invoice['id'] in existing:
+            stats['updated'] += 1
+        else:
+            stats['new'] += 1
+    _upsert(Invoice, invoice_rows, INVOICE_UPDATE_COLUMNS)
+
+    # 3. Fakturarader: ersätt alla rader för sidans fakturor i två satser
+    synced_ids = [row['fakturanu_id'] for row in invoice_rows]
+    invoice_pks = dict(db.session.query(Invoice.fakturanu_id, Invoice.id).filter(Invoice.fakturanu_id.in_(synced_ids)))
+    if invoice_pks:
+        InvoiceRow.query.filter(InvoiceRow.invoice_id.in_(list(invoice_pks.values()))).delete(synchronize_session=False)
+        row_values = [
+            _row_values(invoice_pks[api_invoice['id']], row_data)
+            for api_invoice in api_invoices if api_invoice['id'] in invoice_pks
+            for row_data in api_invoice.get('rows', [])
+        ]
+        for chunk in _chunks(row_values):
+            db.session.execute(insert(InvoiceRow), chunk)
+
+        # Summan kan ha ändrats för redan matchade fakturor
+        matching_service.refresh_matched_amounts(invoice_ids=list(invoice_pks.values()))
+
+    db.session.commit()
+
+
+def sync_company_invoices(company: Company, params: Optional[Dict[str, Any]] = None,
+                          stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Synkroniserar fakturor för ett företag. Varje sida skrivs och committas så
+    snart den hämtats. Om `stop_event` sätts avbryts synkroniseringen mellan två
+    sidor och statistiken får `'interrupted': True`.
+
+    Returns:
+        Statistik {'new', 'updated', 'unchanged', 'skipped', 'new_clients', 'fetched',
+        'fetch_seconds', 'write_seconds', 'total_seconds'} eller {'error': ...} om
+        hämtningen misslyckades. Sidor som redan skrivits behålls även vid fel.
+    """
+    stats = {'new': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'new_clients': 0, 'fetched': 0}
+    fetch_seconds = 0.0
+    write_seconds = 0.0
+    started = time.monotonic()
+
+    pages = fakturanu_service.iter_invoice_pages(company.fakturanu_key_id, company.fakturanu_password,
+                                                 params=params)
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            pages.close()
+            stats['interrupted'] = True
+            break
+        t0 = time.monotonic()
+        page = next(pages, None)
+        fetch_seconds += time.monotonic() - t0
+        if page is None:
+            break
+        if 'error' in page:
+            return {'error': page['error'], **stats}
+        stats['fetched'] += len(page['invoices'])
+        if not page['invoices']:
+            continue
+
+        t0 = time.monotonic()
+        try:
+            _sync_page(company, page['invoices'], stats)
+        except Exception:
+            db.session.rollback()
+            raise
+        write_seconds += time.monotonic() - t0
+
+    stats['fetch_seconds'] = round(fetch_seconds, 3)
+    stats['write_seconds'] = round(write_seconds, 3)
+    stats['total_seconds'] = round(time.monotonic() - started, 3)
+    logger.info(f"Synkronisering slutförd för företag {company.id}: {stats}")
+    return stats
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Matchningar och öppna poster: transaktioner, fakturor och bilagor med
+kvarvarande belopp att matcha.
+
+Varje BankTransaction, Invoice och Bilaga har de denormaliserade kolumnerna
+`matched_amount_ore` (summan av dess Matchning-rader) och `remaining_amount_ore`
+(beloppet minus matchat), i hela ören så att summorna är exakta. De räknas om med `refresh_matched_amounts` i samma
+transaktion som matchningar skapas eller tas bort, eller som ett belopp ändras,
+så att öppna poster kan hämtas med ett enkelt indexerat filter.
+`rebuild_matched_amounts` kontrollerar och återställer kolumnerna för hela databasen.
+
+Listorna pagineras med keyset-paginering på (datum, id) så att varje sida är
+en begränsad indexsökning.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload
+
+from bokforing_app import db
+from bokforing_app.models import (
+    BankgiroPayment, BankTransaction, Bilaga, BookkeepingEntry, Invoice, Matchning,
+    bilaga_transaction_association, invoice_transaction_association,
+)
+from bokforing_app.services import balance_service, pagination
+from bokforing_app.services.money import from_ore, to_ore
+
+
+REFRESH_CHUNK_SIZE = 500
+
+# (modell, främmande nyckel i Matchning, beloppskolumn i öre)
+_MATCHED_MODELS = {
+    'transactions': (BankTransaction, Matchning.transaction_id, BankTransaction.belopp_ore),
+    'invoices': (Invoice, Matchning.invoice_id, Invoice.sum_ore),
+    'bilagor': (Bilaga, Matchning.bilaga_id, Bilaga.brutto_amount_ore),
+}
+
+
+def _matched_sum(foreign_key, owner_id):
+    """Korrelerad delfråga: summan av matchade belopp i öre för en rad."""
+    return select(func.coalesce(func.sum(Matchning.amount_ore), 0)).where(
+        foreign_key == owner_id).correlate_except(Matchning).scalar_subquery()
+
+
+def _refresh(kind: str, ids: Optional[Iterable[int]]) -> None:
+    model, foreign_key, amount_column = _MATCHED_MODELS[kind]
+    matched = _matched_sum(foreign_key, model.id)
+    stmt = update(model).values(matched_amount_ore=matched, remaining_amount_ore=amount_column - matched)
+    if ids is None:
+        db.session.execute(stmt, execution_options={'synchronize_session': False})
+        return
+    ids = sorted({i for i in ids if i})
+    for i in range(0, len(ids), REFRESH_CHUNK_SIZE):
+        db.session.execute(stmt.where(model.id.in_(ids[i:i + REFRESH_CHUNK_SIZE])),
+                           execution_options={'synchronize_session': 'fetch'})
+
+
+def refresh_matched_amounts(transaction_ids: Iterable[int] = (), invoice_ids: Iterable[int] = (),
+                            bilaga_ids: Iterable[int] = ()) -> None:
+    """
+    Räknar om `matched_amount_ore` och `remaining_amount_ore` för angivna rader med en
+    UPDATE per tabell (och chunk). Körs i anroparens transaktion; anroparen committar.
+    """
+    db.session.flush()
+    _refresh('transactions', transaction_ids)
+    _refresh('invoices', invoice_ids)
+    _refresh('bilagor', bilaga_ids)
+
+
+def rebuild_matched_amounts(check_only: bool = False) -> Dict[str, int]:
+    """
+    Kontrollerar de denormaliserade matchningssummorna mot Matchning-tabellen och
+    räknar om dem för alla rader om något avviker (om inte `check_only`).
+
+    Returns:
+        Antal avvikande rader per tabell, t.ex. {'transactions': 0, 'invoices': 2, 'bilagor': 0}.
+    """
+    mismatches = {}
+    for kind, (model, foreign_key, amount_column) in _MATCHED_MODELS.items():
+        matched = _matched_sum(foreign_key, model.id)
+        expected_remaining = amount_column - matched
+        mismatches[kind] = db.session.query(func.count(model.id)).filter(
+            (model.matched_amount_ore != matched)
+            | (model.remaining_amount_ore.is_(None) & amount_column.isnot(None))
+            | (model.remaining_amount_ore != expected_remaining)
+        ).scalar()
+        if mismatches[kind] and not check_only:
+            _refresh(kind, None)
+    if not check_only:
+        db.session.commit()
+    return mismatches
+
+
+def get_open_transactions(company_id: int, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                          cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Transaktioner med kvarvarande belopp att matcha, sorterade på (bokforingsdag, id)."""
+    query = db.session.query(BankTransaction, BankTransaction.remaining_amount_ore).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.remaining_amount_ore > 0,
+    )
+    after = pagination.keyset_after(BankTransaction.bokforingsdag, BankTransaction.id,
+                                    pagination.decode_cursor(cursor))
+    if after is not None:
+        query = query.filter(after)
+    query = query.order_by(*pagination.keyset_order(BankTransaction.bokforingsdag, BankTransaction.id))
+
+    rows, next_cursor = pagination.fetch_page(query, limit, lambda r: (r[0].bokforingsdag, r[0].id))
+    return [{
+        'id': trans.id,
+        'date': trans.bokforingsdag.strftime('%Y-%m-%d'),
+        'label': f"{trans.bokforingsdag.strftime('%Y-%m-%d')} - {trans.referens or ''}",
+        'referens': trans.referens,
+        'remaining_amount': from_ore(remaining_ore),
+    } for trans, remaining_ore in rows], next_cursor
+
+
+def get_open_invoices(company_id: int, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                      cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fakturor med kvarvarande belopp att betala, sorterade på (date, id)."""
+    query = db.session.query(Invoice, Invoice.remaining_amount_ore).options(joinedload(Invoice.client)).filter(
+        Invoice.company_id == company_id,
+        Invoice.remaining_amount_ore > 0,
+    )
+    after = pagination.keyset_after(Invoice.date, Invoice.id, pagination.decode_cursor(cursor))
+    if after is not None:
+        query = query.filter(after)
+    query = query.order_by(*pagination.keyset_order(Invoice.date, Invoice.id))
+
+    rows, next_cursor = pagination.fetch_page(query, limit, lambda r: (r[0].date, r[0].id))
+    return [{
+        'id': invoice.id,
+        'date': invoice.date.strftime('%Y-%m-%d') if invoice.date else None,
+        'label': f"#{invoice.number} - {invoice.client.name if invoice.client else 'N/A'}",
+        'remaining_amount': from_ore(remaining_ore),
+    } for invoice, remaining_ore in rows], next_cursor
+
+
+def get_open_bilagor(company_id: int, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                     cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Bilagor med kvarvarande belopp att betala, sorterade på (fakturadatum, id)."""
+    query = db.session.query(Bilaga, Bilaga.remaining_amount_ore).filter(
+        Bilaga.company_id == company_id,
+        Bilaga.remaining_amount_ore > 0,
+    )
+    after = pagination.keyset_after(Bilaga.fakturadatum, Bilaga.id, pagination.decode_cursor(cursor))
+    if after is not None:
+        query = query.filter(after)
+    query = query.order_by(*pagination.keyset_order(Bilaga.fakturadatum, Bilaga.id))
+
+    rows, next_cursor = pagination.fetch_page(query, limit, lambda r: (r[0].fakturadatum, r[0].id))
+    return [{
+        'id': bilaga.id,
+        'date': bilaga.fakturadatum.strftime('%Y-%m-%d') if bilaga.fakturadatum else None,
+        'label': bilaga.filename,
+        'remaining_amount': from_ore(remaining_ore),
+    } for bilaga, remaining_ore in rows], next_cursor
+
+
+OPEN_ITEM_LOADERS = {
+    'transactions': get_open_transactions,
+    'invoices': get_open_invoices,
+    'bilagor': get_open_bilagor,
+}
+
+
+def create_matchningar(matches: List[Dict[str, Any]]) -> List[Matchning]:
+    """
+    Skapar Matchning-rader från dicts med 'transaction_id', 'amount' och antingen
+    'invoice_id' eller 'bilaga_id'. Raderna läggs till i sessionen; anroparen committar.
+
+    Raises:
+        ValueError: Om en matchning saknar transaktion, underlag eller har ett ogiltigt belopp.
+    """
+    created = []
+    for match_data in matches:
+        amount_ore = to_ore(match_data['amount'])
+        if not amount_ore or amount_ore <= 0:
+            raise ValueError("Matchat belopp måste vara större än noll.")
+        invoice_id = int(match_data['invoice_id']) if match_data.get('invoice_id') else None
+        bilaga_id = int(match_data['bilaga_id']) if match_data.get('bilaga_id') else None
+        if not invoice_id and not bilaga_id:
+            raise ValueError("En matchning måste ha en faktura eller en bilaga.")
+        match = Matchning(
+            amount_ore=amount_ore,
+            transaction_id=int(match_data['transaction_id']),
+            invoice_id=invoice_id,
+            bilaga_id=bilaga_id,
+        )
+        db.session.add(match)
+        created.append(match)
+    refresh_matched_amounts(
+        transaction_ids=[m.transaction_id for m in created],
+        invoice_ids=[m.invoice_id for m in created],
+        bilaga_ids=[m.bilaga_id for m in created],
+    )
+    return created
+
+
+def delete_matchning(match: Matchning) -> None:
+    """Tar bort en matchning och räknar om summorna för dess transaktion och underlag."""
+    transaction_id, invoice_id, bilaga_id = match.transaction_id, match.invoice_id, match.bilaga_id
+    db.session.delete(match)
+    refresh_matched_amounts(transaction_ids=[transaction_id], invoice_ids=[invoice_id], bilaga_ids=[bilaga_id])
+
+
+def delete_transaction(transaction: BankTransaction) -> None:
+    """
+    Tar bort en transaktion (dess matchningar tas bort via cascade) och räknar om
+    summorna för de fakturor och bilagor som den var matchad mot, och månadssaldona.
+    """
+    periods = balance_service.transaction_periods([transaction.id])
+    invoice_ids = [m.invoice_id for m in transaction.matchningar]
+    bilaga_ids = [m.bilaga_id for m in transaction.matchningar]
+    # Bankgiroinbetalningar på insättningen blir okopplade och kan kopplas igen vid nästa import
+    BankgiroPayment.query.filter_by(bank_transaction_id=transaction.id).update({'bank_transaction_id': None})
+    db.session.delete(transaction)
+    refresh_matched_amounts(invoice_ids=invoice_ids, bilaga_ids=bilaga_ids)
+    balance_service.refresh_balances(periods)
+
+
+def delete_transactions(transaction_ids) -> int:
+    """
+    Tar bort flera transaktioner på en gång, med samma följder som delete_transaction
+    men med en DELETE/UPDATE per tabell i stället för en per transaktion.
+
+    Args:
+        transaction_ids: En select-sats som ger transaktionernas id, t.ex.
+            select(BankTransaction.id).where(...). Den får inte bero på tabellerna
+            som ändras här, utom bank_transaction som tas bort sist.
+
+    Returns:
+        Antalet borttagna transaktioner.
+    """
+    periods = balance_service.transaction_periods(transaction_ids)
+    matched = db.session.query(Matchning.invoice_id, Matchning.bilaga_id).filter(
+        Matchning.transaction_id.in_(transaction_ids)).all()
+    db.session.query(Matchning).filter(Matchning.transaction_id.in_(transaction_ids)).delete(synchronize_session=False)
+    db.session.query(BookkeepingEntry).filter(
+        BookkeepingEntry.bank_transaction_id.in_(transaction_ids)).delete(synchronize_session=False)
+    for table in (invoice_transaction_association, bilaga_transaction_association):
+        db.session.execute(table.delete().where(table.c.bank_transaction_id.in_(transaction_ids)))
+    BankgiroPayment.query.filter(BankgiroPayment.bank_transaction_id.in_(transaction_ids)).update(
+        {'bank_transaction_id': None}, synchronize_session=False)
+    deleted = BankTransaction.query.filter(BankTransaction.id.in_(transaction_ids)).delete(synchronize_session=False)
+    refresh_matched_amounts(invoice_ids=[i for i, _ in matched], bilaga_ids=[b for _, b in matched])
+    balance_service.refresh_balances(periods)
+    return deleted
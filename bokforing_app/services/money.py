@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Belopp i hela ören.
+
+Alla belopp i databasen lagras som heltal i öre (BigInteger-kolumner med
+suffixet `_ore`). Modellerna har dessutom kronattribut med de gamla namnen
+(`belopp`, `debet`, `sum`, ...) som räknar om till och från öre, så att mallar
+och JSON-svar fortsätter att visa kronor.
+
+Inom tjänsterna räknas det i öre: summor, jämförelser och balanskontroller blir
+exakt heltalsaritmetik utan toleranser eller avrundningskorrigeringar. `to_ore`
+används där belopp kommer in (formulär, CSV, API:er) och `from_ore` där de går ut.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, Iterable, Optional
+
+
+def to_ore(value: Any) -> Optional[int]:
+    """
+    Omvandlar ett kronbelopp (float, int, Decimal eller sträng) till hela ören,
+    avrundat på halva ören bort från noll. Tom sträng och None ger None.
+
+    Raises:
+        ValueError: Om värdet inte är ett belopp.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, float):
+        # repr ger det kortaste decimaltal som motsvarar floaten, så 0.1 blir exakt 10 öre
+        value = repr(value)
+    try:
+        return int((Decimal(str(value)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"Ogiltigt belopp: {value!r}")
+
+
+def from_ore(ore: Optional[int]) -> Optional[float]:
+    """Omvandlar hela ören till kronor för visning och JSON."""
+    return None if ore is None else ore / 100
+
+
+def sum_ore(values: Iterable[Any]) -> int:
+    """Summerar kronbelopp exakt genom att först omvandla varje belopp till öre."""
+    return sum(to_ore(v) or 0 for v in values)
+
@@ -1,10 +1,13 @@
 import os
 import json
-from typing import Optional
+from typing import Dict, Iterator, Optional
 from pydantic import BaseModel, Field
 import httpx
 import base64
 
+from bokforing_app.services import http_clients
+from bokforing_app.services.gemini_service import GEMINI_BASE_URL
+
 
 # --- 1. Pydantic-modeller ---
 
@@ -36,33 +39,120 @@ class InvoiceDataStrict(BaseModel):
     information: Optional[str] = None
 
 
-# --- 2. Huvudfunktion för att anropa Gemini direkt med httpx ---
+# --- 2. Uppladdning av filer till Gemini ---
+
+# Filer upp till denna storlek skickas inline (base64) i samma anrop. Större filer
+# strömmas i bitar via Geminis File API så att minnesanvändningen per uppladdning
+# förblir begränsad till en chunk i stället för hela filen (plus base64-kopian).
+INLINE_MAX_BYTES = 1 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+def _iter_file_chunks(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Läser en fil i bitar så att den aldrig behöver ligga helt i minnet."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _build_client(proxy_url: Optional[str]) -> httpx.Client:
+    """
+    Bygger den delade httpx-klienten för Gemini, med SOCKS5-transport om en proxy
+    är konfigurerad. Anropas en gång per process och proxyinställning.
+    """
+    limits = http_clients.httpx_limits()
+    if not proxy_url:
+        return httpx.Client(limits=limits)
+
+    from httpx_socks import SyncProxyTransport
+    transport = SyncProxyTransport.from_url(proxy_url, limits=limits)
+    return httpx.Client(transport=transport)
+
+
+def _upload_file(client: httpx.Client, api_key: str, path: str, mime_type: str) -> Dict[str, str]:
+    """
+    Laddar upp en fil till Geminis File API med det återupptagbara protokollet.
+    Själva filinnehållet strömmas som request-kropp i bitar om UPLOAD_CHUNK_SIZE.
+    Returnerar filobjektet från API:et (bl.a. 'name' och 'uri').
+
+    Raises:
+        ValueError: Om API:et svarar utan uppladdningsadress eller filobjekt.
+    """
+    size = os.path.getsize(path)
+    start = client.post(
+        f"{GEMINI_BASE_URL}/upload/v1beta/files?key={api_key}",
+        headers={
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(size),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+        },
+        json={"file": {"display_name": os.path.basename(path)}},
+        timeout=60,
+    )
+    start.raise_for_status()
+    upload_url = start.headers.get("x-goog-upload-url")
+    if not upload_url:
+        raise ValueError(f"No upload URL in File API response: {start.text}")
+
+    response = client.post(
+        upload_url,
+        headers={
+            "Content-Length": str(size),
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        },
+        content=_iter_file_chunks(path),
+        timeout=300,
+    )
+    response.raise_for_status()
+    try:
+        uploaded = response.json()["file"]
+    except (ValueError, KeyError, TypeError):
+        uploaded = None
+    if not isinstance(uploaded, dict) or not {"name", "uri"} <= uploaded.keys():
+        raise ValueError(f"Unexpected File API response: {response.text}")
+    return uploaded
+
+
+def _delete_uploaded_file(client: httpx.Client, api_key: str, name: str) -> None:
+    """Tar bort en uppladdad fil. Misslyckanden ignoreras, filerna rensas ändå automatiskt efter 48 h."""
+    try:
+        client.delete(f"{GEMINI_BASE_URL}/v1beta/{name}?key={api_key}", timeout=30)
+    except httpx.HTTPError:
+        pass
+
+
+# --- 3. Huvudfunktion för att anropa Gemini direkt med httpx ---
 
-def extract_exact_json_from_pdf(pdf_path: str) -> str:
+def extract_exact_json_from_pdf(pdf_path: str, mime_type: str = "application/pdf") -> str:
     """
-    Skickar PDF-data till Gemini REST API med httpx och returnerar en JSON-sträng.
+    Skickar PDF-data (eller en förbehandlad bild, se `mime_type`) till Gemini REST API
+    med httpx och returnerar en JSON-sträng.
+    Små filer skickas inline, större filer strömmas via File API.
     """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         return json.dumps({"error": "GEMINI_API_KEY not set in environment"})
 
     proxy_url = os.getenv("SOCKS5_PROXY")
-    transport = None
-    if proxy_url:
-        try:
-            from httpx_socks import SyncSocks5Transport
-            parts = proxy_url.replace("socks5://", "").split(":")
-            host = parts[0]
-            port = int(parts[1]) if len(parts) > 1 else 1080
-            transport = SyncSocks5Transport(host=host, port=port)
-        except ImportError:
-            return json.dumps({"error": "Proxy support requires 'httpx-socks'. Please run 'pip install httpx-socks'."})
-        except Exception as e:
-            return json.dumps({"error": f"Failed to configure SOCKS5 proxy: {e}"})
+    try:
+        client = http_clients.get_httpx_client(('gemini-files', proxy_url), lambda: _build_client(proxy_url))
+    except ImportError:
+        return json.dumps({"error": "Proxy support requires 'httpx-socks'. Please run 'pip install httpx-socks'."})
+    except Exception as e:
+        return json.dumps({"error": f"Failed to configure SOCKS5 proxy: {e}"})
 
     try:
-        with open(pdf_path, "rb") as f:
-            pdf_content_base64 = base64.b64encode(f.read()).decode('utf-8')
+        file_size = os.path.getsize(pdf_path)
+        inline_part = None
+        if file_size <= INLINE_MAX_BYTES:
+            with open(pdf_path, "rb") as f:
+                inline_part = {"inline_data": {"mime_type": mime_type,
+                                               "data": base64.b64encode(f.read()).decode('utf-8')}}
     except FileNotFoundError:
         return json.dumps({"error": f"File not found: {pdf_path}"})
     except Exception as e:
@@ -75,45 +165,58 @@ def extract_exact_json_from_pdf(pdf_path: str) -> str:
     """
 
     # Använder den stabila 'gemini-pro-vision'-modellen
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro-vision:generateContent?key={api_key}"
-
-    # Förenklad payload
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"inline_data": {"mime_type": "application/pdf", "data": pdf_content_base64}},
-                    {"text": prompt}
-                ]
-            }
-        ]
-    }
+    url = f"{GEMINI_BASE_URL}/v1beta/models/gemini-pro-vision:generateContent?key={api_key}"
 
+    uploaded_file = None
     try:
-        with httpx.Client(transport=transport) as client:
+        if inline_part is None:
+            try:
+                uploaded_file = _upload_file(client, api_key, pdf_path, mime_type)
+            except ValueError as e:
+                return json.dumps({"error": f"File upload to Gemini failed: {e}"})
+            file_part = {"file_data": {"mime_type": mime_type, "file_uri": uploaded_file["uri"]}}
+        else:
+            file_part = inline_part
+
+        # Förenklad payload
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        file_part,
+                        {"text": prompt}
+                    ]
+                }
+            ]
+        }
+
+        try:
             response = client.post(url, json=payload, timeout=120)
             response.raise_for_status()
+        finally:
+            if uploaded_file:
+                _delete_uploaded_file(client, api_key, uploaded_file["name"])
 
-            api_response = response.json()
-            text_response = api_response['candidates'][0]['content']['parts'][0]['text']
+        try:
+            text_response = response.json()['candidates'][0]['content']['parts'][0]['text']
+        except (ValueError, KeyError, IndexError, TypeError):
+            return json.dumps({"error": f"Unexpected API response format: {response.text}"})
 
-            # Rensa bort markdown och validera JSON
-            cleaned_text = text_response.replace("```json", "").replace("```", "").strip()
-            json.loads(cleaned_text)
-            return cleaned_text
+        # Rensa bort markdown och validera JSON
+        cleaned_text = text_response.replace("```json", "").replace("```", "").strip()
+        json.loads(cleaned_text)
+        return cleaned_text
 
     except httpx.RequestError as e:
         return json.dumps({"error": f"Request to Gemini API failed: {e}"})
     except httpx.HTTPStatusError as e:
         return json.dumps({"error": f"Gemini API returned an error: {e.response.status_code} {e.response.text}"})
-    except (KeyError, IndexError):
-        return json.dumps({"error": f"Unexpected API response format: {response.text}"})
     except json.JSONDecodeError:
         return json.dumps({"error": f"AI returned invalid JSON: {text_response}"})
     except Exception as e:
         return json.dumps({"error": f"An unexpected error occurred: {str(e)}"})
 
 
-# --- 3. Exempel ---
+# --- 4. Exempel ---
 if __name__ == "__main__":
     pass
@@ -4,17 +4,30 @@ Centraliserad service för hantering av proxy-inställningar.
 
 Denna modul ansvarar för att hämta, validera och tillhandahålla
 proxy-konfigurationer för hela applikationen. Den läser från
-miljövariabeln SOCKS5_PROXY och inkluderar en proaktiv kontroll
-för att säkerställa att proxyn är nåbar innan den används.
+miljövariabeln SOCKS5_PROXY och kontrollerar att proxyn är nåbar innan den används.
+
+Nåbarheten cachas av en `ProxyHealthMonitor` i PROXY_HEALTH_TTL sekunder och
+förnyas i bakgrunden när cachen blivit gammal, så att vanliga anrop aldrig väntar
+på ett anslutningstest. Efter PROXY_FAILURE_THRESHOLD misslyckanden i rad
+(från tester eller rapporterade av anropare) öppnas en "circuit breaker" och
+proxyn kringgås direkt i PROXY_OPEN_SECONDS sekunder innan den testas igen.
+Anropare rapporterar även lyckade anrop, som nollställer räknaren, så att
+enstaka fel med långa mellanrum inte räknas som fel i rad.
 """
 import os
 import socket
+import time
 import logging
-from typing import Dict, Optional
+import threading
+from typing import Any, Dict, Optional
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+PROXY_HEALTH_TTL = float(os.getenv("PROXY_HEALTH_TTL", "30"))
+PROXY_FAILURE_THRESHOLD = int(os.getenv("PROXY_FAILURE_THRESHOLD", "3"))
+PROXY_OPEN_SECONDS = float(os.getenv("PROXY_OPEN_SECONDS", "60"))
+
 
 def is_proxy_alive(proxy_url: str) -> bool:
     """
@@ -41,25 +54,180 @@ def is_proxy_alive(proxy_url: str) -> bool:
         return False
 
 
+class ProxyHealthMonitor:
+    """
+    Håller reda på om en proxy är nåbar, med TTL-cache, bakgrundsförnyelse,
+    circuit breaker och enkla mätvärden för anslutningstesterna.
+    """
+
+    def __init__(self, proxy_url: str, ttl: float = PROXY_HEALTH_TTL,
+                 failure_threshold: int = PROXY_FAILURE_THRESHOLD, open_seconds: float = PROXY_OPEN_SECONDS):
+        self.proxy_url = proxy_url
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._alive: Optional[bool] = None
+        self._checked_at = 0.0
+        self._open_until = 0.0
+        self._consecutive_failures = 0
+
+        self._probes = 0
+        self._probe_failures = 0
+        self._total_latency = 0.0
+        self._last_latency: Optional[float] = None
+
+    def is_available(self) -> bool:
+        """
+        Returnerar senast kända status utan att blockera. Bara det allra första
+        anropet väntar på ett anslutningstest.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._open_until:
+                return False
+            first_check = self._alive is None
+            # Efter en öppen period (half-open) testas proxyn igen innan den används
+            half_open = self._open_until > 0
+            stale = half_open or now - self._checked_at >= self.ttl
+        if first_check:
+            return self.probe()
+        if stale:
+            self._refresh_in_background()
+        return bool(self._alive)
+
+    def probe(self) -> bool:
+        """Gör ett anslutningstest nu och uppdaterar status och mätvärden."""
+        start = time.monotonic()
+        alive = is_proxy_alive(self.proxy_url)
+        latency = time.monotonic() - start
+        with self._lock:
+            self._probes += 1
+            self._total_latency += latency
+            self._last_latency = latency
+            self._checked_at = time.monotonic()
+            if alive:
+                self._alive = True
+                self._consecutive_failures = 0
+                self._open_until = 0.0
+            else:
+                self._probe_failures += 1
+                if self._alive is None:
+                    self._alive = False  # En proxy som aldrig svarat används inte
+                self._register_failure()
+        return alive
+
+    def record_success(self) -> None:
+        """Anropas när ett riktigt anrop via proxyn lyckats."""
+        with self._lock:
+            self._alive = True
+            self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """Anropas när ett riktigt anrop via proxyn misslyckats."""
+        with self._lock:
+            self._register_failure()
+
+    def _register_failure(self) -> None:
+        # Proxyn räknas som nåbar tills felen i rad når tröskeln
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.failure_threshold:
+            self._alive = False
+            self._open_until = time.monotonic() + self.open_seconds
+            logger.warning(f"Proxy {self.proxy_url} har misslyckats {self._consecutive_failures} gånger i rad. "
+                           f"Kringgås i {self.open_seconds:.0f}s.")
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.probe()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="proxy-health-probe", daemon=True).start()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Mätvärden för anslutningstesterna, t.ex. för en statusendpoint."""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'proxy_url': self.proxy_url,
+                'alive': self._alive,
+                'circuit_open': now < self._open_until,
+                'consecutive_failures': self._consecutive_failures,
+                'probes': self._probes,
+                'probe_failures': self._probe_failures,
+                'last_probe_latency_ms': round(self._last_latency * 1000, 1) if self._last_latency is not None else None,
+                'avg_probe_latency_ms': round(self._total_latency / self._probes * 1000, 1) if self._probes else None,
+                'seconds_since_check': round(now - self._checked_at, 1) if self._checked_at else None,
+            }
+
+
+_monitors: Dict[str, ProxyHealthMonitor] = {}
+_monitors_lock = threading.Lock()
+
+
+def _get_configured_proxy_url() -> str:
+    return os.getenv("SOCKS5_PROXY", "").strip()
+
+
+def get_monitor(proxy_url: str) -> ProxyHealthMonitor:
+    """Returnerar (och skapar vid behov) den delade hälsomonitorn för en proxy-URL."""
+    with _monitors_lock:
+        monitor = _monitors.get(proxy_url)
+        if monitor is None:
+            monitor = ProxyHealthMonitor(proxy_url)
+            _monitors[proxy_url] = monitor
+        return monitor
+
+
+def report_proxy_failure() -> None:
+    """Rapporterar att ett anrop via den konfigurerade proxyn misslyckades."""
+    proxy_url = _get_configured_proxy_url()
+    if proxy_url:
+        get_monitor(proxy_url).record_failure()
+
+
+def report_proxy_success() -> None:
+    """Rapporterar att ett anrop via den konfigurerade proxyn lyckades."""
+    proxy_url = _get_configured_proxy_url()
+    if proxy_url:
+        get_monitor(proxy_url).record_success()
+
+
+def get_proxy_metrics() -> Optional[Dict[str, Any]]:
+    """Returnerar mätvärden för den konfigurerade proxyn, eller None om ingen proxy är satt."""
+    proxy_url = _get_configured_proxy_url()
+    return get_monitor(proxy_url).metrics() if proxy_url else None
+
+
 def get_proxies() -> Optional[Dict[str, str]]:
     """
     Hämtar och validerar proxy-inställningar från miljövariabeln SOCKS5_PROXY.
 
-    Om proxyn är konfigurerad men inte nåbar, loggas en varning och funktionen
-    returnerar None, vilket effektivt inaktiverar proxy-användning för det anropet.
+    Om proxyn är konfigurerad men inte nåbar (enligt den cachade hälsostatusen),
+    returnerar funktionen None, vilket effektivt inaktiverar proxy-användning för det anropet.
 
     Returns:
         En dictionary med proxy-inställningar (t.ex. {"http": ..., "https": ...})
         om en giltig och nåbar proxy hittas, annars None.
     """
-    proxy_url = os.getenv("SOCKS5_PROXY", "").strip()
+    proxy_url = _get_configured_proxy_url()
 
     if proxy_url:
-        if not is_proxy_alive(proxy_url):
+        if not get_monitor(proxy_url).is_available():
             logger.info("Proxy otillgänglig – kringgår proxy.")
             return None
 
-        logger.info(f"Använder nåbar proxy från SOCKS5_PROXY: {proxy_url}")
+        logger.debug(f"Använder nåbar proxy från SOCKS5_PROXY: {proxy_url}")
         return {"http": proxy_url, "https": proxy_url}
 
     # Ingen loggning behövs här eftersom det är normalt att ingen proxy är satt.
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Saldoavstämning av kontoutdrag och bankkontot i bokföringen.
+
+Vid importen följer `BalanceTracker` med raderna på väg till databasen:
+- Rader med löpande saldo (`saldo_ore`, från CSV-formatens saldokolumn)
+  kontrolleras i tidsordning så att föregående saldo plus beloppet blir radens
+  saldo. Ett brott betyder att rader saknas eller är dubblerade i filen.
+  Filens ordning (äldst eller nyast först) avgörs av datumen.
+- camt-utdrag kontrolleras per utdrag: ingående saldo plus postsumman ska bli
+  utgående saldo.
+Utdragets utgående saldo och avvikelserna sparas på BankImport.
+
+Med det senaste utgående saldot blir avstämningen av bankkontot (1930) en enda
+jämförelse: `reconcile_bank_account` ställer bankens saldo mot det första
+utdragets ingående saldo, kontots saldo i bokföringen och de importerade
+transaktioner som ännu inte är bokförda. Bokföringen här utgår från
+banktransaktionerna och har inga egna ingående balanser.
+"""
+import json
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from bokforing_app import db
+from bokforing_app.models import BankImport, BankTransaction, BookkeepingEntry
+from bokforing_app.services.money import from_ore
+
+BANK_ACCOUNT = '1930'
+MAX_STORED_ISSUES = 20
+
+
+class BalanceTracker:
+    """Samlar det som behövs för saldoavstämningen medan raderna importeras."""
+
+    def __init__(self):
+        # (radnummer, datum, belopp, saldo) för rader med löpande saldo
+        self._running: List[Tuple[int, date, int, int]] = []
+        self._statements: Dict[int, Dict[str, Any]] = defaultdict(lambda: {'sum_ore': 0})
+        self.first_date: Optional[date] = None
+        self.last_date: Optional[date] = None
+
+    def track(self, rows: Iterable[Tuple[int, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """Släpper igenom raderna (givna som (radnummer, rad)) och noterar belopp och saldon."""
+        for line_no, row in rows:
+            day = row['bokforingsdag']
+            self.first_date = day if self.first_date is None else min(self.first_date, day)
+            self.last_date = day if self.last_date is None else max(self.last_date, day)
+            if row.get('saldo_ore') is not None:
+                self._running.append((line_no, day, row['belopp_ore'], row['saldo_ore']))
+            if row.get('statement') is not None:
+                statement = self._statements[row['statement']]
+                statement['sum_ore'] += row['belopp_ore']
+                for key in ('opening_balance_ore', 'closing_balance_ore', 'closing_date'):
+                    if key in row:
+                        statement[key] = row[key]
+            yield row
+
+    def _check_running(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        rows = self._running
+        if not rows:
+            return None, []
+        forward = rows
+        backward = rows[::-1]
+        if rows[0][1] > rows[-1][1]:
+            candidates = [backward]
+        elif rows[0][1] < rows[-1][1]:
+            candidates = [forward]
+        else:
+            candidates = [forward, backward]  # Samma dag: den ordning som stämmer bäst
+
+        best = None
+        for chronological in candidates:
+            issues = [{
+                'line': line_no,
+                'date': day.isoformat(),
+                'expected': from_ore(prev_saldo + belopp),
+                'saldo': from_ore(saldo),
+                'difference': from_ore(saldo - prev_saldo - belopp),
+            } for (_, _, _, prev_saldo), (line_no, day, belopp, saldo) in zip(chronological, chronological[1:])
+                if prev_saldo + belopp != saldo]
+            if best is None or len(issues) < len(best[1]):
+                best = (chronological, issues)
+
+        chronological, issues = best
+        first, last = chronological[0], chronological[-1]
+        return {
+            'opening_balance_ore': first[3] - first[2],
+            'closing_balance_ore': last[3],
+            'closing_date': last[1],
+        }, issues
+
+    def _check_statements(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        checked = [s for s in self._statements.values()
+                   if 'opening_balance_ore' in s and 'closing_balance_ore' in s]
+        if not checked:
+            return None, []
+        issues = [{
+            'statement': number,
+            'date': s['closing_date'].isoformat() if s.get('closing_date') else None,
+            'expected': from_ore(s['opening_balance_ore'] + s['sum_ore']),
+            'saldo': from_ore(s['closing_balance_ore']),
+            'difference': from_ore(s['closing_balance_ore'] - s['opening_balance_ore'] - s['sum_ore']),
+        } for number, s in self._statements.items()
+            if 'opening_balance_ore' in s and 'closing_balance_ore' in s
+            and s['opening_balance_ore'] + s['sum_ore'] != s['closing_balance_ore']]
+        latest = max(checked, key=lambda s: s.get('closing_date') or date.min)
+        return {
+            'opening_balance_ore': min(checked, key=lambda s: s.get('closing_date') or date.min)['opening_balance_ore'],
+            'closing_balance_ore': latest['closing_balance_ore'],
+            'closing_date': latest.get('closing_date') or self.last_date,
+        }, issues
+
+    def apply_to(self, bank_import: BankImport) -> List[Dict[str, Any]]:
+        """Fyller i datum, saldon och avstämningsresultat på importen. Returnerar avvikelserna."""
+        bank_import.first_date, bank_import.last_date = self.first_date, self.last_date
+        balances, issues = self._check_running()
+        if balances is None:
+            balances, issues = self._check_statements()
+        if balances is None:
+            bank_import.reconciled = None
+            return []
+        bank_import.opening_balance_ore = balances['opening_balance_ore']
+        bank_import.closing_balance_ore = balances['closing_balance_ore']
+        bank_import.closing_date = balances['closing_date']
+        bank_import.reconciled = not issues
+        bank_import.balance_errors = len(issues)
+        bank_import.balance_issues = json.dumps(issues[:MAX_STORED_ISSUES], ensure_ascii=False) if issues else None
+        return issues
+
+
+def latest_closing_balance(company_id: int) -> Optional[BankImport]:
+    """Den import som har det senaste utgående saldot."""
+    return BankImport.query.filter(
+        BankImport.company_id == company_id,
+        BankImport.closing_balance_ore.isnot(None),
+    ).order_by(BankImport.closing_date.desc(), BankImport.id.desc()).first()
+
+
+def reconcile_bank_account(company_id: int, konto: str = BANK_ACCOUNT) -> Optional[Dict[str, Any]]:
+    """
+    Stämmer av bankkontot i bokföringen mot det senaste utgående saldot från banken.
+
+    Returns:
+        None om inget kontoutdrag med saldo har importerats, annars
+        {'as_of', 'konto', 'bank_balance', 'opening_balance', 'ledger_balance',
+         'unbooked', 'difference', 'reconciled', 'bank_import_id'}, där
+        difference = bank_balance - opening_balance - ledger_balance - unbooked
+        och ska vara 0.
+    """
+    bank_import = latest_closing_balance(company_id)
+    if bank_import is None:
+        return None
+    as_of = bank_import.closing_date
+    # Saldot före den första importerade transaktionen
+    first_import = BankImport.query.filter(
+        BankImport.company_id == company_id,
+        BankImport.opening_balance_ore.isnot(None),
+    ).order_by(BankImport.first_date, BankImport.id).first()
+    opening_ore = first_import.opening_balance_ore
+
+    ledger_ore = db.session.query(
+        func.coalesce(func.sum(BookkeepingEntry.debet_ore - BookkeepingEntry.kredit_ore), 0)
+    ).join(BankTransaction, BookkeepingEntry.bank_transaction_id == BankTransaction.id).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.bokforingsdag <= as_of,
+        BookkeepingEntry.konto == konto,
+    ).scalar()
+
+    # Importerade men ännu inte bokförda transaktioner finns på banken men inte på kontot
+    unbooked_ore = db.session.query(func.coalesce(func.sum(BankTransaction.belopp_ore), 0)).filter(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status == 'unprocessed',
+        BankTransaction.bokforingsdag <= as_of,
+    ).scalar()
+
+    difference_ore = bank_import.closing_balance_ore - opening_ore - ledger_ore - unbooked_ore
+    return {
+        'as_of': as_of.isoformat() if as_of else None,
+        'konto': konto,
+        'bank_balance': from_ore(bank_import.closing_balance_ore),
+        'opening_balance': from_ore(opening_ore),
+        'ledger_balance': from_ore(ledger_ore),
+        'unbooked': from_ore(unbooked_ore),
+        'difference': from_ore(difference_ore),
+        'reconciled': difference_ore == 0,
+        'bank_import_id': bank_import.id,
+    }
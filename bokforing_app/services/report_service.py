@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Huvudbok och saldobalans för en valfri period.
+
+Ingående saldon räknas fram ur månadssaldona (se balance_service.range_sums):
+balanskonton (1xxx-2xxx) har saldot från hela historiken, resultatkonton
+(3xxx-8xxx) nollställs vid årsskiftet och har bara årets saldo före perioden.
+Räkenskapsåret är kalenderåret, som i SIE-exporten.
+
+Saldobalansen är ingående saldo, periodens debet och kredit och utgående saldo
+per konto, och läser bara månadssaldona plus posterna i påbörjade månader.
+
+Huvudboken listar posterna per konto i datumordning med löpande saldo. Posterna
+hämtas med en sorterad fråga per konto, och saldot räknas medan raderna läses:
+- `ledger_page` ger en sida i taget med keyset-paginering. Markören innehåller
+  konto, sorteringsnyckel och saldot efter sidans sista rad, så nästa sida
+  fortsätter utan att summera om tidigare poster.
+- `iter_ledger` strömmar hela huvudboken (för CSV-export) utan att hålla den i minnet.
+"""
+import csv
+import io
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select
+
+from bokforing_app import db
+from bokforing_app.models import BankTransaction, BookkeepingEntry
+from bokforing_app.services import balance_service, pagination
+from bokforing_app.services.accounting_config import get_account_names
+from bokforing_app.services.money import from_ore
+
+RESULT_ACCOUNT_PREFIXES = tuple('345678')   # Resultatkonton, nollställs vid årsskiftet
+LEDGER_PAGE_SIZE = 200
+STREAM_BATCH_SIZE = 1000
+
+
+def parse_period(date_from: Optional[str], date_to: Optional[str]) -> Tuple[date, date]:
+    """
+    Tolkar periodens datum (ÅÅÅÅ-MM-DD). Saknas de gäller innevarande år.
+
+    Raises:
+        ValueError: Vid ogiltigt datum eller om perioden slutar före den börjar.
+    """
+    def parse(text):
+        try:
+            return date.fromisoformat(text)
+        except ValueError:
+            raise ValueError(f"Ogiltigt datum: {text!r}, ange ÅÅÅÅ-MM-DD.")
+
+    start = parse(date_from) if date_from else date(date.today().year, 1, 1)
+    end = parse(date_to) if date_to else date(start.year, 12, 31)
+    if end < start:
+        raise ValueError("Periodens slutdatum ligger före startdatumet.")
+    return start, end
+
+
+def is_result_account(konto: str) -> bool:
+    return konto.startswith(RESULT_ACCOUNT_PREFIXES)
+
+
+def _merge(*parts: Dict[str, Tuple[int, int]]) -> Dict[str, int]:
+    """Saldo (debet - kredit) i öre per konto, summerat över `parts`."""
+    balances = {}
+    for part in parts:
+        for konto, (debet, kredit) in part.items():
+            balances[konto] = balances.get(konto, 0) + debet - kredit
+    return balances
+
+
+def opening_balances(company_id: int, date_from: date) -> Dict[str, int]:
+    """Ingående saldo (debet - kredit) i öre per konto vid början av `date_from`."""
+    year_start = date(date_from.year, 1, 1)
+    before_year = balance_service.range_sums(company_id, None, year_start - timedelta(days=1))
+    this_year = balance_service.range_sums(company_id, year_start, date_from - timedelta(days=1)) \
+        if date_from > year_start else {}
+    balances = _merge(this_year)
+    for konto, saldo in _merge(before_year).items():
+        if not is_result_account(konto):
+            balances[konto] = balances.get(konto, 0) + saldo
+    return balances
+
+
+def _in_range(konto: str, konto_from: Optional[str], konto_to: Optional[str]) -> bool:
+    return (not konto_from or konto >= konto_from) and (not konto_to or konto <= konto_to)
+
+
+def trial_balance(company_id: int, date_from: date, date_to: date,
+                  konto_from: Optional[str] = None, konto_to: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Saldobalans för perioden.
+
+    Returns:
+        {'rows': [{'konto', 'namn', 'ingaende', 'debet', 'kredit', 'utgaende'}, ...],
+         'totals': {'ingaende', 'debet', 'kredit', 'utgaende'}}, belopp i kronor.
+    """
+    opening = opening_balances(company_id, date_from)
+    period = balance_service.range_sums(company_id, date_from, date_to)
+    names = get_account_names()
+    rows = []
+    totals = dict.fromkeys(('ingaende', 'debet', 'kredit', 'utgaende'), 0)
+    for konto in sorted(set(opening) | set(period)):
+        if not _in_range(konto, konto_from, konto_to):
+            continue
+        debet, kredit = period.get(konto, (0, 0))
+        ingaende = opening.get(konto, 0)
+        if not (ingaende or debet or kredit):
+            continue
+        values = {'ingaende': ingaende, 'debet': debet, 'kredit': kredit, 'utgaende': ingaende + debet - kredit}
+        for key, value in values.items():
+            totals[key] += value
+        rows.append({'konto': konto, 'namn': names.get(konto, ''),
+                     **{key: from_ore(value) for key, value in values.items()}})
+    return {'rows': rows, 'totals': {key: from_ore(value) for key, value in totals.items()}}
+
+
+def _ledger_accounts(company_id: int, date_from: date, date_to: date, konto_from: Optional[str],
+                     konto_to: Optional[str]) -> Tuple[List[str], Dict[str, int]]:
+    """Kontona i huvudboken (med ingående saldo eller poster i perioden) och deras ingående saldon."""
+    opening = opening_balances(company_id, date_from)
+    period = balance_service.range_sums(company_id, date_from, date_to)
+    accounts = sorted(k for k in set(period) | {k for k, saldo in opening.items() if saldo}
+                      if _in_range(k, konto_from, konto_to))
+    return accounts, opening
+
+
+def _entries_query(company_id: int, konto: str, date_from: date, date_to: date,
+                   after: Optional[Sequence[Any]] = None):
+    """Kontots poster i perioden i ordningen (bokforingsdag, verifikation, post)."""
+    stmt = select(
+        BankTransaction.bokforingsdag, BankTransaction.id, BookkeepingEntry.id,
+        BankTransaction.referens, BookkeepingEntry.debet_ore, BookkeepingEntry.kredit_ore,
+    ).join(BankTransaction, BookkeepingEntry.bank_transaction_id == BankTransaction.id).where(
+        BankTransaction.company_id == company_id,
+        BankTransaction.status == balance_service.BOOKED_STATUS,
+        BankTransaction.bokforingsdag.between(date_from, date_to),
+        BookkeepingEntry.konto == konto,
+    )
+    if after:
+        day, trans_id, entry_id = after
+        # Den enkla gränsen låter indexsökningen börja vid markören; OR-villkoret kan inte det
+        stmt = stmt.where(BankTransaction.bokforingsdag >= day, or_(
+            BankTransaction.bokforingsdag > day,
+            and_(BankTransaction.bokforingsdag == day, or_(
+                BankTransaction.id > trans_id,
+                and_(BankTransaction.id == trans_id, BookkeepingEntry.id > entry_id),
+            )),
+        ))
+    return stmt.order_by(BankTransaction.bokforingsdag, BankTransaction.id, BookkeepingEntry.id)
+
+
+def _ledger_row(row, saldo: int) -> Dict[str, Any]:
+    day, trans_id, _, referens, debet, kredit = row
+    return {
+        'bokforingsdag': day.isoformat(),
+        'verifikation_id': trans_id,
+        'referens': referens,
+        'debet': from_ore(debet or 0),
+        'kredit': from_ore(kredit or 0),
+        'saldo': from_ore(saldo),
+    }
+
+
+def _valid_ledger_position(position: List[Any]) -> bool:
+    """[konto, dag, transaktions-id, post-id, saldo i öre], eller [konto, None, ...] för nästa konto."""
+    if not isinstance(position[0], str):
+        return False
+    if position[1] is None:
+        return True
+    return all(isinstance(v, int) and not isinstance(v, bool) for v in position[2:])
+
+
+def ledger_page(company_id: int, date_from: date, date_to: date, konto_from: Optional[str] = None,
+                konto_to: Optional[str] = None, limit: int = pagination.DEFAULT_PAGE_SIZE,
+                cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    En sida av huvudboken, högst `limit` poster. Ett konto som fortsätter på
+    nästa sida saknar 'utgaende' på denna.
+
+    Returns:
+        {'accounts': [{'konto', 'namn', 'ingaende', 'rows': [...], 'utgaende'}, ...],
+         'next_cursor': markör eller None}
+
+    Raises:
+        ValueError: Om markören är ogiltig.
+    """
+    position = pagination.decode_cursor(cursor, date_positions=(1,), length=5)
+    if position and not _valid_ledger_position(position):
+        raise ValueError("Ogiltig markör för huvudboken.")
+    accounts, opening = _ledger_accounts(company_id, date_from, date_to, konto_from, konto_to)
+    if position:
+        accounts = [k for k in accounts if k >= position[0]]
+    names = get_account_names()
+    sections = []
+    remaining = limit
+    for konto in accounts:
+        if remaining <= 0:
+            return {'accounts': sections, 'next_cursor': pagination.encode_cursor([konto, None, None, None, None])}
+        continuing = bool(position) and konto == position[0] and position[1] is not None
+        saldo = position[4] if continuing else opening.get(konto, 0)
+        section = {'konto': konto, 'namn': names.get(konto, '')}
+        if not continuing:
+            section['ingaende'] = from_ore(saldo)
+        after = position[1:4] if continuing else None
+        rows = db.session.execute(_entries_query(company_id, konto, date_from, date_to, after).limit(remaining + 1)).all()
+        section['rows'] = []
+        for row in rows[:remaining]:
+            saldo += (row[4] or 0) - (row[5] or 0)
+            section['rows'].append(_ledger_row(row, saldo))
+        sections.append(section)
+        if len(rows) > remaining:
+            last = rows[remaining - 1]
+            return {'accounts': sections, 'next_cursor': pagination.encode_cursor([konto, last[0], last[1], last[2], saldo])}
+        section['utgaende'] = from_ore(saldo)
+        remaining -= max(len(rows), 1)
+    return {'accounts': sections, 'next_cursor': None}
+
+
+def iter_ledger(company_id: int, date_from: date, date_to: date, konto_from: Optional[str] = None,
+                konto_to: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Strömmar huvudboken rad för rad: per konto en rad med ingående saldo
+    (typ 'ingaende'), posterna (typ 'post') och en rad med utgående saldo (typ 'utgaende').
+    """
+    accounts, opening = _ledger_accounts(company_id, date_from, date_to, konto_from, konto_to)
+    names = get_account_names()
+    for konto in accounts:
+        saldo = opening.get(konto, 0)
+        header = {'konto': konto, 'namn': names.get(konto, '')}
+        yield {**header, 'typ': 'ingaende', 'saldo': from_ore(saldo)}
+        result = db.session.execute(_entries_query(company_id, konto, date_from, date_to),
+                                    execution_options={'yield_per': STREAM_BATCH_SIZE})
+        for row in result:
+            saldo += (row[4] or 0) - (row[5] or 0)
+            yield {**header, 'typ': 'post', **_ledger_row(row, saldo)}
+        yield {**header, 'typ': 'utgaende', 'saldo': from_ore(saldo)}
+
+
+def _csv_amount(value: Optional[float]) -> str:
+    return '' if value is None else f"{value:.2f}".replace('.', ',')
+
+
+def _csv_lines(header: Sequence[str], rows: Iterator[Sequence[Any]]) -> Iterator[str]:
+    """CSV med semikolon och decimalkomma (som svenska Excel), en rad i taget."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(header)
+    yield '\ufeff' + buffer.getvalue()   # BOM så att Excel läser UTF-8
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def ledger_csv(company_id: int, date_from: date, date_to: date, konto_from: Optional[str] = None,
+               konto_to: Optional[str] = None) -> Iterator[str]:
+    """Huvudboken som CSV, strömmad rad för rad."""
+    def rows():
+        for line in iter_ledger(company_id, date_from, date_to, konto_from, konto_to):
+            if line['typ'] == 'post':
+                yield (line['konto'], line['namn'], line['bokforingsdag'], line['verifikation_id'],
+                       line['referens'], _csv_amount(line['debet']), _csv_amount(line['kredit']),
+                       _csv_amount(line['saldo']))
+            else:
+                text = 'Ingående saldo' if line['typ'] == 'ingaende' else 'Utgående saldo'
+                day = date_from if line['typ'] == 'ingaende' else date_to
+                yield (line['konto'], line['namn'], day.isoformat(), '', text, '', '', _csv_amount(line['saldo']))
+    return _csv_lines(('Konto', 'Kontonamn', 'Datum', 'Ver.nr', 'Text', 'Debet', 'Kredit', 'Saldo'), rows())
+
+
+def trial_balance_csv(company_id: int, date_from: date, date_to: date, konto_from: Optional[str] = None,
+                      konto_to: Optional[str] = None) -> Iterator[str]:
+    """Saldobalansen som CSV."""
+    report = trial_balance(company_id, date_from, date_to, konto_from, konto_to)
+    keys = ('ingaende', 'debet', 'kredit', 'utgaende')
+    rows = [(r['konto'], r['namn'], *(_csv_amount(r[k]) for k in keys)) for r in report['rows']]
+    rows.append(('', 'Summa', *(_csv_amount(report['totals'][k]) for k in keys)))
+    return _csv_lines(('Konto', 'Kontonamn', 'Ingående saldo', 'Debet', 'Kredit', 'Utgående saldo'), iter(rows))
@@ -1,6 +1,10 @@
 # bokforing_app/services/rule_engine.py
 from typing import List, Dict, Any
 from bokforing_app.models import BankTransaction
+from bokforing_app.services.money import from_ore, to_ore
+
+# Största avrundningsdifferens i öre som fördelas automatiskt när regelns formler ger delar av ören
+MAX_ROUNDING_ORE = 4
 
 def apply_rule(transaction: BankTransaction, rule: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -60,28 +64,25 @@ def apply_rule(transaction: BankTransaction, rule: Dict[str, Any]) -> List[Dict[
 
             generated_entries.append({
                 'konto': konto,
-                'debet': round(float(debet), 2),
-                'kredit': round(float(kredit), 2)
+                'debet': to_ore(float(debet)),
+                'kredit': to_ore(float(kredit))
             })
         except Exception as e:
             raise ValueError(f"Fel i regel för konto {konto} (post #{i+1}): Kunde inte tolka debet/kredit. Detaljer: {e}")
 
-    total_debet = sum(e['debet'] for e in generated_entries)
-    total_kredit = sum(e['kredit'] for e in generated_entries)
-
-    if abs(total_debet - total_kredit) > 0.01:
-        diff = round(total_debet - total_kredit, 2)
-        if abs(diff) < 0.05:
-            if diff > 0:
-                entry_to_adjust = max((e for e in generated_entries if e['debet'] > 0), key=lambda x: x['debet'], default=None)
-                if entry_to_adjust: entry_to_adjust['debet'] -= diff
-            else:
-                entry_to_adjust = max((e for e in generated_entries if e['kredit'] > 0), key=lambda x: x['kredit'], default=None)
-                if entry_to_adjust: entry_to_adjust['kredit'] += diff
-        
+    # Beloppen är nu hela ören. En liten differens kommer från formler som ger delar av
+    # ören (t.ex. ABS_AMOUNT / 1.25) och dras från den största posten på den tyngre sidan.
+    diff = sum(e['debet'] for e in generated_entries) - sum(e['kredit'] for e in generated_entries)
+    if diff and abs(diff) <= MAX_ROUNDING_ORE:
+        side = 'debet' if diff > 0 else 'kredit'
+        entry_to_adjust = max((e for e in generated_entries if e[side] > 0), key=lambda x: x[side], default=None)
+        if entry_to_adjust:
+            entry_to_adjust[side] -= abs(diff)
+            diff = 0
+    if diff:
         total_debet = sum(e['debet'] for e in generated_entries)
         total_kredit = sum(e['kredit'] for e in generated_entries)
-        if abs(total_debet - total_kredit) > 0.01:
-            raise ValueError(f"Regeln skapade obalans. Debet: {total_debet:.2f}, Kredit: {total_kredit:.2f}")
+        raise ValueError(f"Regeln skapade obalans. Debet: {from_ore(total_debet):.2f}, Kredit: {from_ore(total_kredit):.2f}")
 
-    return generated_entries
+    return [{'konto': e['konto'], 'debet': from_ore(e['debet']), 'kredit': from_ore(e['kredit'])}
+            for e in generated_entries]
@@ -1,6 +1,8 @@
 import codecs
 from datetime import datetime
 
+from bokforing_app.services.money import from_ore, sum_ore
+
 
 def _sanitize_for_cp437(text):
     """
@@ -43,10 +45,11 @@ def generate_sie_file(filename, company_data, verifications):
     """
     # Step 1: Validate inputs
     for ver in verifications:
-        total = sum(trans['amount'] for trans in ver['transactions'])
-        if abs(total) > 1e-6:
+        # Summed in whole öre, so a balanced verification sums to exactly zero
+        total = sum_ore(trans['amount'] for trans in ver['transactions'])
+        if total != 0:
             raise ValueError(
-                f"Verification {ver.get('series', '')}{ver.get('number', '')} is unbalanced: sum = {total}")
+                f"Verification {ver.get('series', '')}{ver.get('number', '')} is unbalanced: sum = {from_ore(total):.2f}")
 
         # Validate that all transaction accounts exist in the account plan
         for trans in ver['transactions']:
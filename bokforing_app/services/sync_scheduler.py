@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Schemalagd bakgrundssynkronisering av fakturor från Fakturan.nu.
+
+Varje företag med API-nycklar synkroniseras med ett konfigurerbart intervall.
+För att företagen inte ska anropa API:et samtidigt sprids körningarna ut med
+slumpmässig jitter, både vid start och efter varje körning.
+
+Varje företag har en markör (cursor) i `Setting`-tabellen med nyckeln
+`fakturanu_sync_cursor:<company_id>`. Markören flyttas bara fram efter en
+lyckad och fullständig synkronisering, så en avbruten körning tas upp igen från
+samma punkt nästa gång. Redan skrivna sidor hoppas då över tack vare
+fingeravtrycken i `invoice_sync_service`.
+
+API:et kan bara filtrera på fakturadatum, inte på när en faktura senast ändrades.
+En äldre faktura som betalas eller krediteras efter markören skulle därför aldrig
+hämtas igen. Varje körning börjar därför vid den äldsta obetalda fakturan från de
+senaste OPEN_INVOICE_WINDOW_DAYS dagarna om den ligger före markören; oförändrade
+fakturor hoppas över på fingeravtrycket.
+
+Schemaläggaren körs av skriptet `bokforing_app/scripts/fakturanu_sync_worker.py`.
+"""
+import os
+import json
+import random
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from bokforing_app import db
+from bokforing_app.models import Company, Invoice, Setting
+from bokforing_app.services import invoice_sync_service
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL_SECONDS = float(os.getenv("FAKTURANU_SYNC_INTERVAL", "900"))
+SYNC_JITTER_SECONDS = float(os.getenv("FAKTURANU_SYNC_JITTER", "60"))
+CURSOR_OVERLAP_DAYS = 1  # Hämta en dag bakåt från markören så att sena ändringar inte missas
+OPEN_INVOICE_WINDOW_DAYS = int(os.getenv("FAKTURANU_OPEN_INVOICE_DAYS", "365"))
+
+CURSOR_KEY_PREFIX = 'fakturanu_sync_cursor:'
+
+
+def _cursor_key(company_id: int) -> str:
+    return f"{CURSOR_KEY_PREFIX}{company_id}"
+
+
+def get_cursor(company_id: int) -> Optional[Dict[str, Any]]:
+    """Returnerar företagets sparade synkroniseringsmarkör, eller None om ingen finns."""
+    setting = Setting.query.filter_by(key=_cursor_key(company_id)).first()
+    if not setting or not setting.value:
+        return None
+    try:
+        return json.loads(setting.value)
+    except ValueError:
+        logger.warning(f"Ogiltig synkroniseringsmarkör för företag {company_id}, ignoreras.")
+        return None
+
+
+def save_cursor(company_id: int, synced_from: date, result: Dict[str, Any]) -> None:
+    """Sparar markören efter en lyckad synkronisering."""
+    value = json.dumps({
+        'synced_from': synced_from.isoformat(),
+        'last_run': datetime.utcnow().isoformat(timespec='seconds'),
+        'last_result': {k: result.get(k) for k in ('new', 'updated', 'unchanged', 'skipped', 'fetched')},
+    })
+    setting = Setting.query.filter_by(key=_cursor_key(company_id)).first()
+    if setting:
+        setting.value = value
+    else:
+        db.session.add(Setting(key=_cursor_key(company_id), value=value))
+    db.session.commit()
+
+
+def _oldest_open_invoice(company_id: int, today: date) -> Optional[date]:
+    """Fakturadatum för den äldsta obetalda fakturan inom OPEN_INVOICE_WINDOW_DAYS."""
+    return db.session.query(db.func.min(Invoice.date)).filter(
+        Invoice.company_id == company_id,
+        Invoice.paid_at.is_(None),
+        Invoice.date >= today - timedelta(days=OPEN_INVOICE_WINDOW_DAYS),
+    ).scalar()
+
+
+def _sync_params(company: Company) -> Dict[str, Any]:
+    """
+    Bygger API-filtret för nästa synkronisering. Utan markör används senast
+    uppdaterade lokala faktura, och utan lokala fakturor hämtas allt. Startdatumet
+    flyttas bakåt till den äldsta obetalda fakturan i fönstret, så att betalningar
+    och andra ändringar på den fångas upp.
+    """
+    cursor = get_cursor(company.id)
+    if cursor and cursor.get('synced_from'):
+        since = date.fromisoformat(cursor['synced_from'])
+    else:
+        last_updated = db.session.query(db.func.max(Invoice.updated_at)).filter(
+            Invoice.company_id == company.id).scalar()
+        if not last_updated:
+            return {}
+        since = last_updated.date()
+    start = since - timedelta(days=CURSOR_OVERLAP_DAYS)
+    oldest_open = _oldest_open_invoice(company.id, datetime.utcnow().date())
+    if oldest_open and oldest_open < start:
+        start = oldest_open
+    return {'start_date': start.isoformat()}
+
+
+def sync_company(company: Company, stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Synkroniserar ett företag från dess markör och flyttar fram markören om
+    synkroniseringen gick igenom. Används både av schemaläggaren och av den
+    manuella synkroniseringen i webbgränssnittet.
+    """
+    started_on = datetime.utcnow().date()
+    result = invoice_sync_service.sync_company_invoices(company, params=_sync_params(company),
+                                                        stop_event=stop_event)
+    if 'error' not in result and not result.get('interrupted'):
+        save_cursor(company.id, started_on, result)
+    return result
+
+
+def _companies_with_credentials():
+    return Company.query.filter(Company.fakturanu_key_id.isnot(None), Company.fakturanu_key_id != '',
+                                Company.fakturanu_password.isnot(None), Company.fakturanu_password != '').all()
+
+
+def _next_delay(interval: float, jitter: float) -> float:
+    return max(0.0, interval + random.uniform(-jitter, jitter))
+
+
+def run_scheduler(stop_event: threading.Event, interval: float = SYNC_INTERVAL_SECONDS,
+                  jitter: float = SYNC_JITTER_SECONDS, once: bool = False) -> None:
+    """
+    Kör schemaläggaren tills `stop_event` sätts. Måste anropas inom en
+    applikationskontext.
+
+    Args:
+        stop_event: Sätts för att stoppa. En pågående synkronisering avbryts mellan två sidor.
+        interval: Sekunder mellan två synkroniseringar av samma företag.
+        jitter: Maximal slumpmässig förskjutning (±) av varje körning.
+        once: Synkronisera varje företag en gång (utan startjitter) och avsluta.
+    """
+    next_run: Dict[int, float] = {}
+    logger.info(f"Fakturasynkronisering startad (intervall {interval}s, jitter ±{jitter}s).")
+
+    while not stop_event.is_set():
+        now = time.monotonic()
+        companies = _companies_with_credentials()
+        active_ids = {c.id for c in companies}
+        for company_id in list(next_run):
+            if company_id not in active_ids:
+                del next_run[company_id]
+        for company in companies:
+            if company.id not in next_run:
+                # Nya företag sprids ut över startfönstret i stället för att köras samtidigt
+                next_run[company.id] = now if once else now + random.uniform(0, min(interval, jitter))
+
+        for company in companies:
+            if stop_event.is_set():
+                break
+            if next_run[company.id] > time.monotonic():
+                continue
+            try:
+                result = sync_company(company, stop_event=stop_event)
+                if 'error' in result:
+                    logger.warning(f"Synkronisering av företag {company.id} misslyckades: {result['error']}")
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Oväntat fel vid synkronisering av företag {company.id}: {e}", exc_info=True)
+            next_run[company.id] = time.monotonic() + _next_delay(interval, jitter)
+
+        db.session.remove()
+        if once:
+            break
+        wait = min(next_run.values(), default=time.monotonic() + interval) - time.monotonic()
+        stop_event.wait(max(1.0, min(wait, interval)))
+
+    logger.info("Fakturasynkronisering stoppad.")
@@ -61,6 +61,17 @@ function showConfirm(message, callback) {
 }
 
 
+/**
+ * Escapar text för infogning i HTML, både som innehåll och i attributvärden.
+ * @param {string} text - Texten som ska escapas (null/undefined ger tom sträng).
+ * @returns {string} Texten med &, <, > och " ersatta av entiteter.
+ */
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text ?? '';
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
 /**
  * Skapar en ny rad för en bokföringspost i en modal.
  * @param {HTMLElement} container - Elementet där raden ska läggas till.
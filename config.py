@@ -10,6 +10,7 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 INSTANCE_FOLDER = os.path.join(basedir, 'instance')
 DB_PATH = os.path.join(INSTANCE_FOLDER, 'app.db')
 UPLOAD_FOLDER = os.path.join(basedir, 'bokforing_app', 'static', 'uploads')
+MIGRATIONS_FOLDER = os.path.join(basedir, 'migrations')
 
 
 class Config:
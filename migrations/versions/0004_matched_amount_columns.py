@@ -0,0 +1,85 @@
+"""matched amount columns
+
+Lägger till de denormaliserade kolumnerna `matched_amount` och
+`remaining_amount` och fyller dem för befintliga rader med samma
+mängdbaserade UPDATE som matching_service.refresh_matched_amounts kör.
+`bank_transaction.remaining_amount` blir NOT NULL efter ifyllningen;
+för fakturor och bilagor utan belopp förblir den NULL.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 01:16:42.104319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+matchning = sa.table(
+    'matchning',
+    sa.column('amount', sa.Float),
+    sa.column('transaction_id', sa.Integer),
+    sa.column('invoice_id', sa.Integer),
+    sa.column('bilaga_id', sa.Integer),
+)
+
+# tabell -> (beloppskolumn, främmande nyckel i matchning)
+MATCHED_TABLES = {
+    'bank_transaction': ('belopp', 'transaction_id'),
+    'bilaga': ('brutto_amount', 'bilaga_id'),
+    'invoice': ('sum', 'invoice_id'),
+}
+
+
+def _backfill(table_name, amount_name, foreign_key):
+    table = sa.table(
+        table_name,
+        sa.column('id', sa.Integer),
+        sa.column(amount_name, sa.Float),
+        sa.column('matched_amount', sa.Float),
+        sa.column('remaining_amount', sa.Float),
+    )
+    matched = sa.select(sa.func.coalesce(sa.func.sum(matchning.c.amount), 0.0)).where(
+        matchning.c[foreign_key] == table.c.id).scalar_subquery()
+    op.execute(table.update().values(matched_amount=matched,
+                                     remaining_amount=table.c[amount_name] - matched))
+
+
+def upgrade():
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('matched_amount', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('remaining_amount', sa.Float(), nullable=True))
+
+    with op.batch_alter_table('bilaga', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('matched_amount', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('remaining_amount', sa.Float(), nullable=True))
+
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('matched_amount', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('remaining_amount', sa.Float(), nullable=True))
+
+    for table_name, (amount_name, foreign_key) in MATCHED_TABLES.items():
+        _backfill(table_name, amount_name, foreign_key)
+
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.alter_column('remaining_amount', existing_type=sa.Float(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.drop_column('remaining_amount')
+        batch_op.drop_column('matched_amount')
+
+    with op.batch_alter_table('bilaga', schema=None) as batch_op:
+        batch_op.drop_column('remaining_amount')
+        batch_op.drop_column('matched_amount')
+
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_column('remaining_amount')
+        batch_op.drop_column('matched_amount')
@@ -0,0 +1,84 @@
+"""money to ore
+
+Flyttar alla belopp från flyttalskolumner i kronor till heltalskolumner i öre,
+t.ex. `bank_transaction.belopp` till `belopp_ore`. Värdena räknas om med
+ROUND(belopp * 100); beloppen har sparats avrundade till två decimaler, så
+ROUND tar bara bort flyttalsfelet.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 01:16:53.404093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# tabell -> [(gammal kolumn, ny kolumn, NOT NULL, standardvärde)]
+MONEY_COLUMNS = {
+    'bank_transaction': [
+        ('belopp', 'belopp_ore', True, None),
+        ('matched_amount', 'matched_amount_ore', True, '0'),
+        ('remaining_amount', 'remaining_amount_ore', True, None),
+    ],
+    'bookkeeping_entry': [
+        ('debet', 'debet_ore', False, None),
+        ('kredit', 'kredit_ore', False, None),
+    ],
+    'bilaga': [
+        ('brutto_amount', 'brutto_amount_ore', False, None),
+        ('netto_amount', 'netto_amount_ore', False, None),
+        ('moms_amount', 'moms_amount_ore', False, None),
+        ('matched_amount', 'matched_amount_ore', True, '0'),
+        ('remaining_amount', 'remaining_amount_ore', False, None),
+    ],
+    'invoice': [
+        ('sum', 'sum_ore', False, None),
+        ('net', 'net_ore', False, None),
+        ('tax', 'tax_ore', False, None),
+        ('matched_amount', 'matched_amount_ore', True, '0'),
+        ('remaining_amount', 'remaining_amount_ore', False, None),
+    ],
+    'invoice_row': [
+        ('price', 'price_ore', False, None),
+    ],
+    'matchning': [
+        ('amount', 'amount_ore', True, None),
+    ],
+}
+
+
+def _move(table, columns, source_type, target_type, convert):
+    """Lägger till målkolumnerna, räknar om värdena och tar bort källkolumnerna."""
+    with op.batch_alter_table(table, schema=None) as batch_op:
+        for _, target, _, default in columns:
+            batch_op.add_column(sa.Column(target, target_type(), server_default=default, nullable=True))
+
+    quote = op.get_bind().dialect.identifier_preparer.quote
+    assignments = ', '.join(f"{quote(target)} = {convert(quote(source))}" for source, target, _, _ in columns)
+    op.execute(f"UPDATE {quote(table)} SET {assignments}")
+
+    with op.batch_alter_table(table, schema=None) as batch_op:
+        for source, target, not_null, default in columns:
+            if not_null:
+                batch_op.alter_column(target, existing_type=target_type(), existing_server_default=default,
+                                      nullable=False)
+            batch_op.drop_column(source)
+
+
+def upgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        _move(table, columns, sa.Float, sa.BigInteger,
+              lambda column: f"CAST(ROUND({column} * 100) AS BIGINT)")
+
+
+def downgrade():
+    for table, columns in MONEY_COLUMNS.items():
+        reverse = [(target, source, not_null, default) for source, target, not_null, default in columns]
+        _move(table, reverse, sa.BigInteger, sa.Float, lambda column: f"{column} / 100.0")
@@ -0,0 +1,36 @@
+"""referens nocase index
+
+Byter ix_bank_transaction_company_referens till (company_id, referens COLLATE
+NOCASE) i SQLite, så att prefixsökningen med LIKE kan använda indexet. Andra
+databaser saknar NOCASE och behåller det vanliga indexet från revision 0005.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 01:17:56.735441
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_bank_transaction_company_referens')
+        batch_op.create_index('ix_bank_transaction_company_referens', ['company_id', sa.literal_column('referens COLLATE NOCASE')], unique=False)
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_bank_transaction_company_referens')
+        batch_op.create_index('ix_bank_transaction_company_referens', ['company_id', 'referens'], unique=False)